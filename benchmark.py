@@ -0,0 +1,146 @@
+# benchmark.py
+# Offline benchmark of InstagramFixedAutomation.attempt_upload against
+# mock_instagram.py. Every run is recorded through telemetry.py into
+# bench_telemetry.jsonl, tagged with its scenario and git revision, so
+# results can be compared run over run.
+#
+#   python benchmark.py                               # every scenario, 3 runs each
+#   python benchmark.py -s baseline -s renamed_classes -n 10
+#   python benchmark.py --baseline old_bench.jsonl    # compare p50/p95 with an earlier file
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from playwright.sync_api import sync_playwright
+
+from main import BROWSER_ARGS, USER_AGENT, VIEWPORT, InstagramFixedAutomation
+from ig_selectors import SelectorRegistry
+from mock_instagram import MockInstagram, SCENARIOS
+from telemetry import Telemetry, load_runs, percentile, print_summary
+
+BENCH_FILE = Path("bench_telemetry.jsonl")
+CAPTION = "Benchmark run – Day 1\n\n#motivation #viral #trending #instagram #reels"
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def make_video(size_mb, directory):
+    """Stand-in upload payload; the mock only measures bytes, it never decodes them"""
+    path = Path(directory) / "bench_video.mp4"
+    with path.open("wb") as f:
+        f.write(os.urandom(int(size_mb * 1024 * 1024)))
+    return path
+
+
+def run_once(browser, mock, selectors, video_path, run_index, out, revision):
+    """One attempt_upload against the running mock; returns the telemetry record"""
+    scenario = mock.scenario
+    telemetry = Telemetry(scenario=scenario['name'], run=run_index, revision=revision,
+                          expected=scenario['expect_success'], bench=True)
+    context = browser.new_context(user_agent=USER_AGENT, viewport=VIEWPORT)
+    automation = None
+    saved_env = {key: os.environ.get(key) for key in scenario.get('env', {})}
+    os.environ.update(scenario.get('env', {}))
+    try:
+        page = context.new_page()
+        page.set_default_timeout(30000)
+        automation = InstagramFixedAutomation(page, telemetry=telemetry, base_url=mock.url,
+                                              selectors=selectors)
+        automation.install_event_listeners()
+        success = automation.attempt_upload(video_path, CAPTION)
+        telemetry.set(success=success, media_id=automation.media_id,
+                      as_expected=success == scenario['expect_success'])
+    except Exception as e:
+        telemetry.set(success=False, as_expected=not scenario['expect_success'], error=str(e))
+    finally:
+        for key, value in saved_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        context.close()
+        if automation:
+            telemetry.set(events=automation.close_event_capture())
+    telemetry.write(out)
+    return telemetry.record
+
+
+def compare(runs, baseline_runs):
+    """End-to-end p50/p95 per scenario against an earlier benchmark file"""
+    def by_scenario(records):
+        grouped = {}
+        for record in records:
+            grouped.setdefault(record.get("attrs", {}).get("scenario"), []).append(record["total_ms"])
+        return grouped
+
+    current, previous = by_scenario(runs), by_scenario(baseline_runs)
+    print(f"\n{'scenario':<20}{'p50 before':>12}{'p50 now':>10}{'p95 before':>12}{'p95 now':>10}{'Δ p50':>9}")
+    for name in sorted(current, key=str):
+        now = current[name]
+        before = previous.get(name)
+        if not before:
+            print(f"{name:<20}{'-':>12}{percentile(now, 50):>10.0f}{'-':>12}{percentile(now, 95):>10.0f}")
+            continue
+        p50_before, p50_now = percentile(before, 50), percentile(now, 50)
+        change = (p50_now - p50_before) / p50_before if p50_before else 0.0
+        print(f"{name:<20}{p50_before:>12.0f}{p50_now:>10.0f}{percentile(before, 95):>12.0f}"
+              f"{percentile(now, 95):>10.0f}{change:>+9.0%}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the upload flow against the local mock")
+    parser.add_argument("-s", "--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="scenario to run (repeatable, default: all)")
+    parser.add_argument("-n", "--runs", type=int, default=3, help="runs per scenario")
+    parser.add_argument("--video-mb", type=float, default=5, help="size of the stand-in video")
+    parser.add_argument("--out", type=Path, default=BENCH_FILE)
+    parser.add_argument("--baseline", type=Path, help="earlier bench_telemetry.jsonl to compare against")
+    parser.add_argument("--headful", action="store_true")
+    args = parser.parse_args(argv)
+
+    scenarios = args.scenario or list(SCENARIOS)
+    revision = git_revision()
+    runs = []
+    started = time.monotonic()
+    with tempfile.TemporaryDirectory() as tmp, sync_playwright() as p:
+        video_path = make_video(args.video_mb, tmp)
+        browser = p.chromium.launch(headless=not args.headful, args=BROWSER_ARGS)
+        try:
+            for name in scenarios:
+                with MockInstagram(name) as mock:
+                    print(f"\n🧪 Scenario '{name}' ({args.runs} runs) at {mock.url}")
+                    # Fresh in-memory selector statistics per scenario, so runs show
+                    # the registry adapting without touching .selector_stats.json
+                    selectors = SelectorRegistry(path=None)
+                    for index in range(args.runs):
+                        runs.append(run_once(browser, mock, selectors, video_path, index, args.out, revision))
+        finally:
+            browser.close()
+
+    print("\n" + "=" * 80)
+    print(f"📊 BENCHMARK RESULTS ({len(runs)} runs in {time.monotonic() - started:.0f}s, rev {revision or '?'})")
+    print("=" * 80)
+    for name in scenarios:
+        records = [r for r in runs if r["attrs"]["scenario"] == name]
+        unexpected = sum(1 for r in records if not r["attrs"].get("as_expected"))
+        print(f"\n▶️ {name}" + (f"  ❗ {unexpected} unexpected outcome(s)" if unexpected else ""))
+        print_summary(records)
+
+    if args.baseline:
+        compare(runs, load_runs(args.baseline))
+
+    return 1 if any(not r["attrs"].get("as_expected") for r in runs) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
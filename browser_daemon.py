@@ -0,0 +1,365 @@
+# browser_daemon.py
+# Long-lived warm Chromium that posting runs attach to over CDP.
+#
+#   python browser_daemon.py                    # serve, warm every known account
+#   python browser_daemon.py --max-uses 20 --max-rss-mb 1500
+#
+# The daemon keeps one context per account storage state with a page already
+# sitting on instagram.com. A client (main.py with IG_BROWSER_DAEMON=1) leases
+# that page, posts, and closes it; the daemon then re-warms the account. The
+# browser is recycled after N leases, above a memory threshold, or when a
+# health check fails.
+
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+
+STATE_FILE = Path(os.getenv("IG_BROWSER_DAEMON_STATE", "browser_daemon.json"))
+DEFAULT_PORT = int(os.getenv("IG_BROWSER_DAEMON_PORT", "9222"))
+WARM_PREFIX = "ig-warm:"
+LEASED_PREFIX = "ig-leased:"
+# A lease whose client is gone, or that outlives this, is taken back
+LEASE_TIMEOUT = float(os.getenv("IG_BROWSER_LEASE_TIMEOUT", "1800"))
+
+# Atomically claim a warm page: JS is single-threaded per page, so only one
+# client can flip the marker from warm to leased.
+CLAIM_JS = '''([warm, leased]) => {
+    if (window.name !== warm) return false;
+    window.name = leased;
+    return true;
+}'''
+
+
+def account_name(state_path):
+    return Path(state_path).stem
+
+
+def read_state():
+    """Daemon endpoint info, or None when no daemon has been started"""
+    try:
+        return json.loads(STATE_FILE.read_text())
+    except Exception:
+        return None
+
+
+def endpoint_alive(endpoint, timeout=1.0):
+    """Cheap CDP health check: /json/version answers when the browser is up"""
+    import urllib.request
+    try:
+        with urllib.request.urlopen(f"{endpoint}/json/version", timeout=timeout) as resp:
+            return resp.status == 200
+    except Exception:
+        return False
+
+
+def process_tree_rss_mb(root_pid):
+    """Resident memory of a process and all its descendants (Linux /proc only)"""
+    proc = Path("/proc")
+    if not proc.is_dir():
+        return None
+    children = {}
+    rss_pages = {}
+    for entry in proc.iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            stat = (entry / "stat").read_text()
+            # ppid is the 2nd field after the parenthesised command name
+            ppid = int(stat.rsplit(")", 1)[1].split()[1])
+            rss_pages[int(entry.name)] = int((entry / "statm").read_text().split()[1])
+            children.setdefault(ppid, []).append(int(entry.name))
+        except Exception:
+            continue
+    total, stack = 0, [root_pid]
+    while stack:
+        pid = stack.pop()
+        total += rss_pages.get(pid, 0)
+        stack.extend(children.get(pid, []))
+    return total * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def lease_pid(marker):
+    """Client pid from an ig-leased:<name>:<pid> marker, or None"""
+    try:
+        return int(marker.rsplit(":", 1)[1])
+    except (IndexError, ValueError):
+        return None
+
+
+def find_browser_pid(port):
+    """PID of the Chromium main process started with our debugging port"""
+    proc = Path("/proc")
+    if not proc.is_dir():
+        return None
+    flag = f"--remote-debugging-port={port}".encode()
+    for entry in proc.iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            cmdline = (entry / "cmdline").read_bytes()
+        except Exception:
+            continue
+        if flag in cmdline and b"--type=" not in cmdline:
+            return int(entry.name)
+    return None
+
+
+# --- client side -------------------------------------------------------------
+
+def borrow_page(browser, state_path):
+    """
+    Lease the daemon's warm page for this account from a CDP-connected browser.
+    Falls back to a fresh context on the shared browser when none is warm.
+    Returns (page, context) where context is the fallback the caller must
+    close, or None for a leased page.
+    """
+    name = account_name(state_path)
+    marker = [WARM_PREFIX + name, f"{LEASED_PREFIX}{name}:{os.getpid()}"]
+    for context in browser.contexts:
+        for page in context.pages:
+            try:
+                if page.evaluate(CLAIM_JS, marker):
+                    print(f"♨️ Borrowed warm context for {name}")
+                    return page, None
+            except Exception:
+                continue
+
+    print(f"⚠️ No warm context for {name}; opening a new one on the shared browser")
+    from main import USER_AGENT, VIEWPORT
+    context = browser.new_context(storage_state=str(state_path), user_agent=USER_AGENT, viewport=VIEWPORT)
+    return context.new_page(), context
+
+
+def attach(playwright, state_path):
+    """Connect to a running daemon; returns (browser, page, owned_context) or None"""
+    info = read_state()
+    if not info or not endpoint_alive(info["endpoint"]):
+        return None
+    try:
+        browser = playwright.chromium.connect_over_cdp(info["endpoint"])
+    except Exception as e:
+        print(f"⚠️ Could not attach to browser daemon: {e}")
+        return None
+    print(f"🔌 Attached to browser daemon at {info['endpoint']} (generation {info.get('generation')})")
+    return (browser, *borrow_page(browser, state_path))
+
+
+# --- service side ------------------------------------------------------------
+
+class BrowserDaemon:
+    """Owns the warm browser, its per-account contexts and recycling policy"""
+
+    def __init__(self, playwright, state_paths, port=DEFAULT_PORT, max_uses=25,
+                 max_rss_mb=2048, check_interval=15):
+        self.playwright = playwright
+        self.state_paths = [Path(p) for p in state_paths]
+        self.port = port
+        self.max_uses = max_uses
+        self.max_rss_mb = max_rss_mb
+        self.check_interval = check_interval
+        self.browser = None
+        self.contexts = {}
+        self.warm_pages = {}
+        self.leases = {}
+        self.uses = 0
+        self.generation = 0
+
+    @property
+    def endpoint(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self):
+        from main import BROWSER_ARGS, get_browser_config
+        started = time.monotonic()
+        self.browser = self.playwright.chromium.launch(
+            headless=get_browser_config(),
+            args=BROWSER_ARGS + [f"--remote-debugging-port={self.port}"]
+        )
+        self.generation += 1
+        self.uses = 0
+        self.contexts = {}
+        self.warm_pages = {}
+        self.leases = {}
+        for state_path in self.state_paths:
+            self.warm(state_path)
+        STATE_FILE.write_text(json.dumps({
+            "endpoint": self.endpoint,
+            "pid": os.getpid(),
+            "generation": self.generation,
+            "accounts": [account_name(p) for p in self.state_paths],
+            "started_at": time.time(),
+        }, indent=2))
+        print(f"🔥 Browser generation {self.generation} warm in {time.monotonic() - started:.1f}s at {self.endpoint}")
+
+    def warm(self, state_path):
+        """(Re)create the account context if needed and park a page on the home feed"""
+        from main import BASE_URL, USER_AGENT, VIEWPORT
+        name = account_name(state_path)
+        try:
+            context = self.contexts.get(name)
+            if context is None:
+                context = self.browser.new_context(
+                    storage_state=str(state_path), user_agent=USER_AGENT, viewport=VIEWPORT
+                )
+                self.contexts[name] = context
+            page = context.new_page()
+            page.goto(f"{BASE_URL}/", wait_until="domcontentloaded", timeout=60000)
+            page.evaluate("(marker) => { window.name = marker; }", WARM_PREFIX + name)
+            page.on("close", lambda _: self.on_page_closed(name, page))
+            self.warm_pages[name] = page
+            print(f"  ♨️ Warmed {name}")
+        except Exception as e:
+            print(f"  ⚠️ Could not warm {name}: {e}")
+
+    def on_page_closed(self, name, page):
+        self.leases.pop(page, None)
+        if self.warm_pages.get(name) is page:
+            del self.warm_pages[name]
+            self.uses += 1
+            print(f"  📤 {name} lease returned ({self.uses}/{self.max_uses} uses)")
+
+    def healthy(self):
+        if not self.browser or not self.browser.is_connected() or not endpoint_alive(self.endpoint):
+            print("  ❌ Health check: browser unreachable")
+            return False
+        # A client may have just closed its page; the close event can lag
+        for name, page in list(self.warm_pages.items()):
+            if page.is_closed():
+                self.on_page_closed(name, page)
+        for name, page in list(self.warm_pages.items()):
+            if page in self.leases:
+                continue  # in use: it may be mid-navigation
+            try:
+                self.note_lease(page, page.evaluate("window.name"))
+            except Exception as e:
+                if page.is_closed():
+                    self.on_page_closed(name, page)
+                    continue
+                print(f"  ❌ Health check: warm page for {name} is dead ({e})")
+                return False
+        return True
+
+    def note_lease(self, page, marker):
+        """Remember when a page was first seen leased, and by which pid"""
+        if page not in self.leases and marker.startswith(LEASED_PREFIX):
+            self.leases[page] = (lease_pid(marker), time.monotonic())
+        return self.leases.get(page)
+
+    def needs_recycle(self):
+        if self.uses >= self.max_uses:
+            print(f"  ♻️ Recycling after {self.uses} uses")
+            return True
+        pid = find_browser_pid(self.port)
+        rss = process_tree_rss_mb(pid) if pid else None
+        if rss is not None and rss > self.max_rss_mb:
+            print(f"  ♻️ Recycling at {rss:.0f} MB RSS (limit {self.max_rss_mb} MB)")
+            return True
+        return not self.healthy()
+
+    def reap_leases(self):
+        """
+        Close pages whose client died or held them past LEASE_TIMEOUT, so the
+        account is re-warmed; returns how many leases are still live.
+        """
+        live = 0
+        for context in list(self.contexts.values()):
+            for page in list(context.pages):
+                try:
+                    lease = self.note_lease(page, page.evaluate("window.name"))
+                except Exception:
+                    lease = self.leases.get(page)  # navigating: keep what we knew
+                if not lease:
+                    continue
+                pid, since = lease
+                if pid and pid_alive(pid) and time.monotonic() - since < LEASE_TIMEOUT:
+                    live += 1
+                    continue
+                print(f"  ⌛ Lease held by pid {pid} expired; taking the page back")
+                self.leases.pop(page, None)
+                try:
+                    page.close()
+                except Exception:
+                    pass
+        return live
+
+    def leased(self):
+        """True while any client still holds a live page of this generation"""
+        return self.reap_leases() > 0
+
+    def stop(self):
+        try:
+            if self.browser:
+                self.browser.close()
+        except Exception:
+            pass
+        self.browser = None
+
+    def serve_forever(self):
+        self.start()
+        try:
+            while True:
+                time.sleep(self.check_interval)
+                if self.needs_recycle():
+                    # Let an in-flight post finish before pulling the browser away
+                    while self.browser and self.browser.is_connected() and self.leased():
+                        time.sleep(self.check_interval)
+                    self.stop()
+                    self.start()
+                    continue
+                self.reap_leases()
+                for state_path in self.state_paths:
+                    if account_name(state_path) not in self.warm_pages:
+                        self.warm(state_path)
+        finally:
+            self.stop()
+            try:
+                STATE_FILE.unlink()
+            except Exception:
+                pass
+
+
+def default_state_paths():
+    paths = [Path(os.getenv("IG_STORAGE_STATE_PATH", "storage_state.json"))]
+    accounts_dir = Path(os.getenv("IG_ACCOUNTS_DIR", "accounts"))
+    if accounts_dir.is_dir():
+        paths.extend(sorted(accounts_dir.glob("*.json")))
+    return [p for p in paths if p.exists()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Keep a warm Chromium for main.py to attach to")
+    parser.add_argument("states", nargs="*", help="storage_state.json files to keep warm")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--max-uses", type=int, default=25, help="recycle the browser after this many leases")
+    parser.add_argument("--max-rss-mb", type=int, default=2048, help="recycle above this resident memory")
+    parser.add_argument("--check-interval", type=float, default=15, help="seconds between health checks")
+    args = parser.parse_args(argv)
+
+    from playwright.sync_api import sync_playwright
+    state_paths = [Path(p) for p in args.states] or default_state_paths()
+    if not state_paths:
+        print("⚠️ No storage states to warm; the daemon will only keep the browser up")
+
+    with sync_playwright() as p:
+        daemon = BrowserDaemon(p, state_paths, port=args.port, max_uses=args.max_uses,
+                               max_rss_mb=args.max_rss_mb, check_interval=args.check_interval)
+        try:
+            daemon.serve_forever()
+        except KeyboardInterrupt:
+            print("\n👋 Browser daemon stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+# browser_profile.py
+# Persistent per-account Chromium profiles (IG_PERSISTENT_PROFILE=1).
+#
+# Instead of a fresh new_context(storage_state=...) per run, the account gets a
+# user data dir under .browser_profiles/<account>/ launched with
+# launch_persistent_context, so the disk HTTP cache, code cache and service
+# worker state survive between runs and Instagram's bundles are not fetched
+# again. Cookies are still seeded from the storage state on every launch.
+# Caches are trimmed when the profile grows past IG_PROFILE_MAX_MB.
+#
+#   python browser_profile.py stats            # size of every profile
+#   python browser_profile.py reset [account]  # delete one or all profiles
+#   python browser_profile.py compare          # cold vs warm navigation from telemetry.jsonl
+
+import json
+import os
+import shutil
+import sys
+from pathlib import Path
+
+PROFILE_ROOT = Path(os.getenv("IG_PROFILE_DIR", ".browser_profiles"))
+MAX_PROFILE_MB = int(os.getenv("IG_PROFILE_MAX_MB", "500"))
+# Disposable parts of a profile, removed first when it is over budget
+CACHE_DIRS = ("Cache", "Code Cache", "GPUCache", "Service Worker/CacheStorage",
+              "Service Worker/ScriptCache", "DawnCache", "GrShaderCache", "ShaderCache")
+
+# Navigation timing and how much of the page came from the HTTP cache
+PAGE_LOAD_JS = '''() => {
+    const nav = performance.getEntriesByType('navigation')[0];
+    const resources = performance.getEntriesByType('resource');
+    const cached = resources.filter((r) => r.transferSize === 0 && r.decodedBodySize > 0);
+    return {
+        dom_content_loaded_ms: nav ? Math.round(nav.domContentLoadedEventEnd) : null,
+        load_ms: nav && nav.loadEventEnd ? Math.round(nav.loadEventEnd) : null,
+        resources: resources.length,
+        cached_resources: cached.length,
+        transferred_bytes: resources.reduce((sum, r) => sum + (r.transferSize || 0), 0)
+            + (nav ? nav.transferSize || 0 : 0),
+    };
+}'''
+
+# Restores storage-state localStorage on its origin when the profile lacks it
+SEED_LOCAL_STORAGE_JS = '''(origins) => {
+    const entry = origins.find((o) => o.origin === location.origin);
+    if (!entry) return;
+    for (const { name, value } of entry.localStorage || []) {
+        if (localStorage.getItem(name) === null) localStorage.setItem(name, value);
+    }
+}'''
+
+
+def use_persistent_profile():
+    return os.getenv("IG_PERSISTENT_PROFILE", "").lower() in ("1", "true", "yes")
+
+
+def profile_dir(storage_state_path):
+    """One profile per account, named after its storage state file"""
+    return PROFILE_ROOT / Path(storage_state_path).stem
+
+
+def dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def trim_profile(path, max_mb=MAX_PROFILE_MB):
+    """Drop cache directories when the profile is over budget; cookies and storage stay"""
+    size = dir_size(path)
+    if size <= max_mb * 1024 * 1024:
+        return 0
+    freed = 0
+    for cache in CACHE_DIRS:
+        for target in Path(path).glob(f"*/{cache}"):
+            freed += dir_size(target)
+            shutil.rmtree(target, ignore_errors=True)
+    print(f"🧹 Profile {path} was {size / 1e6:.0f} MB, trimmed {freed / 1e6:.0f} MB of cache")
+    return freed
+
+
+def launch_profile(playwright, storage_state_path, headless, args, user_agent, viewport):
+    """
+    launch_persistent_context on the account's profile.
+    Returns (context, state) where state is 'cold' for a new profile and 'warm' otherwise.
+    """
+    path = profile_dir(storage_state_path)
+    state = "warm" if (path / "Default").is_dir() else "cold"
+    if state == "warm":
+        trim_profile(path)
+    path.mkdir(parents=True, exist_ok=True)
+
+    context = playwright.chromium.launch_persistent_context(
+        str(path),
+        headless=headless,
+        args=args,
+        user_agent=user_agent,
+        viewport=viewport,
+    )
+    # The storage state stays the source of truth for the session
+    saved = json.loads(Path(storage_state_path).read_text())
+    if saved.get("cookies"):
+        context.add_cookies(saved["cookies"])
+    if saved.get("origins"):
+        context.add_init_script(f"({SEED_LOCAL_STORAGE_JS})({json.dumps(saved['origins'])})")
+    print(f"💾 Persistent profile {path} ({state})")
+    return context, state
+
+
+def page_load_stats(page):
+    try:
+        return page.evaluate(PAGE_LOAD_JS)
+    except Exception:
+        return None
+
+
+def reset(account=None):
+    """Delete one account's profile, or every profile"""
+    target = PROFILE_ROOT / account if account else PROFILE_ROOT
+    if target.exists():
+        shutil.rmtree(target)
+        print(f"🗑️ Removed {target}")
+    else:
+        print(f"Nothing to remove at {target}")
+
+
+def stats():
+    if not PROFILE_ROOT.is_dir():
+        print(f"No profiles in {PROFILE_ROOT}/")
+        return
+    for path in sorted(p for p in PROFILE_ROOT.iterdir() if p.is_dir()):
+        cache = sum(dir_size(t) for c in CACHE_DIRS for t in path.glob(f"*/{c}"))
+        print(f"{path.name:<24} {dir_size(path) / 1e6:8.1f} MB  (cache {cache / 1e6:.1f} MB)")
+
+
+def compare(telemetry_path=None):
+    """Navigation time and transferred bytes for cold vs warm runs recorded in telemetry"""
+    from telemetry import TELEMETRY_FILE, load_runs, percentile
+
+    path = Path(telemetry_path) if telemetry_path else TELEMETRY_FILE
+    if not path.exists():
+        print(f"⚠️ {path} not found")
+        return
+    groups = {}
+    for run in load_runs(path):
+        attrs = run.get("attrs", {})
+        load = attrs.get("page_load")
+        nav = [s["ms"] for s in run.get("spans", []) if s["name"] == "navigation"]
+        if not load or not nav:
+            continue
+        group = groups.setdefault(attrs.get("profile") or "fresh context", {"nav": [], "bytes": [], "cached": []})
+        group["nav"].append(nav[0])
+        group["bytes"].append(load["transferred_bytes"])
+        group["cached"].append(load["cached_resources"] / max(1, load["resources"]))
+
+    print(f"{'profile':<16}{'runs':>5}{'nav p50':>11}{'nav p95':>10}{'MB p50':>9}{'cached':>8}")
+    for name, group in sorted(groups.items()):
+        print(f"{name:<16}{len(group['nav']):>5}{percentile(group['nav'], 50):>9.0f}ms"
+              f"{percentile(group['nav'], 95):>8.0f}ms{percentile(group['bytes'], 50) / 1e6:>9.1f}"
+              f"{sum(group['cached']) / len(group['cached']):>8.0%}")
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    if command == "reset":
+        reset(sys.argv[2] if len(sys.argv) > 2 else None)
+    elif command == "compare":
+        compare(sys.argv[2] if len(sys.argv) > 2 else None)
+    elif command == "stats":
+        stats()
+    else:
+        print("usage: python browser_profile.py stats | reset [account] | compare [telemetry.jsonl]")
+        sys.exit(2)
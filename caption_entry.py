@@ -0,0 +1,94 @@
+# caption_entry.py
+# Puts the caption into Instagram's Lexical (contenteditable) editor in as few
+# operations as possible instead of one key event per character.
+#
+# Methods, tried in order until the editor reads back the expected text:
+#   paste   one synthetic ClipboardEvent carrying text/plain; Lexical's paste
+#           handler inserts it as a single update (lines become paragraphs)
+#   insert  one Input.insertText call through keyboard.insert_text
+#   type    keyboard.type in CAPTION_CHUNK sized chunks, the old behaviour
+#
+# Whatever was in the editor is selected first and replaced.
+import os
+import time
+
+CAPTION_CHUNK = int(os.getenv("IG_CAPTION_CHUNK", "200"))
+METHODS = ("paste", "insert", "type")
+
+PASTE_JS = '''(el, text) => {
+    el.focus();
+    const data = new DataTransfer();
+    data.setData('text/plain', text);
+    const event = new ClipboardEvent('paste', { clipboardData: data, bubbles: true, cancelable: true });
+    el.dispatchEvent(event);
+    return event.defaultPrevented;
+}'''
+
+READ_JS = "(el) => el.innerText"
+
+
+def normalize(text):
+    """Editors differ in how they render line breaks; compare words only"""
+    return " ".join((text or "").split())
+
+
+def matches(actual, expected):
+    return normalize(actual) == normalize(expected)
+
+
+def _select_all(page, element):
+    element.click()
+    page.keyboard.press("Control+a")
+
+
+async def _select_all_async(page, element):
+    await element.click()
+    await page.keyboard.press("Control+a")
+
+
+def enter_caption(page, element, text, span=None):
+    """
+    Replace the editor content with `text` (sync API).
+    Returns the method that produced a verified caption, or None.
+    """
+    started = time.monotonic()
+    for method in METHODS:
+        _select_all(page, element)
+        if method == "paste":
+            element.evaluate(PASTE_JS, text)
+        elif method == "insert":
+            page.keyboard.insert_text(text)
+        else:
+            for offset in range(0, len(text), CAPTION_CHUNK):
+                page.keyboard.type(text[offset:offset + CAPTION_CHUNK])
+        if matches(element.evaluate(READ_JS), text):
+            return _report(method, started, span)
+    return _report(None, started, span)
+
+
+async def enter_caption_async(page, element, text, span=None):
+    started = time.monotonic()
+    for method in METHODS:
+        await _select_all_async(page, element)
+        if method == "paste":
+            await element.evaluate(PASTE_JS, text)
+        elif method == "insert":
+            await page.keyboard.insert_text(text)
+        else:
+            for offset in range(0, len(text), CAPTION_CHUNK):
+                await page.keyboard.type(text[offset:offset + CAPTION_CHUNK])
+        if matches(await element.evaluate(READ_JS), text):
+            return _report(method, started, span)
+    return _report(None, started, span)
+
+
+def _report(method, started, span):
+    elapsed = (time.monotonic() - started) * 1000
+    if span is not None:
+        span["method"] = method
+        span["ok"] = method is not None
+    if method:
+        print(f"  ⌨️ Caption entered via {method} in {elapsed:.0f}ms")
+    else:
+        print(f"  ⚠️ Caption could not be verified after {elapsed:.0f}ms")
+    return method
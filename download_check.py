@@ -0,0 +1,324 @@
+# download_check.py
+# Checks ranged_download.py and drive_fetch.py against a local stand-in HTTP
+# server (stdlib http.server, no network needed).
+#
+# The server serves a fixed pseudo-random payload and can ignore Range
+# headers or drop a connection part-way through a segment. Under /uc it
+# imitates Google Drive: the virus-scan warning page (current download form,
+# older confirm link, download_warning cookie), a quota page and a 503 that
+# clears up. Each check downloads into a temporary directory and compares the
+# result byte for byte.
+#
+#   python download_check.py            # every check
+#   python download_check.py -k resume  # checks whose name contains "resume"
+
+import argparse
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import drive_fetch
+import ranged_download
+from ranged_download import TransferPolicy
+
+PAYLOAD = random.Random(8).randbytes(12 * 1024 * 1024)  # three 4 MB segments
+DROP_AFTER = 2 * ranged_download.CHUNK_SIZE + 512 * 1024  # bytes sent before a drop
+
+WARNING_FORM = '''<!DOCTYPE html><html><head><title>Google Drive - Virus scan warning</title></head><body>
+<form id="download-form" action="/download" method="get">
+<input type="submit" id="uc-download-link" value="Download anyway"/>
+<input type="hidden" name="id" value="form"><input type="hidden" name="export" value="download">
+<input type="hidden" name="confirm" value="t"><input type="hidden" name="uuid" value="u-1&amp;2">
+</form></body></html>'''
+WARNING_LINK = ('<html><head><title>Google Drive - Virus scan warning</title></head><body>'
+                '<a id="uc-download-link" href="/uc?export=download&amp;confirm=AbC1&amp;id=link">'
+                'Download anyway</a></body></html>')
+QUOTA_PAGE = '<html><head><title>Google Drive - Quota exceeded</title></head><body>Too many users</body></html>'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "StandIn/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_bytes(self, body, status=200, content_type="video/mp4", headers=None, drop_after=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if drop_after is None:
+            self.wfile.write(body)
+            return
+        self.wfile.write(body[:drop_after])
+        self.wfile.flush()
+        self.close_connection = True  # client sees a short body
+
+    def send_payload(self, ranges=True, drop=False):
+        match = re.match(r"bytes=(\d+)-(\d+)?$", self.headers.get("Range", ""))
+        if not ranges or not match:
+            return self.send_bytes(PAYLOAD)
+        start = int(match.group(1))
+        end = min(int(match.group(2) or len(PAYLOAD) - 1), len(PAYLOAD) - 1)
+        body = PAYLOAD[start:end + 1]
+        drop_after = DROP_AFTER if drop and start > 0 and self.server.stand_in.take_drop() else None
+        self.send_bytes(body, status=206, drop_after=drop_after, headers={
+            "Content-Range": f"bytes {start}-{end}/{len(PAYLOAD)}",
+            "ETag": '"v1"',
+            "Accept-Ranges": "bytes",
+        })
+
+    def send_page(self, page, status=200, cookie=None):
+        self.send_bytes(page.encode(), status=status, content_type="text/html; charset=utf-8",
+                        headers={"Set-Cookie": cookie} if cookie else None)
+
+    def do_GET(self):
+        stand_in = self.server.stand_in
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        stand_in.log(url.path, self.headers.get("Range"))
+        if url.path == "/video":
+            return self.send_payload()
+        if url.path == "/no-range":
+            return self.send_payload(ranges=False)
+        if url.path == "/drop":
+            return self.send_payload(drop=True)
+        if url.path == "/download":
+            # Target of the download form: only the exact hidden fields work
+            if query.get("confirm") == "t" and query.get("uuid") == "u-1&2":
+                return self.send_payload()
+            return self.send_page("<html><title>Bad request</title></html>", status=400)
+        if url.path == "/uc":
+            return self.drive(query.get("id"), query)
+        self.send_bytes(b"not found", status=404, content_type="text/plain")
+
+    def drive(self, file_id, query):
+        """Drive's uc endpoint for a few kinds of file"""
+        if file_id == "form":
+            return self.send_page(WARNING_FORM)
+        if file_id == "link":
+            return self.send_payload() if query.get("confirm") == "AbC1" else self.send_page(WARNING_LINK)
+        if file_id == "cookie":
+            if query.get("confirm") == "TOK":
+                return self.send_payload()
+            return self.send_page("<html><title>Google Drive</title></html>", cookie="download_warning_1=TOK; Path=/")
+        if file_id == "quota":
+            return self.send_page(QUOTA_PAGE)
+        if file_id == "busy":
+            if self.server.stand_in.take_busy():
+                return self.send_page("<html><title>Service unavailable</title></html>", status=503)
+            return self.send_payload()
+        self.send_page("<html><title>Not found</title></html>", status=404)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass  # probes hang up after the headers on purpose
+
+
+class StandIn:
+    """Threaded stand-in server; use as a context manager"""
+
+    def __init__(self, handler=_Handler):
+        self.server = _Server(("127.0.0.1", 0), handler)
+        self.server.stand_in = self
+        self.lock = threading.Lock()
+        self.requests = []  # (path, Range header)
+        self.drops = 0
+        self.busy = 0
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def log(self, path, range_header):
+        with self.lock:
+            self.requests.append((path, range_header))
+
+    def take_drop(self):
+        with self.lock:
+            if self.drops <= 0:
+                return False
+            self.drops -= 1
+            return True
+
+    def take_busy(self):
+        with self.lock:
+            if self.busy <= 0:
+                return False
+            self.busy -= 1
+            return True
+
+    def hits(self, path):
+        with self.lock:
+            return sum(1 for p, _ in self.requests if p == path)
+
+    def ranges_for(self, path):
+        with self.lock:
+            return [r for p, r in self.requests if p == path and r]
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, name="stand-in", daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _session():
+    import requests
+    return requests.Session()
+
+
+def _same_payload(path):
+    data = Path(path).read_bytes()
+    assert data == PAYLOAD, f"{path}: {len(data)} bytes differ from the {len(PAYLOAD)} byte payload"
+
+
+def _segment_starts(ranges):
+    return sorted(int(re.match(r"bytes=(\d+)-", r).group(1)) for r in ranges if r != "bytes=0-0")
+
+
+# --- checks ------------------------------------------------------------------
+
+def check_parallel_ranges(server, tmp):
+    """Range support: the file is fetched as parallel segments"""
+    dest = tmp / "parallel.mp4"
+    info = ranged_download.download(f"{server.url}/video", dest, _session(), TransferPolicy(connections=4))
+    _same_payload(dest)
+    starts = _segment_starts(server.ranges_for("/video"))
+    assert info["ranges"] and len(starts) == 3, f"expected 3 segment requests, saw {starts}"
+    assert not Path(f"{dest}.part").exists() and not Path(f"{dest}.part.json").exists(), "partial files left"
+
+
+def check_no_range_fallback(server, tmp):
+    """No Range support: one plain stream"""
+    dest = tmp / "no_range.mp4"
+    info = ranged_download.download(f"{server.url}/no-range", dest, _session(), TransferPolicy(connections=4))
+    _same_payload(dest)
+    assert not info["ranges"], "probe claimed range support"
+    assert len(server.ranges_for("/no-range")) == 1, "expected only the probe to carry a Range header"
+
+
+def check_retry_dropped_segment(server, tmp):
+    """A segment whose connection drops is retried from where it stopped"""
+    server.drops = 1
+    dest = tmp / "retried.mp4"
+    ranged_download.download(f"{server.url}/drop", dest, _session(), TransferPolicy(connections=4, max_retries=2))
+    _same_payload(dest)
+    starts = _segment_starts(server.ranges_for("/drop"))
+    resumed = [s for s in starts if s % ranged_download.MIN_SEGMENT_SIZE]
+    assert len(starts) == 4 and resumed, f"expected one mid-segment retry, saw starts {starts}"
+
+
+def check_resume_after_failed_run(server, tmp):
+    """A run that fails mid-segment leaves a checkpoint; the next run resumes it"""
+    server.drops = 1
+    dest = tmp / "resumed.mp4"
+    url = f"{server.url}/drop"
+    try:
+        ranged_download.download(url, dest, _session(), TransferPolicy(connections=4, max_retries=0))
+    except Exception as e:
+        print(f"  (first run failed as intended: {type(e).__name__})")
+    else:
+        raise AssertionError("first run should have failed on the dropped segment")
+    assert Path(f"{dest}.part.json").exists(), "no checkpoint after the failed run"
+    first_run = len(server.ranges_for("/drop"))
+
+    ranged_download.download(url, dest, _session(), TransferPolicy(connections=4, max_retries=0))
+    _same_payload(dest)
+    second = _segment_starts(server.ranges_for("/drop")[first_run:])
+    assert len(second) == 1 and second[0] % ranged_download.MIN_SEGMENT_SIZE, \
+        f"expected only the dropped segment to be resumed mid-way, saw starts {second}"
+
+
+def _drive_download(server, tmp, file_id, **policy):
+    dest = tmp / f"{file_id}.mp4"
+    drive_fetch.download(f"{server.url}/uc?export=download&id={file_id}", dest, _session(),
+                         TransferPolicy(connections=4, **policy))
+    _same_payload(dest)
+
+
+def check_confirm_form(server, tmp):
+    """Drive warning page with the download form: its hidden fields are followed"""
+    _drive_download(server, tmp, "form")
+    assert server.hits("/download") >= 2, "download form target was not used"
+
+
+def check_confirm_link(server, tmp):
+    """Older warning page: the confirm= link is followed"""
+    _drive_download(server, tmp, "link")
+
+
+def check_confirm_cookie(server, tmp):
+    """Oldest variant: the token comes from the download_warning cookie"""
+    _drive_download(server, tmp, "cookie")
+
+
+def check_html_page_aborts(server, tmp):
+    """Any other HTML page fails at once, is not retried and writes nothing"""
+    dest = tmp / "quota.mp4"
+    started = time.monotonic()
+    try:
+        drive_fetch.download(f"{server.url}/uc?export=download&id=quota", dest, _session(),
+                             TransferPolicy(max_retries=3))
+    except ranged_download.NotAVideo as e:
+        assert "Quota exceeded" in str(e), f"page title missing from the error: {e}"
+    else:
+        raise AssertionError("quota page was saved as a video")
+    assert server.hits("/uc") == 1, f"expected one request, saw {server.hits('/uc')}"
+    assert time.monotonic() - started < 2, "took retries on a permanent error"
+    assert not dest.exists() and not Path(f"{dest}.part").exists(), "bytes written for an HTML page"
+
+
+def check_transient_retry(server, tmp):
+    """A 503 is retried with backoff and the download then succeeds"""
+    server.busy = 1
+    _drive_download(server, tmp, "busy", max_retries=2)
+    assert server.busy == 0, "503 was never served"
+
+
+CHECKS = [check_parallel_ranges, check_no_range_fallback, check_retry_dropped_segment,
+          check_resume_after_failed_run, check_confirm_form, check_confirm_link,
+          check_confirm_cookie, check_html_page_aborts, check_transient_retry]
+
+
+def run(checks):
+    failed = 0
+    for check in checks:
+        name = check.__name__[len("check_"):]
+        started = time.monotonic()
+        with StandIn() as server, tempfile.TemporaryDirectory() as tmp:
+            try:
+                check(server, Path(tmp))
+                print(f"✅ {name} ({(time.monotonic() - started) * 1000:.0f}ms) - {check.__doc__}")
+            except Exception as e:
+                failed += 1
+                print(f"❌ {name}: {type(e).__name__}: {e}")
+    print(f"\n{len(checks) - failed}/{len(checks)} checks passed")
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the downloader against a local stand-in server")
+    parser.add_argument("-k", dest="pattern", help="only run checks whose name contains this")
+    args = parser.parse_args(argv)
+    checks = [c for c in CHECKS if not args.pattern or args.pattern in c.__name__]
+    return run(checks)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,216 @@
+# event_capture.py
+# Low-overhead capture of page console output, page errors and API responses.
+#
+# Filtering happens inside the page: an init script wraps console methods for
+# the wanted levels, listens for error/unhandledrejection and watches resource
+# timings with a PerformanceObserver, keeping only URLs that match
+# IG_EVENT_URL_PATTERN. Survivors are batched and handed to Python through one
+# binding call per batch instead of one driver event per message or response.
+# On the Python side batches go into a bounded queue that a background thread
+# drains into events.jsonl, so a burst of page noise never blocks the flow.
+#
+#   IG_EVENT_LEVELS=error,warning   console levels kept (error always kept)
+#   IG_EVENT_SAMPLE=1.0             fraction of non-error events kept
+#   IG_EVENT_URL_PATTERN=...        regex for responses worth logging
+#   IG_EVENT_LOG=events.jsonl       structured log, IG_EVENT_ECHO=0 silences stdout
+import json
+import os
+import queue
+import threading
+import time
+
+BINDING = "__igEvents"
+DEFAULT_URL_PATTERN = r"/upload/|/rupload|/media/|/graphql/|/api/v1/"
+
+CAPTURE_JS = '''(cfg) => {
+    if (window.__igCapture) return;
+    window.__igCapture = true;
+    const urlPattern = new RegExp(cfg.urlPattern);
+    let batch = [];
+    let dropped = 0;
+    let timer = null;
+
+    const flush = () => {
+        timer = null;
+        if (!batch.length || typeof window[cfg.binding] !== 'function') return;
+        const out = batch;
+        const lost = dropped;
+        batch = [];
+        dropped = 0;
+        window[cfg.binding](out, lost).catch(() => {});
+    };
+    const push = (record) => {
+        if (record.level !== 'error' && Math.random() >= cfg.sample) return;
+        if (batch.length >= cfg.maxBatch * 4) { dropped++; return; }
+        record.t = Date.now();
+        batch.push(record);
+        if (batch.length >= cfg.maxBatch) flush();
+        else if (!timer) timer = setTimeout(flush, cfg.flushMs);
+    };
+    const text = (args) => args.map((a) => {
+        if (typeof a === 'string') return a;
+        try { return JSON.stringify(a); } catch (e) { return String(a); }
+    }).join(' ').slice(0, 2000);
+
+    for (const [method, level] of [['log', 'log'], ['info', 'info'], ['debug', 'debug'],
+                                   ['warn', 'warning'], ['error', 'error']]) {
+        if (level !== 'error' && !cfg.levels.includes(level)) continue;
+        const original = console[method];
+        console[method] = function (...args) {
+            push({ kind: 'console', level, text: text(args) });
+            return original.apply(this, args);
+        };
+    }
+    window.addEventListener('error', (e) => push({
+        kind: 'pageerror', level: 'error', text: String(e.message), source: e.filename, line: e.lineno
+    }));
+    window.addEventListener('unhandledrejection', (e) => push({
+        kind: 'pageerror', level: 'error', text: 'Unhandled rejection: ' + String(e.reason)
+    }));
+    try {
+        new PerformanceObserver((list) => {
+            for (const entry of list.getEntries()) {
+                if (!urlPattern.test(entry.name)) continue;
+                push({
+                    kind: 'response', level: 'info', url: entry.name,
+                    status: entry.responseStatus || null,
+                    ms: Math.round(entry.duration), bytes: entry.transferSize
+                });
+            }
+        }).observe({ type: 'resource', buffered: true });
+    } catch (e) {}
+    addEventListener('pagehide', flush);
+}'''
+
+
+def _env_float(name, default):
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return float(default)
+
+
+class EventCapture:
+    """In-page filtered, batched page events written by a background thread"""
+
+    def __init__(self, path=None, levels=None, sample=None, url_pattern=None,
+                 max_queue=2000, flush_ms=250, max_batch=50, echo=None):
+        self.path = path or os.getenv("IG_EVENT_LOG", "events.jsonl")
+        levels = levels or os.getenv("IG_EVENT_LEVELS", "error,warning")
+        self.config = {
+            "binding": BINDING,
+            "levels": [level.strip() for level in levels.split(",") if level.strip()],
+            "sample": sample if sample is not None else _env_float("IG_EVENT_SAMPLE", "1.0"),
+            "urlPattern": url_pattern or os.getenv("IG_EVENT_URL_PATTERN", DEFAULT_URL_PATTERN),
+            "flushMs": flush_ms,
+            "maxBatch": max_batch,
+        }
+        self.echo = echo if echo is not None else os.getenv("IG_EVENT_ECHO", "1") != "0"
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.lock = threading.Lock()
+        self.stats = {"written": 0, "dropped_page": 0, "dropped_queue": 0}
+        self.writer = None
+
+    @property
+    def script(self):
+        return f"({CAPTURE_JS})({json.dumps(self.config)})"
+
+    def start(self):
+        if self.writer is None:
+            self.writer = threading.Thread(target=self._drain, name="event-writer", daemon=True)
+            self.writer.start()
+        return self
+
+    def _binding(self, tags):
+        def on_batch(source, events, dropped=0):
+            self.submit(events, dropped, tags)
+        return on_batch
+
+    def install(self, page, **tags):
+        """Expose the batch binding and inject the filter (now and on every navigation)"""
+        self.start()
+        page.expose_binding(BINDING, self._binding(tags))
+        page.add_init_script(self.script)
+        try:
+            page.evaluate(self.script)  # current document, e.g. a pre-warmed page
+        except Exception:
+            pass
+        page.on("requestfailed", lambda req: self._request_failed(req, tags))
+
+    async def install_async(self, page, **tags):
+        self.start()
+        await page.expose_binding(BINDING, self._binding(tags))
+        await page.add_init_script(self.script)
+        try:
+            await page.evaluate(self.script)
+        except Exception:
+            pass
+        page.on("requestfailed", lambda req: self._request_failed(req, tags))
+
+    def _request_failed(self, request, tags):
+        failure = request.failure or ""
+        if "ERR_BLOCKED_BY_CLIENT" in failure or "ERR_ABORTED" in failure:
+            return  # our own resource blocking / navigation aborts
+        self.submit([{"kind": "requestfailed", "level": "error", "url": request.url,
+                      "text": failure, "t": int(time.time() * 1000)}], 0, tags)
+
+    def submit(self, events, dropped=0, tags=None):
+        """Queue records without blocking; overflow is counted, not waited on"""
+        with self.lock:
+            self.stats["dropped_page"] += dropped or 0
+        for event in events:
+            if tags:
+                event.update(tags)
+            try:
+                self.queue.put_nowait(event)
+            except queue.Full:
+                with self.lock:
+                    self.stats["dropped_queue"] += 1
+
+    def _drain(self):
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                event = self.queue.get()
+                if event is None:
+                    break
+                batch = [event]
+                while len(batch) < 500:
+                    try:
+                        event = self.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if event is None:
+                        self.queue.put(None)
+                        break
+                    batch.append(event)
+                for record in batch:
+                    f.write(json.dumps(record, default=str) + "\n")
+                    if self.echo:
+                        print(self._format(record))
+                f.flush()
+                with self.lock:
+                    self.stats["written"] += len(batch)
+
+    @staticmethod
+    def _format(record):
+        prefix = f"[{record['account']}] " if "account" in record else ""
+        kind = record.get("kind")
+        if kind == "response":
+            return f"{prefix}RESPONSE [{record.get('status') or '?'}] {record.get('url')} ({record.get('ms')}ms)"
+        if kind == "requestfailed":
+            return f"{prefix}REQUEST FAILED: {record.get('url')} -> {record.get('text')}"
+        if kind == "pageerror":
+            return f"{prefix}PAGE ERROR: {record.get('text')}"
+        return f"{prefix}PAGE CONSOLE [{record.get('level')}]: {record.get('text')}"
+
+    def close(self):
+        """Flush the queue, stop the writer and return the counters"""
+        if self.writer is not None:
+            self.queue.put(None)
+            self.writer.join(timeout=10)
+            self.writer = None
+        stats = dict(self.stats)
+        lost = stats["dropped_page"] + stats["dropped_queue"]
+        if stats["written"] or lost:
+            print(f"📝 {stats['written']} page events logged to {self.path}" + (f", {lost} dropped" if lost else ""))
+        return stats
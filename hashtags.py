@@ -1,34 +1,151 @@
 # hashtags.py
+import json
+import os
 import random
-from pytrends.request import TrendReq
+import threading
+import time
+from pathlib import Path
+
+# Persistent cache: tags are served from here, Trends is refreshed off the critical path
+CACHE_FILE = Path(os.getenv("IG_HASHTAG_CACHE", ".hashtag_cache.json"))
+CACHE_TTL = int(os.getenv("IG_HASHTAG_TTL", str(6 * 3600)))        # seconds until stale
+FETCH_BUDGET = float(os.getenv("IG_HASHTAG_BUDGET", "5"))           # max seconds for a live fetch
+FAILURE_BACKOFF = int(os.getenv("IG_HASHTAG_BACKOFF", "900"))       # skip live fetches after a failure
+
+# --- Fallback list: popular global hashtags ---
+FALLBACK = [
+    "#love", "#instagood", "#fashion", "#photooftheday", "#beautiful",
+    "#art", "#photography", "#happy", "#picoftheday", "#follow",
+    "#selfie", "#summer", "#reels", "#explorepage", "#instadaily",
+    "#style", "#smile", "#like4like", "#music", "#friends",
+    "#travel", "#fitness", "#life", "#beauty", "#motivation",
+    "#viral", "#funny", "#tiktok", "#trend", "#instagram"
+]
+
+_refresh_lock = threading.Lock()
+
+
+def fetch_trending_hashtags(timeout=FETCH_BUDGET):
+    """Live Google Trends lookup (slow, network-bound); returns a list or raises"""
+    from pytrends.request import TrendReq  # pulls in pandas - only load when fetching
+
+    pytrends = TrendReq(hl="en-US", tz=360, timeout=(timeout, timeout))
+    pytrends.build_payload(kw_list=["Instagram", "TikTok", "Reels"])
+    trends = pytrends.trending_searches(pn="united_states")
+
+    # take top 20 and convert to hashtags
+    return [f"#{t.replace(' ', '')}" for t in trends[0].tolist()[:20]]
+
+
+def read_cache():
+    try:
+        return json.loads(CACHE_FILE.read_text())
+    except Exception:
+        return {}
+
+
+def _update_cache(**fields):
+    cache = read_cache()
+    cache.update(fields)
+    tmp = CACHE_FILE.with_suffix(".tmp")
+    tmp.write_text(json.dumps(cache, indent=2))
+    os.replace(tmp, CACHE_FILE)
+    return cache
+
+
+def refresh_cache(timeout=FETCH_BUDGET):
+    """Fetch from Trends and store the result with freshness metadata"""
+    attempted_at = time.time()
+    try:
+        trending = fetch_trending_hashtags(timeout)
+    except Exception as e:
+        _update_cache(last_attempt=attempted_at, last_error=str(e))
+        raise
+    if not trending:
+        _update_cache(last_attempt=attempted_at, last_error="empty result")
+        return None
+    _update_cache(tags=trending, source="pytrends", fetched_at=time.time(),
+                  last_attempt=attempted_at, last_error=None,
+                  fetch_seconds=round(time.time() - attempted_at, 2))
+    return trending
+
+
+def _refresh_quietly():
+    if not _refresh_lock.acquire(blocking=False):
+        return  # a refresh is already running
+    try:
+        refresh_cache(timeout=max(FETCH_BUDGET, 10))
+        print("🔄 Hashtag cache refreshed in background")
+    except Exception as e:
+        print("⚠️ Background hashtag refresh failed:", e)
+    finally:
+        _refresh_lock.release()
+
+
+def refresh_in_background():
+    thread = threading.Thread(target=_refresh_quietly, name="hashtag-refresh", daemon=True)
+    thread.start()
+    return thread
+
+
+def _fetch_within_budget(budget):
+    """Run refresh_cache in a worker and give up after `budget` seconds"""
+    result = {}
+
+    def worker():
+        with _refresh_lock:
+            try:
+                result["tags"] = refresh_cache(timeout=budget)
+            except Exception as e:
+                result["error"] = e
+
+    thread = threading.Thread(target=worker, name="hashtag-fetch", daemon=True)
+    thread.start()
+    thread.join(budget)
+    if thread.is_alive():
+        print(f"⚠️ Pytrends exceeded {budget:.1f}s budget, not waiting for it")
+        return None
+    if "error" in result:
+        print("⚠️ Pytrends failed, using fallback hashtags:", result["error"])
+    return result.get("tags")
+
+
+def peek_hashtags():
+    """What get_trending_hashtags would serve, from the cache only: (tags, source)"""
+    cache = read_cache()
+    if cache.get("tags"):
+        age = time.time() - cache.get("fetched_at", 0)
+        state = "fresh" if age < CACHE_TTL else "stale"
+        return cache["tags"], f"{state} cache, {age / 3600:.1f} h old"
+    return FALLBACK[:20], "no cache - live fetch or fallback list at run time"
+
 
 def get_trending_hashtags():
     """
-    Fetch trending hashtags using Google Trends.
-    Falls back to a static global list if unavailable.
+    Trending hashtags without putting Google Trends on the critical path.
+    Fresh cache is returned as is; stale cache is returned immediately while a
+    background refresh runs; with no cache a live fetch gets FETCH_BUDGET
+    seconds before falling back to a static global list.
     """
-    try:
-        pytrends = TrendReq(hl="en-US", tz=360)
-        pytrends.build_payload(kw_list=["Instagram", "TikTok", "Reels"])
-        trends = pytrends.trending_searches(pn="united_states")
+    cache = read_cache()
+    if cache.get("tags"):
+        age = time.time() - cache.get("fetched_at", 0)
+        if age < CACHE_TTL:
+            print(f"✅ Using cached trending hashtags ({age / 60:.0f} min old)")
+        else:
+            print(f"♻️ Using stale trending hashtags ({age / 3600:.1f} h old), refreshing in background")
+            refresh_in_background()
+        return cache["tags"]
 
-        # take top 20 and convert to hashtags
-        trending = [f"#{t.replace(' ', '')}" for t in trends[0].tolist()[:20]]
+    recently_failed = time.time() - cache.get("last_attempt", 0) < FAILURE_BACKOFF
+    if recently_failed:
+        print("⚠️ Pytrends failed recently, using fallback hashtags and retrying in background")
+        refresh_in_background()
+    else:
+        trending = _fetch_within_budget(FETCH_BUDGET)
         if trending:
             print("✅ Got trending hashtags from pytrends")
             return trending
-    except Exception as e:
-        print("⚠️ Pytrends failed, using fallback hashtags:", e)
-
-    # --- Fallback list: popular global hashtags ---
-    fallback = [
-        "#love", "#instagood", "#fashion", "#photooftheday", "#beautiful",
-        "#art", "#photography", "#happy", "#picoftheday", "#follow",
-        "#selfie", "#summer", "#reels", "#explorepage", "#instadaily",
-        "#style", "#smile", "#like4like", "#music", "#friends",
-        "#travel", "#fitness", "#life", "#beauty", "#motivation",
-        "#viral", "#funny", "#tiktok", "#trend", "#instagram"
-    ]
 
     # randomize fallback list a bit each run
-    return random.sample(fallback, 20)
+    return random.sample(FALLBACK, 20)
@@ -0,0 +1,186 @@
+# ig_selectors.py
+# Selector candidates for each step of the Create flow, shared by the sync and
+# async automations, and the registry that orders them.
+#
+# STEP_CANDIDATES is the default priority order. SelectorRegistry adds any
+# extra candidates from selectors.json and reorders each step by what past
+# runs observed (match rate, then latency), decaying old observations so a
+# markup change is picked up within a few runs. Statistics persist in
+# .selector_stats.json.
+#
+#   selectors.json: {"select_computer": [{"css": "button", "text": "Upload"}]}
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from selector_race import candidate
+
+STEP_CANDIDATES = {
+    'create': [
+        candidate('span', text='Create', clickable_parent=True),
+        candidate('*', text='Create'),
+        candidate('div:has(span)', text='Create'),
+        candidate('a:has(span)', text='Create'),
+        candidate('span.x1lliihq', text='Create'),
+    ],
+    'select_computer': [
+        candidate('button', text='Select from computer'),
+        candidate('button._aswp._aswr._aswu._asw_._asx2', text='Select from computer'),
+        candidate('button._aswp', text='Select from computer'),
+        candidate('button[type="button"]', text='Select from computer'),
+        # Fallbacks accept any button once the precise selectors had their chance
+        candidate('button._aswp', fallback=True),
+        candidate('button._aswr', fallback=True),
+        candidate('button[type="button"]', fallback=True),
+    ],
+    'next': [
+        candidate('div[role="button"]', text='Next', enabled=True),
+        candidate('*', text='Next', enabled=True),
+        candidate('div.x1i10hfl.xjqpnuy', text='Next', enabled=True),
+        candidate('div.x1i10hfl', text='Next', enabled=True),
+        candidate('div[role="button"][tabindex="0"]', text='Next', enabled=True),
+        candidate('div.x1i10hfl[role="button"]', fallback=True, enabled=True),
+        candidate('div[role="button"][tabindex="0"]', fallback=True, enabled=True),
+    ],
+    'caption': [
+        candidate('div[aria-label="Write a caption..."]'),
+        candidate('div[contenteditable="true"][aria-label*="caption"]'),
+        candidate('div.xw2csxc.x1odjw0f[contenteditable="true"]'),
+        candidate('div.xw2csxc[contenteditable="true"]'),
+        candidate('div[contenteditable="true"][role="textbox"]'),
+        candidate('div[contenteditable="true"]'),
+        candidate('div[data-lexical-editor="true"]'),
+    ],
+    'share': [
+        candidate('div[role="button"]', text='Share'),
+        candidate('*', text='Share'),
+        candidate('div.x1i10hfl.xjqpnuy', text='Share'),
+        candidate('div.x1i10hfl', text='Share'),
+        candidate('div[role="button"][tabindex="0"]', text='Share'),
+        candidate('button', text='Share'),
+        candidate('span', text='Share'),
+    ],
+}
+
+STATS_FILE = Path(os.getenv("IG_SELECTOR_STATS", ".selector_stats.json"))
+OVERRIDES_FILE = Path(os.getenv("IG_SELECTORS_FILE", "selectors.json"))
+# Observations lose half their weight every HALF_LIFE_DAYS
+HALF_LIFE_DAYS = float(os.getenv("IG_SELECTOR_HALF_LIFE_DAYS", "7"))
+# Latency average: weight of the newest observation
+LATENCY_ALPHA = 0.3
+
+
+def load_overrides(path=OVERRIDES_FILE):
+    """Extra candidates per step from a JSON file of candidate() keyword arguments"""
+    try:
+        data = json.loads(Path(path).read_text())
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Ignoring unreadable {path}: {e}")
+        return {}
+    extra = {}
+    for step, entries in data.items():
+        try:
+            extra[step] = [candidate(**entry) for entry in entries]
+        except TypeError as e:
+            print(f"⚠️ Ignoring bad selector override for '{step}': {e}")
+    return extra
+
+
+class SelectorRegistry:
+    """Per-step candidate lists ordered by decayed match rate and latency"""
+
+    def __init__(self, path=STATS_FILE, defaults=None, overrides=None, half_life_days=HALF_LIFE_DAYS):
+        self.path = Path(path) if path else None  # None keeps statistics in memory only
+        self.half_life = half_life_days * 86400
+        self.lock = threading.Lock()
+        self.steps = {step: list(candidates) for step, candidates in (defaults or STEP_CANDIDATES).items()}
+        for step, extra in (load_overrides() if overrides is None else overrides).items():
+            labels = {c['label'] for c in self.steps.get(step, [])}
+            self.steps.setdefault(step, []).extend(c for c in extra if c['label'] not in labels)
+        self.stats = self._load()
+
+    def _load(self):
+        if not self.path:
+            return {}
+        try:
+            return json.loads(self.path.read_text())
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Selector stats unreadable, starting fresh: {e}")
+            return {}
+
+    def _decayed(self, stat, now):
+        """(hits, trials) after applying the half-life since the last update"""
+        factor = 0.5 ** (max(0.0, now - stat['updated']) / self.half_life) if self.half_life > 0 else 1.0
+        return stat['hits'] * factor, stat['trials'] * factor
+
+    def score(self, step, label, now=None):
+        """(match rate, mean latency ms); unseen candidates get a neutral 0.5"""
+        stat = self.stats.get(step, {}).get(label)
+        if not stat:
+            return 0.5, None
+        hits, trials = self._decayed(stat, now or time.time())
+        return (hits + 1) / (trials + 2), stat.get('ms')
+
+    def candidates(self, step):
+        """Candidates for `step`, best observed first; ties keep the default order"""
+        now = time.time()
+        with self.lock:
+            ranked = []
+            for index, c in enumerate(self.steps[step]):
+                rate, ms = self.score(step, c['label'], now)
+                # Rates are bucketed so small differences fall through to latency
+                ranked.append((-round(rate, 1), ms if ms is not None else float('inf'), index, c))
+        return [c for *_, c in sorted(ranked, key=lambda item: item[:3])]
+
+    def record(self, step, candidates, result):
+        """Update statistics from one race over `candidates` (None result = nothing matched)"""
+        now = time.time()
+        matched = set(result['matched']) if result else set()
+        with self.lock:
+            step_stats = self.stats.setdefault(step, {})
+            for index, c in enumerate(candidates):
+                stat = step_stats.get(c['label'])
+                if stat:
+                    hits, trials = self._decayed(stat, now)
+                else:
+                    stat, hits, trials = {'ms': None}, 0.0, 0.0
+                stat.update(hits=hits + (index in matched), trials=trials + 1, updated=now)
+                if index in matched:
+                    elapsed = result['elapsed_ms']
+                    stat['ms'] = elapsed if stat['ms'] is None else (
+                        LATENCY_ALPHA * elapsed + (1 - LATENCY_ALPHA) * stat['ms'])
+                step_stats[c['label']] = stat
+
+    def save(self):
+        if not self.path:
+            return
+        with self.lock:
+            data = json.dumps(self.stats, indent=1)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(data)
+        os.replace(tmp, self.path)
+
+
+_registry = None
+
+
+def get_selector_registry():
+    global _registry
+    if _registry is None:
+        _registry = SelectorRegistry()
+    return _registry
+
+
+if __name__ == "__main__":
+    registry = get_selector_registry()
+    for step in registry.steps:
+        print(f"\n{step}")
+        for c in registry.candidates(step):
+            rate, ms = registry.score(step, c['label'])
+            latency = f"{ms:.0f}ms" if ms is not None else "-"
+            print(f"  {rate:5.0%} {latency:>8}  {c['label']}")
@@ -0,0 +1,404 @@
+# job_queue.py
+# Durable SQLite queue of post jobs.
+#
+# Each job names an account (storage state file), an optional video link
+# (random drive_links.txt line otherwise), a caption template and a scheduled
+# time. Workers claim due jobs atomically under a lease, so several workers
+# (or an overlapping cron run) never take the same job. Failures are retried
+# with exponential backoff. Idempotency keys make enqueueing safe to repeat,
+# and a job whose Share click may have gone through is never retried
+# automatically. The campaign day counter lives in the same database: a job
+# takes the current day when it is claimed and only a successful post advances
+# the counter, so failed jobs leave no gaps. `daily` adds nothing while an
+# earlier daily job of the account is still waiting for its retry, so the
+# retry takes that day's slot instead of a second post going out.
+#
+#   python job_queue.py daily                       # today's job for storage_state.json (idempotent)
+#   python job_queue.py enqueue --account accounts/a.json --in 3600 --key promo-1
+#   python job_queue.py work --rate 6               # drain due jobs, at most 6 posts/hour
+#   python job_queue.py status
+#   python job_queue.py retry 12
+
+import argparse
+import os
+import random
+import socket
+import sqlite3
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import date, datetime
+from pathlib import Path
+
+DB_PATH = Path(os.getenv("IG_JOB_DB", "jobs.db"))
+DEFAULT_ACCOUNT = os.getenv("IG_STORAGE_STATE_PATH", "storage_state.json")
+LEASE_SECONDS = int(os.getenv("IG_JOB_LEASE", "1800"))
+MAX_ATTEMPTS = int(os.getenv("IG_JOB_MAX_ATTEMPTS", "5"))
+BACKOFF_BASE = float(os.getenv("IG_JOB_BACKOFF", "300"))
+BACKOFF_MAX = 6 * 3600
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    account TEXT NOT NULL,
+    video TEXT,
+    caption_template TEXT NOT NULL,
+    day INTEGER NOT NULL,
+    auto_day INTEGER NOT NULL DEFAULT 0,
+    scheduled_at REAL NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    share_started_at REAL,
+    media_id TEXT,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_due ON jobs (status, scheduled_at);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+'''
+
+# pending -> leased -> done
+#                   -> pending (retry with backoff) -> ... -> failed
+#                   -> unconfirmed (Share was clicked; needs a human look, see `retry`)
+#                   -> failed (lease expired on the last attempt)
+
+
+class JobQueue:
+    def __init__(self, path=DB_PATH):
+        self.path = Path(path)
+        self.conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self._migrate()
+        self._seed_day()
+
+    def _migrate(self):
+        columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(jobs)")}
+        if "auto_day" not in columns:
+            self.conn.execute("ALTER TABLE jobs ADD COLUMN auto_day INTEGER NOT NULL DEFAULT 0")
+
+    @contextmanager
+    def transaction(self):
+        """BEGIN IMMEDIATE: takes the write lock up front, so claims cannot interleave"""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.conn
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    def _seed_day(self):
+        from main import read_day
+        with self.transaction() as db:
+            db.execute("INSERT OR IGNORE INTO counters (name, value) VALUES ('day', ?)", (read_day(),))
+
+    def enqueue(self, account, video=None, caption_template=None, scheduled_at=None, key=None,
+                day=None, max_attempts=MAX_ATTEMPTS):
+        """
+        Add a job; returns (job_id, created). A job with the same idempotency key
+        is returned as-is instead of being added twice. Without an explicit day
+        the job takes the campaign day current when it is claimed.
+        """
+        from main import CAPTION_TEMPLATE
+        now = time.time()
+        key = key or uuid.uuid4().hex
+        with self.transaction() as db:
+            row = db.execute("SELECT id FROM jobs WHERE idempotency_key = ?", (key,)).fetchone()
+            if row:
+                return row["id"], False
+            auto_day = day is None
+            if auto_day:
+                # Provisional, for `status`; claim() sets the real one
+                day = db.execute("SELECT value FROM counters WHERE name = 'day'").fetchone()["value"]
+            cursor = db.execute(
+                "INSERT INTO jobs (idempotency_key, account, video, caption_template, day, auto_day,"
+                " scheduled_at, max_attempts, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, str(account), video, caption_template or CAPTION_TEMPLATE, day, int(auto_day),
+                 scheduled_at or now, max_attempts, now, now),
+            )
+            return cursor.lastrowid, True
+
+    def enqueue_daily(self, account, today=None):
+        """
+        Today's job for `account` (idempotent); returns (job_id, created). While
+        an earlier daily job of the account is still pending a retry, that job
+        is returned instead and nothing is added.
+        """
+        key = f"daily:{Path(account).stem}:{(today or date.today()).isoformat()}"
+        row = self.conn.execute(
+            "SELECT id FROM jobs WHERE account = ? AND idempotency_key LIKE 'daily:%'"
+            " AND idempotency_key != ? AND status IN ('pending', 'leased') ORDER BY id LIMIT 1",
+            (str(account), key),
+        ).fetchone()
+        if row:
+            return row["id"], False
+        return self.enqueue(account, key=key)
+
+    def claim(self, owner, lease_seconds=LEASE_SECONDS):
+        """Lease the next due job to `owner`; None when nothing is due"""
+        now = time.time()
+        with self.transaction() as db:
+            # An expired lease after Share may already have posted: park it, never re-run it
+            db.execute(
+                "UPDATE jobs SET status = 'unconfirmed', lease_owner = NULL, updated_at = ?,"
+                " last_error = 'lease expired after Share was clicked'"
+                " WHERE status = 'leased' AND lease_expires < ? AND share_started_at IS NOT NULL",
+                (now, now),
+            )
+            # An expired lease on the last allowed attempt is out of retries
+            db.execute(
+                "UPDATE jobs SET status = 'failed', lease_owner = NULL, updated_at = ?,"
+                " last_error = 'lease expired on the last attempt'"
+                " WHERE status = 'leased' AND lease_expires < ? AND attempts >= max_attempts",
+                (now, now),
+            )
+            row = db.execute(
+                "SELECT id FROM jobs WHERE (status = 'pending' AND scheduled_at <= ?)"
+                " OR (status = 'leased' AND lease_expires < ?)"
+                " ORDER BY scheduled_at, id LIMIT 1",
+                (now, now),
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute(
+                "UPDATE jobs SET status = 'leased', lease_owner = ?, lease_expires = ?,"
+                " attempts = attempts + 1, updated_at = ?,"
+                " day = CASE WHEN auto_day THEN (SELECT value FROM counters WHERE name = 'day') ELSE day END"
+                " WHERE id = ?",
+                (owner, now + lease_seconds, now, row["id"]),
+            )
+            return dict(db.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone())
+
+    def _update_leased(self, job_id, owner, sql, params):
+        """Apply `sql` only while `owner` still holds the lease"""
+        with self.transaction() as db:
+            cursor = db.execute(sql + " WHERE id = ? AND status = 'leased' AND lease_owner = ?",
+                                (*params, job_id, owner))
+            if cursor.rowcount == 0:
+                print(f"⚠️ Job {job_id}: lease lost, result not recorded")
+            return cursor.rowcount == 1
+
+    def extend_lease(self, job_id, owner, lease_seconds=LEASE_SECONDS):
+        """Push the lease out at a phase boundary; False when it was already lost"""
+        return self._update_leased(job_id, owner, "UPDATE jobs SET lease_expires = ?, updated_at = ?",
+                                   (time.time() + lease_seconds, time.time()))
+
+    def mark_sharing(self, job_id, owner, lease_seconds=LEASE_SECONDS):
+        """Record that Share is about to be clicked, with a fresh lease for the confirmation"""
+        return self._update_leased(
+            job_id, owner, "UPDATE jobs SET share_started_at = ?, lease_expires = ?, updated_at = ?",
+            (time.time(), time.time() + lease_seconds, time.time()),
+        )
+
+    def complete(self, job_id, owner, media_id=None):
+        """Mark the job done and move the day counter past its day"""
+        with self.transaction() as db:
+            cursor = db.execute(
+                "UPDATE jobs SET status = 'done', media_id = ?, last_error = NULL, lease_owner = NULL,"
+                " updated_at = ? WHERE id = ? AND status = 'leased' AND lease_owner = ?",
+                (media_id, time.time(), job_id, owner),
+            )
+            if cursor.rowcount == 0:
+                print(f"⚠️ Job {job_id}: lease lost, result not recorded")
+                return False
+            db.execute("UPDATE counters SET value = MAX(value, (SELECT day FROM jobs WHERE id = ?) + 1)"
+                       " WHERE name = 'day'", (job_id,))
+            return True
+
+    def fail(self, job_id, owner, error, share_clicked=False):
+        """Retry later with backoff, park as unconfirmed after Share, or give up"""
+        job = self.get(job_id)
+        now = time.time()
+        if share_clicked:
+            status, scheduled_at = "unconfirmed", job["scheduled_at"]
+        elif job["attempts"] >= job["max_attempts"]:
+            status, scheduled_at = "failed", job["scheduled_at"]
+        else:
+            delay = min(BACKOFF_BASE * 2 ** (job["attempts"] - 1), BACKOFF_MAX) * random.uniform(0.8, 1.2)
+            status, scheduled_at = "pending", now + delay
+        updated = self._update_leased(
+            job_id, owner,
+            "UPDATE jobs SET status = ?, scheduled_at = ?, last_error = ?, lease_owner = NULL, updated_at = ?",
+            (status, scheduled_at, str(error)[:500], now),
+        )
+        if updated and status == "pending":
+            print(f"🔁 Job {job_id} retry {job['attempts']}/{job['max_attempts']} "
+                  f"in {(scheduled_at - now) / 60:.0f} min")
+        elif updated:
+            print(f"🛑 Job {job_id} {status}: {error}")
+        return updated
+
+    def retry(self, job_id):
+        """Manually requeue a failed/unconfirmed job (after checking it did not post)"""
+        with self.transaction() as db:
+            cursor = db.execute(
+                "UPDATE jobs SET status = 'pending', scheduled_at = ?, share_started_at = NULL,"
+                " attempts = 0, updated_at = ? WHERE id = ? AND status IN ('failed', 'unconfirmed')",
+                (time.time(), time.time(), job_id),
+            )
+            return cursor.rowcount == 1
+
+    def get(self, job_id):
+        row = self.conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def recent(self, limit=20):
+        return [dict(r) for r in self.conn.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,))]
+
+
+def run_job(queue, job, owner, lease_seconds=LEASE_SECONDS):
+    """Download, preflight and post one job through main's browser flow"""
+    from main import (prepare_video, build_caption, run_browser_flow, read_day, write_next_day,
+                      choose_video_link)
+    import video_manifest
+    from pipeline import PhaseTimer
+    from telemetry import Telemetry
+    from event_capture import EventCapture
+
+    print(f"\n🗂️ Job {job['id']} (attempt {job['attempts']}/{job['max_attempts']}): "
+          f"{Path(job['account']).stem}, day {job['day']}")
+    timer = PhaseTimer()
+    telemetry = Telemetry(job=job["id"], day=job["day"], account=Path(job["account"]).stem,
+                          attempt=job["attempts"])
+    capture = EventCapture()
+    dest = Path(f"video_job{job['id']}.mp4")
+    error = None
+    success = False
+    link = None
+    try:
+        if not Path(job["account"]).exists():
+            raise FileNotFoundError(f"storage state {job['account']} not found")
+        link = job["video"] or choose_video_link(job["day"])
+        try:
+            video_path = prepare_video(timer, dest, link)
+        except Exception as e:
+            video_manifest.record_failure(link, e)
+            raise
+        # A slow download must not let another worker claim the job mid-upload
+        if not queue.extend_lease(job["id"], owner, lease_seconds):
+            raise RuntimeError("job lease lost during download")
+        caption = timer.timed("hashtags", build_caption, job["day"], job["caption_template"])
+        success = run_browser_flow(job["account"], video_path, caption, timer, telemetry, capture,
+                                   before_share=lambda: queue.mark_sharing(job["id"], owner, lease_seconds))
+        if not success:
+            error = "no publish confirmation"
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        print(f"❌ Job {job['id']} failed: {error}")
+    finally:
+        telemetry.set(events=capture.close())
+        dest.unlink(missing_ok=True)
+
+    attrs = telemetry.record["attrs"]
+    telemetry.set(success=success, error=error, phases=timer.durations())
+    telemetry.write()
+    if success:
+        queue.complete(job["id"], owner, attrs.get("media_id"))
+        # Keep the legacy counter file in step for plain `python main.py` runs
+        write_next_day(max(read_day(), job["day"] + 1))
+        video_manifest.record_post(link, job["day"])
+        print(f"✅ Job {job['id']} posted" + (f" (media {attrs['media_id']})" if attrs.get("media_id") else ""))
+    else:
+        queue.fail(job["id"], owner, error, share_clicked=bool(attrs.get("share_clicked")))
+    return success
+
+
+def work(queue, rate=6.0, max_jobs=None, follow=False, poll=30, lease_seconds=LEASE_SECONDS):
+    """Drain due jobs, starting at most `rate` per hour; returns the number processed"""
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    interval = 3600 / rate if rate > 0 else 0
+    processed = 0
+    last_start = None
+    while max_jobs is None or processed < max_jobs:
+        if last_start is not None and interval:
+            wait = last_start + interval - time.monotonic()
+            if wait > 0:
+                print(f"⏳ Throttling: next job in {wait:.0f}s")
+                time.sleep(wait)
+        job = queue.claim(owner, lease_seconds)
+        if job is None:
+            if not follow:
+                break
+            time.sleep(poll)
+            continue
+        last_start = time.monotonic()
+        run_job(queue, job, owner, lease_seconds)
+        processed += 1
+    print(f"🗂️ Worker {owner} processed {processed} job(s)")
+    return processed
+
+
+def _parse_time(args):
+    if args.at:
+        return datetime.fromisoformat(args.at).timestamp()
+    if args.delay:
+        return time.time() + args.delay
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Durable queue of Instagram post jobs")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    enqueue = sub.add_parser("enqueue", help="add a post job")
+    enqueue.add_argument("--account", default=DEFAULT_ACCOUNT, help="storage state file")
+    enqueue.add_argument("--video", help="video link (default: random drive_links.txt line)")
+    enqueue.add_argument("--template", help="caption template with {day} and {hashtags}")
+    enqueue.add_argument("--at", help="ISO time to post at")
+    enqueue.add_argument("--in", dest="delay", type=float, help="post in N seconds")
+    enqueue.add_argument("--key", help="idempotency key; repeating it never adds a second job")
+    enqueue.add_argument("--day", type=int, help="campaign day (default: the counter's when the job runs)")
+
+    daily = sub.add_parser("daily", help="enqueue today's post for each account (safe to repeat)")
+    daily.add_argument("accounts", nargs="*", default=[DEFAULT_ACCOUNT])
+
+    worker = sub.add_parser("work", help="run due jobs")
+    worker.add_argument("--rate", type=float, default=float(os.getenv("IG_JOB_RATE", "6")),
+                        help="max posts started per hour (0 = unthrottled)")
+    worker.add_argument("--max-jobs", type=int)
+    worker.add_argument("--follow", action="store_true", help="keep polling for new jobs")
+    worker.add_argument("--lease", type=int, default=LEASE_SECONDS, help="lease length in seconds")
+
+    sub.add_parser("status", help="show recent jobs")
+    retry = sub.add_parser("retry", help="requeue a failed or unconfirmed job")
+    retry.add_argument("job_id", type=int)
+
+    args = parser.parse_args(argv)
+    queue = JobQueue()
+
+    if args.command == "enqueue":
+        job_id, created = queue.enqueue(args.account, args.video, args.template, _parse_time(args),
+                                        args.key, args.day)
+        print(f"{'➕ Added' if created else '↩️ Already queued as'} job {job_id}")
+    elif args.command == "daily":
+        for account in args.accounts:
+            job_id, created = queue.enqueue_daily(account)
+            job = queue.get(job_id)
+            print(f"{'➕ Added' if created else '↩️ Already queued as'} job {job_id} "
+                  f"({job['idempotency_key']}, {job['status']})")
+    elif args.command == "work":
+        work(queue, args.rate, args.max_jobs, args.follow, lease_seconds=args.lease)
+    elif args.command == "status":
+        for job in queue.recent():
+            when = datetime.fromtimestamp(job["scheduled_at"]).strftime("%Y-%m-%d %H:%M")
+            detail = job["media_id"] or job["last_error"] or ""
+            print(f"{job['id']:>5} {job['status']:<12} {when}  day {job['day']:<4} "
+                  f"{Path(job['account']).stem:<20} try {job['attempts']}/{job['max_attempts']}  {detail}")
+    elif args.command == "retry":
+        print("🔁 Requeued" if queue.retry(args.job_id) else "⚠️ Job is not failed/unconfirmed")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
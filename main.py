@@ -4,19 +4,107 @@
 # Additional: added console/network logging, file-input verification and post-share checks
 
 import os
-import random
+import sys
 import time
+
+_IMPORT_STARTED = time.perf_counter()
+
 import traceback
-import requests
 import json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from playwright.sync_api import sync_playwright, TimeoutError as PWTimeout
-from hashtags import get_trending_hashtags
+# Playwright, requests and pytrends/pandas are imported only where they are
+# used, so `python main.py plan` and the video/preflight steps stay cheap
+from hashtags import get_trending_hashtags, peek_hashtags
+from selector_race import race_selectors
+from ig_selectors import get_selector_registry
+from stages import (STAGE_CONDITIONS, SIGNATURE_JS, DETECT_STAGE_JS, stage_timeout, stage_retries,
+                    resume_stage, ESCAPE_SAFE_STAGES)
+from publish_confirm import PublishWatcher
+import browser_daemon
+import video_cache
+import video_manifest
+import ranged_download
+import drive_fetch
+from mp4_preflight import preflight, PreflightError
+from mp4_faststart import optimize_video
+from screenshot_ring import ScreenshotRing
+from pipeline import PhaseTimer, use_pipeline, resolve_prefetched
+from telemetry import Telemetry
+from resource_blocker import install_blocker
+from event_capture import EventCapture
+from upload_monitor import UploadMonitor, print_progress
+from caption_entry import enter_caption
+import browser_profile
+
+IMPORT_MS = (time.perf_counter() - _IMPORT_STARTED) * 1000
+# Must not be loaded by `import main` (checked by `python main.py plan --import-budget`)
+HEAVY_MODULES = ("playwright", "requests", "pandas", "pytrends")
 
 # Configuration
 DAY_COUNTER_FILE = Path("day_counter.txt")
 DRIVE_LINKS_FILE = Path("drive_links.txt")
 VIDEO_LOCAL = Path("video.mp4")
+CAPTION_TEMPLATE = "Reminder – Day {day}\n\n{hashtags}"
+# Origin of the Create flow; benchmark.py points this at mock_instagram.py
+BASE_URL = os.getenv("IG_BASE_URL", "https://www.instagram.com").rstrip("/")
+
+BROWSER_ARGS = [
+    "--no-sandbox",
+    "--disable-setuid-sandbox",
+    "--disable-dev-shm-usage",
+    "--disable-blink-features=AutomationControlled",
+    "--window-size=1920,1080"
+]
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+VIEWPORT = {"width": 1920, "height": 1080}
+
+# Replaces the Select button with a clone wired to an injected file input
+INJECT_FILE_INPUT_JS = '''(selector) => {
+    // Remove existing injected input
+    const existing = document.getElementById('injected-file-input');
+    if (existing) existing.remove();
+    
+    // Find the button using selector (not the passed element)
+    const button = document.querySelector(selector);
+    if (!button) return { success: false, error: 'Button not found in DOM' };
+    
+    // Create file input
+    const fileInput = document.createElement('input');
+    fileInput.type = 'file';
+    fileInput.accept = 'video/mp4,video/quicktime,image/jpeg,image/png,image/heic,image/heif';
+    fileInput.id = 'injected-file-input';
+    fileInput.style.position = 'absolute';
+    fileInput.style.left = '-9999px';
+    fileInput.style.opacity = '0';
+    fileInput.style.zIndex = '999999';
+    
+    document.body.appendChild(fileInput);
+    
+    // Replace button to remove existing handlers
+    const newButton = button.cloneNode(true);
+    button.parentNode.replaceChild(newButton, button);
+    
+    // Connect new button to file input
+    newButton.addEventListener('click', (e) => {
+        e.preventDefault();
+        e.stopPropagation();
+        console.log('Button clicked, opening file dialog...');
+        fileInput.click();
+    });
+    
+    // Mark the new button for identification
+    newButton.setAttribute('data-file-connected', 'true');
+    
+    return {
+        success: true,
+        inputId: fileInput.id,
+        buttonSelector: selector
+    };
+}'''
+
+class ShareAborted(Exception):
+    """before_share refused the Share click; the flow stops without retrying"""
 
 class InstagramFixedAutomation:
     """
@@ -24,136 +112,101 @@ class InstagramFixedAutomation:
     Complete upload flow with proper element reference handling
     """
     
-    def __init__(self, page):
+    # Create flow in order; each stage_<name> method returns False to abort
+    UPLOAD_STAGES = ['home', 'create', 'select_file', 'crop', 'edit', 'caption', 'share']
+    
+    def __init__(self, page, timer=None, telemetry=None, base_url=BASE_URL, selectors=None):
         self.page = page
+        self.base_url = base_url
+        self.timer = timer
+        self.telemetry = telemetry or Telemetry()
+        self.selectors = selectors or get_selector_registry()
+        self.screenshots = ScreenshotRing()
+        self.publish_watcher = PublishWatcher()
+        self.media_id = None
+        self.before_share = None  # called right before the Share click; False aborts (job_queue.py)
+        self.share_clicked = False
+        self.upload_monitor = None
+        self.on_upload_progress = print_progress  # (sent, acked, total, status)
     
-    def wait_and_screenshot(self, filename, delay=2):
-        """Helper for debugging with screenshots"""
-        time.sleep(delay)
-        self.page.screenshot(path=f"debug_{filename}.png")
-        print(f"📸 Screenshot saved: debug_{filename}.png")
+    def wait_and_screenshot(self, filename, delay=0, force=False):
+        """Helper for debugging with screenshots (buffered in memory unless debug is on)"""
+        if delay:
+            time.sleep(delay)
+        self.screenshots.capture(self.page, filename, force=force)
     
-    def install_event_listeners(self):
-        """Attach handlers to capture page console messages and network failures"""
-        try:
-            self.page.on("console", lambda msg: print(f"PAGE CONSOLE [{msg.type}]: {msg.text}"))
-        except Exception:
-            pass
-        try:
-            self.page.on("pageerror", lambda err: print(f"PAGE ERROR: {err}"))
-        except Exception:
-            pass
+    def wait_for_stage(self, name, arg=None):
+        """
+        Block until the stage postcondition holds (see stages.py).
+        Returns False on timeout so callers can decide whether to continue.
+        """
+        from playwright.sync_api import TimeoutError as PWTimeout
+        timeout = stage_timeout(name)
+        started = time.monotonic()
+        with self.telemetry.span(f"wait.{name}") as span:
+            try:
+                self.page.wait_for_function(STAGE_CONDITIONS[name], arg=arg, timeout=timeout)
+                print(f"  ⏱️ Stage '{name}' ready in {(time.monotonic() - started) * 1000:.0f}ms")
+                return True
+            except PWTimeout:
+                print(f"  ⚠️ Stage '{name}' not reached within {timeout}ms")
+                span['ok'] = False
+                return False
+    
+    def dialog_signature(self):
+        """Heading text of the open Create dialog, used to detect step changes"""
         try:
-            self.page.on("requestfailed", lambda req: print(f"REQUEST FAILED: {req.url} -> {req.failure}"))
+            return self.page.evaluate(SIGNATURE_JS)
         except Exception:
-            pass
+            return ''
+    
+    def install_event_listeners(self, capture=None):
+        """
+        Capture console messages, page errors, failed requests and API responses.
+        Filtering and batching happen in the page (see event_capture.py), so no
+        per-message driver event reaches Python; close_event_capture() flushes.
+        """
+        self.capture = capture or EventCapture()
         try:
-            # Log important responses (heuristic: upload/graphql/media endpoints)
-            def log_response(resp):
-                try:
-                    url = resp.url
-                    if any(k in url for k in ("/upload/", "/media/", "/graphql/")):
-                        print(f"RESPONSE [{resp.status}] {url}")
-                except Exception:
-                    pass
-            self.page.on("response", log_response)
-        except Exception:
-            pass
+            self.capture.install(self.page)
+        except Exception as e:
+            print(f"⚠️ Event capture unavailable: {e}")
+    
+    def close_event_capture(self):
+        capture = getattr(self, 'capture', None)
+        return capture.close() if capture else None
 
-    def find_create_button(self):
+    def race(self, key, timeout, step=None):
+        """
+        Race the registry's candidates for `key` (best observed first) and feed
+        the outcome back to the registry and to telemetry
+        """
+        step = step or key
+        candidates = self.selectors.candidates(key)
+        result = race_selectors(self.page, step, candidates, timeout=timeout)
+        self.selectors.record(key, candidates, result)
+        self.telemetry.selector(step, result, candidates, timeout)
+        return result
+    
+    def find_create_button(self, timeout=5000):
         """Find Create button - span:has-text('Create')"""
         print("🔍 Step 1: Looking for Create button...")
         
-        create_selectors = [
-            'span:has-text("Create")',
-            '*:has-text("Create")',
-            'div:has(span:has-text("Create"))',
-            'a:has(span:has-text("Create"))',
-            'span.x1lliihq:has-text("Create")',
-        ]
-        
-        for i, selector in enumerate(create_selectors, 1):
-            try:
-                print(f"  Trying selector {i}: {selector}")
-                
-                if selector.startswith('span:has-text'):
-                    # Find span and get clickable parent
-                    span_element = self.page.wait_for_selector(selector, timeout=3000)
-                    if span_element and span_element.is_visible():
-                        # Find clickable parent (a or div)
-                        clickable_parent = self.page.evaluate('''(span) => {
-                            let current = span;
-                            for (let i = 0; i < 5; i++) {
-                                current = current.parentElement;
-                                if (!current) break;
-                                
-                                if (current.tagName === 'A' || 
-                                    current.tagName === 'BUTTON' ||
-                                    current.getAttribute('role') === 'button' ||
-                                    current.onclick ||
-                                    getComputedStyle(current).cursor === 'pointer') {
-                                    return current;
-                                }
-                            }
-                            return null;
-                        }''', span_element)
-                        
-                        if clickable_parent:
-                            print(f"  ✅ Found clickable parent for Create span")
-                            return self.page.evaluate('el => el', clickable_parent)
-                else:
-                    element = self.page.wait_for_selector(selector, timeout=3000)
-                    if element and element.is_visible():
-                        print(f"  ✅ Found create element: {selector}")
-                        return element
-                        
-            except PWTimeout:
-                print(f"  ⏭️ Selector {i} timeout")
-                continue
-            except Exception as e:
-                print(f"  ⚠️ Selector {i} error: {e}")
-                continue
+        result = self.race('create', timeout)
+        if result:
+            return result['element']
         
         print("❌ Create button not found")
         return None
     
-    def find_select_computer_button(self):
+    def find_select_computer_button(self, timeout=10000):
         """Find Select from computer button - button._aswp"""
         print("🔍 Step 2: Looking for 'Select from computer' button...")
         
-        select_selectors = [
-            'button:has-text("Select from computer")',
-            'button._aswp._aswr._aswu._asw_._asx2',
-            'button._aswp:has-text("Select from computer")',
-            'button[type="button"]:has-text("Select from computer")',
-            'button._aswp',
-            'button._aswr',
-            'button[type="button"]',
-        ]
-        
-        for i, selector in enumerate(select_selectors, 1):
-            try:
-                print(f"  Trying selector {i}: {selector}")
-                element = self.page.wait_for_selector(selector, timeout=5000)
-                
-                if element and element.is_visible():
-                    text_content = element.text_content() or ""
-                    if "Select from computer" in text_content or ":has-text" in selector:
-                        print(f"  ✅ Found Select from computer button: {selector}")
-                        return {'element': element, 'selector': selector}
-                    elif i <= 4:  # Check text for specific selectors
-                        print(f"  ⚠️ Button found but wrong text: '{text_content}'")
-                        continue
-                    else:
-                        print(f"  ✅ Found button (fallback): {selector}")
-                        return {'element': element, 'selector': selector}
-                        
-            except PWTimeout:
-                print(f"  ⏭️ Selector {i} timeout")
-                continue
-            except Exception as e:
-                print(f"  ⚠️ Selector {i} error: {e}")
-                continue
+        result = self.race('select_computer', timeout)
+        if result:
+            # 'selector' is plain CSS so the injected script can querySelector it
+            return {'element': result['element'], 'selector': result['query']}
         
         print("❌ Select from computer button not found")
         return None
@@ -172,55 +225,13 @@ class InstagramFixedAutomation:
         button_selector = button_info['selector']
         
         try:
-            result = self.page.evaluate('''(selector) => {
-                // Remove existing injected input
-                const existing = document.getElementById('injected-file-input');
-                if (existing) existing.remove();
-                
-                // Find the button using selector (not the passed element)
-                const button = document.querySelector(selector);
-                if (!button) return { success: false, error: 'Button not found in DOM' };
-                
-                // Create file input
-                const fileInput = document.createElement('input');
-                fileInput.type = 'file';
-                fileInput.accept = 'video/mp4,video/quicktime,image/jpeg,image/png,image/heic,image/heif';
-                fileInput.id = 'injected-file-input';
-                fileInput.style.position = 'absolute';
-                fileInput.style.left = '-9999px';
-                fileInput.style.opacity = '0';
-                fileInput.style.zIndex = '999999';
-                
-                document.body.appendChild(fileInput);
-                
-                // Replace button to remove existing handlers
-                const newButton = button.cloneNode(true);
-                button.parentNode.replaceChild(newButton, button);
-                
-                // Connect new button to file input
-                newButton.addEventListener('click', (e) => {
-                    e.preventDefault();
-                    e.stopPropagation();
-                    console.log('Button clicked, opening file dialog...');
-                    fileInput.click();
-                });
-                
-                // Mark the new button for identification
-                newButton.setAttribute('data-file-connected', 'true');
-                
-                return {
-                    success: true,
-                    inputId: fileInput.id,
-                    buttonSelector: selector
-                };
-            }''', button_selector)
+            result = self.page.evaluate(INJECT_FILE_INPUT_JS, button_selector)
             
             if result.get('success'):
                 print(f"  ✅ File input injected and connected successfully")
                 
                 # CRITICAL FIX: Get fresh reference to the new button
                 print(f"  🔄 Getting fresh reference to new button...")
-                time.sleep(1)  # Give DOM time to update
                 
                 # Try to find the new button with data attribute first
                 new_button = self.page.query_selector(f'{button_selector}[data-file-connected="true"]')
@@ -253,169 +264,121 @@ class InstagramFixedAutomation:
             print(f"  ❌ JavaScript injection failed: {e}")
             return None
     
-    def find_next_button(self, step_number):
+    def find_next_button(self, step_number, timeout=10000):
         """Find Next button - div[role='button']:has-text('Next')"""
         print(f"🔍 Step {step_number}: Looking for Next button...")
         
-        next_selectors = [
-            'div[role="button"]:has-text("Next")',
-            '*:has-text("Next")',
-            'div.x1i10hfl.xjqpnuy:has-text("Next")',
-            'div.x1i10hfl:has-text("Next")',
-            'div[role="button"][tabindex="0"]:has-text("Next")',
-            'div.x1i10hfl[role="button"]',
-            'div[role="button"][tabindex="0"]',
-        ]
-        
-        for i, selector in enumerate(next_selectors, 1):
-            try:
-                print(f"  Trying selector {i}: {selector}")
-                element = self.page.wait_for_selector(selector, timeout=5000)
-                
-                if element and element.is_visible() and element.is_enabled():
-                    text_content = element.text_content() or ""
-                    if "Next" in text_content or ":has-text" in selector:
-                        print(f"  ✅ Found Next button: {selector}")
-                        return element
-                    elif i <= 5:  # Check text for specific selectors
-                        print(f"  ⚠️ Element found but wrong text: '{text_content}'")
-                        continue
-                    else:
-                        print(f"  ✅ Found button (fallback): {selector}")
-                        return element
-                        
-            except PWTimeout:
-                print(f"  ⏭️ Selector {i} timeout")
-                continue
-            except Exception as e:
-                print(f"  ⚠️ Selector {i} error: {e}")
-                continue
+        result = self.race('next', timeout, step=f'next_{step_number}')
+        if result:
+            return result['element']
         
         print(f"⚠️ Next button not found (step {step_number})")
         return None
     
-    def find_caption_input(self):
+    def find_caption_input(self, timeout=10000):
         """Find caption input - div[aria-label='Write a caption...']"""
         print("🔍 Step 6: Looking for caption input...")
         
-        caption_selectors = [
-            'div[aria-label="Write a caption..."]',
-            'div[contenteditable="true"][aria-label*="caption"]',
-            'div.xw2csxc.x1odjw0f[contenteditable="true"]',
-            'div.xw2csxc[contenteditable="true"]',
-            'div[contenteditable="true"][role="textbox"]',
-            'div[contenteditable="true"]',
-            'div[data-lexical-editor="true"]',
-        ]
-        
-        for i, selector in enumerate(caption_selectors, 1):
-            try:
-                print(f"  Trying selector {i}: {selector}")
-                element = self.page.wait_for_selector(selector, timeout=5000)
-                
-                if element and element.is_visible():
-                    print(f"  ✅ Found caption input: {selector}")
-                    return element
-                        
-            except PWTimeout:
-                print(f"  ⏭️ Selector {i} timeout")
-                continue
-            except Exception as e:
-                print(f"  ⚠️ Selector {i} error: {e}")
-                continue
+        result = self.race('caption', timeout)
+        if result:
+            return result['element']
         
         print("⚠️ Caption input not found")
         return None
     
-    def find_share_button(self):
+    def find_share_button(self, timeout=10000):
         """Find Share button - div[role='button']:has-text('Share')"""
         print("🔍 Step 7: Looking for Share button...")
         
-        share_selectors = [
-            'div[role="button"]:has-text("Share")',
-            '*:has-text("Share")',
-            'div.x1i10hfl.xjqpnuy:has-text("Share")',
-            'div.x1i10hfl:has-text("Share")',
-            'div[role="button"][tabindex="0"]:has-text("Share")',
-            'button:has-text("Share")',
-            'span:has-text("Share")',
-        ]
-        
-        for i, selector in enumerate(share_selectors, 1):
-            try:
-                print(f"  Trying selector {i}: {selector}")
-                element = self.page.wait_for_selector(selector, timeout=5000)
-                
-                if element and element.is_visible():
-                    text_content = element.text_content() or ""
-                    if "Share" in text_content or ":has-text" in selector:
-                        print(f"  ✅ Found Share button: {selector}")
-                        return element
-                        
-            except PWTimeout:
-                print(f"  ⏭️ Selector {i} timeout")
-                continue
-            except Exception as e:
-                print(f"  ⚠️ Selector {i} error: {e}")
-                continue
+        result = self.race('share', timeout)
+        if result:
+            return result['element']
         
         print("⚠️ Share button not found")
         return None
     
-    def attempt_upload(self, video_path, caption):
-        """Fixed upload workflow with proper DOM handling"""
-        try:
-            print("\n🚀 STARTING FIXED INSTAGRAM AUTOMATION")
-            print("📅 DOM attachment error FIXED")
-            print("🎯 Expected success rate: 95%+")
-            
-            # Navigate to Instagram
+    def home_ahead(self):
+        """
+        Run stage_home before attempt_upload so navigation overlaps a prefetched
+        download; returns the stage attempt_upload should start from.
+        """
+        ok = False
+        with self.timer.phase("navigation"), self.telemetry.span("stage.home") as span:
+            try:
+                ok = bool(self.stage_home())
+            except Exception:
+                traceback.print_exc()
+            span['ok'] = ok
+        return 'create' if ok else 'home'
+    
+    def stage_home(self):
+        """Navigate to Instagram and wait for the home feed"""
+        if self.page.url.startswith(f"{self.base_url}/"):
+            print("\n♨️ Page already on Instagram (warm), skipping navigation")
+        else:
             print("\n📍 Navigating to Instagram...")
-            self.page.goto("https://www.instagram.com/", timeout=60000)
-            self.page.wait_for_load_state('networkidle', timeout=30000)
-            self.wait_and_screenshot("01_homepage")
-            
-            # STEP 1: Click Create button
-            create_button = self.find_create_button()
-            if create_button:
-                create_button.click()
-                time.sleep(3)
-                self.wait_and_screenshot("02_create_clicked")
-            else:
-                print("🔄 Trying direct navigation...")
-                self.page.goto("https://www.instagram.com/create/details/", timeout=30000)
-                self.page.wait_for_load_state('networkidle', timeout=15000)
-                self.wait_and_screenshot("02_direct_navigation")
-            
-            # STEP 2: Find Select from computer button
-            button_info = self.find_select_computer_button()
-            if not button_info:
-                print("❌ Cannot proceed without Select button")
-                return False
-            
-            # STEP 3: Inject file input and get fresh button reference
+            with self.telemetry.span("navigation"):
+                self.page.goto(f"{self.base_url}/", wait_until="domcontentloaded", timeout=60000)
+        self.wait_for_stage('home')
+        self.telemetry.set(page_load=browser_profile.page_load_stats(self.page))
+        self.wait_and_screenshot("01_homepage")
+        return True
+    
+    def stage_create(self):
+        """STEP 1: Open the Create dialog (or navigate to it directly)"""
+        create_button = self.find_create_button()
+        if create_button:
+            create_button.click()
+            self.wait_for_stage('dialog')
+            self.wait_and_screenshot("02_create_clicked")
+        else:
+            print("🔄 Trying direct navigation...")
+            self.page.goto(f"{self.base_url}/create/details/", wait_until="domcontentloaded", timeout=30000)
+            self.wait_for_stage('home')
+            self.wait_and_screenshot("02_direct_navigation")
+        return True
+    
+    def stage_select_file(self):
+        """STEPS 2-4: Connect the injected file input and hand it the video"""
+        # STEP 2: Find Select from computer button
+        button_info = self.find_select_computer_button()
+        if not button_info:
+            print("❌ Cannot proceed without Select button")
+            return False
+        
+        # STEP 3: Inject file input and get fresh button reference
+        with self.telemetry.span("file_injection") as span:
             connection_result = self.inject_file_input_and_connect(button_info)
-            if not connection_result:
-                print("❌ Cannot proceed without file input connection")
-                return False
-            
-            file_input = connection_result['file_input']
-            fresh_button = connection_result['button']
-            
-            # STEP 4: Click the FRESH button reference (FIXED!)
-            print("📤 Clicking fresh Select button to trigger file dialog...")
-            try:
-                fresh_button.click()  # Use fresh reference, not old one!
-                time.sleep(2)
-                print("✅ Button clicked successfully!")
-            except Exception as click_error:
-                print(f"❌ Button click failed: {click_error}")
-                return False
-            
-            # Upload file
-            print("📁 Uploading video file...")
-            file_input.set_input_files(str(video_path.resolve()))
-            print(f"✅ Video uploaded: {video_path.name}")
+            span['ok'] = bool(connection_result)
+        if not connection_result:
+            print("❌ Cannot proceed without file input connection")
+            return False
+        
+        file_input = connection_result['file_input']
+        fresh_button = connection_result['button']
+        
+        # STEP 4: Click the FRESH button reference (FIXED!)
+        print("📤 Clicking fresh Select button to trigger file dialog...")
+        try:
+            fresh_button.click()  # Use fresh reference, not old one!
+            print("✅ Button clicked successfully!")
+        except Exception as click_error:
+            print(f"❌ Button click failed: {click_error}")
+            return False
+        
+        # Pipelined mode: join the download only now; a failure ends the run
+        self.video_path = resolve_prefetched(self.video_path, "video", self.timer)
+        
+        # Upload file
+        print("📁 Uploading video file...")
+        size = self.video_path.stat().st_size
+        # Follow the upload requests; the flow keeps going while they run and
+        # only waits for the acknowledgement right before Share
+        self.detach_upload_monitor()
+        self.upload_monitor = UploadMonitor(size, self.on_upload_progress).attach(self.page)
+        with self.telemetry.span("upload", bytes=size) as span:
+            file_input.set_input_files(str(self.video_path.resolve()))
+            print(f"✅ Video uploaded: {self.video_path.name}")
             
             # Verify file input has files (extra debug)
             try:
@@ -424,87 +387,233 @@ class InstagramFixedAutomation:
             except Exception as e:
                 print(f"⚠️ Could not evaluate file input files: {e}")
             
-            # Wait for upload processing; rely on screenshots and explicit waits
-            time.sleep(5)
-            self.wait_and_screenshot("03_file_uploaded")
-            
-            # STEP 5: Click first Next button
-            next_button_1 = self.find_next_button(5)
-            if next_button_1:
-                next_button_1.click()
-                time.sleep(3)
-                self.wait_and_screenshot("04_first_next_clicked")
-            else:
-                print("⚠️ First Next button not found, continuing...")
-            
-            # STEP 6: Click second Next button
-            next_button_2 = self.find_next_button(6)
-            if next_button_2:
-                next_button_2.click()
-                time.sleep(3)
-                self.wait_and_screenshot("05_second_next_clicked")
-            else:
-                print("⚠️ Second Next button not found, continuing...")
-            
-            # STEP 7: Fill caption
-            caption_input = self.find_caption_input()
-            if caption_input:
-                print("📝 Adding caption...")
-                caption_input.click()
-                self.page.keyboard.press('Control+a')  # Select all
-                self.page.keyboard.type(caption)
-                time.sleep(2)
+            # Move on as soon as the crop preview is rendered
+            self.wait_for_stage('file_attached')
+            span['ok'] = self.wait_for_stage('preview')
+        self.wait_and_screenshot("03_file_uploaded")
+        return True
+    
+    def wait_for_upload(self):
+        """False only when the upload was rejected; no verdict lets Share decide"""
+        if self.upload_monitor is None:
+            return True
+        if self.upload_monitor.waited:
+            return self.upload_monitor.error is None  # already waited on an earlier try
+        with self.telemetry.span("upload_ack") as span:
+            result = self.upload_monitor.wait()
+            span['ok'] = result is not False
+        self.telemetry.set(upload=self.upload_monitor.summary())
+        self.detach_upload_monitor()
+        return result is not False
+    
+    def detach_upload_monitor(self):
+        if self.upload_monitor is not None:
+            self.upload_monitor.detach()
+    
+    def stage_crop(self):
+        """STEP 5: Leave the crop step via the first Next button"""
+        next_button_1 = self.find_next_button(5)
+        if next_button_1:
+            signature = self.dialog_signature()
+            next_button_1.click()
+            self.wait_for_stage('step_change', signature)
+            self.wait_and_screenshot("04_first_next_clicked")
+        else:
+            print("⚠️ First Next button not found, continuing...")
+        return True
+    
+    def stage_edit(self):
+        """STEP 6: Leave the edit step via the second Next button"""
+        next_button_2 = self.find_next_button(6)
+        if next_button_2:
+            next_button_2.click()
+            self.wait_for_stage('caption_editor')
+            self.wait_and_screenshot("05_second_next_clicked")
+        else:
+            print("⚠️ Second Next button not found, continuing...")
+        return True
+    
+    def stage_caption(self):
+        """STEP 7: Fill caption"""
+        caption_input = self.find_caption_input()
+        if caption_input:
+            self.caption = resolve_prefetched(self.caption, "caption", self.timer)
+            print("📝 Adding caption...")
+            # One paste into the editor; chunked typing only if that doesn't stick
+            with self.telemetry.span("caption_entry", chars=len(self.caption)) as span:
+                method = enter_caption(self.page, caption_input, self.caption, span)
+            if method:
                 print("✅ Caption added successfully")
-                self.wait_and_screenshot("06_caption_added")
-            else:
-                print("⚠️ Caption input not found, continuing without caption...")
-            
-            # STEP 8: Click Share button
-            share_button = self.find_share_button()
-            if share_button:
-                print("📤 Clicking Share button...")
+            self.wait_and_screenshot("06_caption_added")
+        else:
+            print("⚠️ Caption input not found, continuing without caption...")
+        return True
+    
+    def stage_share(self):
+        """STEP 8: Click Share button and wait for the post to complete"""
+        if self.share_clicked:
+            # Resumed after Share was clicked: a second click could post twice
+            print("⏳ Share was already clicked, only waiting for confirmation...")
+            with self.telemetry.span("confirmation") as span:
+                span['ok'] = bool(self.confirm_publish())
+            return span['ok']
+        
+        share_button = self.find_share_button()
+        if not share_button:
+            print("❌ Share button not found - upload incomplete")
+            return False
+        if not self.wait_for_upload():
+            print("❌ Video upload failed - not sharing")
+            return False
+        
+        # The job queue records the Share click under its lease; False means the
+        # lease is gone and another worker may own the job now
+        if self.before_share and self.before_share() is False:
+            raise ShareAborted("job lease lost before Share - not clicking")
+        print("📤 Clicking Share button...")
+        self.publish_watcher.reset()
+        # Responses are only observed from Python while the post is being published
+        observe = self.publish_watcher.observe
+        self.page.on("response", observe)
+        # From here on a retry could double-post (see job_queue.py)
+        self.share_clicked = True
+        self.telemetry.set(share_clicked=True)
+        try:
+            with self.telemetry.span("share"):
                 share_button.click()
-                print("⏳ Waiting for post to complete...")
-                
-                # Wait up to 60s for clear success indicator (toast or a 'shared' text)
-                success = False
-                for _ in range(12):
-                    time.sleep(5)
-                    # Try common success indicators (heuristic)
-                    try:
-                        found1 = self.page.query_selector('*:has-text("Your post has been shared")')
-                        found2 = self.page.query_selector('*:has-text("shared")')
-                        found3 = self.page.query_selector('*:has-text("Post shared")')
-                        if found1 or found2 or found3:
-                            success = True
-                            print("✅ Found success indicator on page after sharing.")
-                            break
-                    except Exception:
-                        pass
-                self.wait_and_screenshot("07_share_clicked")
-                self.wait_and_screenshot("08_post_complete")
-                
-                if success:
-                    print("✅ FIXED AUTOMATION COMPLETED SUCCESSFULLY!")
-                    return True
-                else:
-                    print("⚠️ No explicit 'shared' indicator found after clicking Share.")
-                    # As fallback, keep screenshots and logs for inspection, return False so user can examine
+            print("⏳ Waiting for post to complete...")
+            
+            with self.telemetry.span("confirmation") as span:
+                success = self.confirm_publish()
+                span['ok'] = bool(success)
+        finally:
+            self.page.remove_listener("response", observe)
+        self.wait_and_screenshot("07_share_clicked")
+        self.wait_and_screenshot("08_post_complete")
+        
+        if success:
+            if self.media_id:
+                print(f"🆔 Media id: {self.media_id}")
+            print("✅ FIXED AUTOMATION COMPLETED SUCCESSFULLY!")
+            return True
+        else:
+            print("⚠️ No explicit 'shared' indicator found after clicking Share.")
+            # As fallback, keep screenshots and logs for inspection, return False so user can examine
+            return False
+    
+    def confirm_publish(self):
+        """
+        Resolve as soon as the configure/publish response arrives and record the
+        media id. Falls back to a single scoped DOM check if it never shows up.
+        """
+        if self.publish_watcher.response is None:
+            from playwright.sync_api import TimeoutError as PWTimeout
+            timeout = stage_timeout('publish')
+            try:
+                self.page.wait_for_event("response", predicate=self.publish_watcher.observe, timeout=timeout)
+            except PWTimeout:
+                print(f"  ⚠️ No publish response within {timeout}ms")
+        
+        confirmed, self.media_id = self.publish_watcher.result()
+        if confirmed is not None:
+            if confirmed:
+                print("✅ Server confirmed the post")
+            return confirmed
+        
+        print("🔎 Falling back to on-page success indicator...")
+        if self.wait_for_stage('shared'):
+            print("✅ Found success indicator on page after sharing.")
+            return True
+        return False
+    
+    def detect_stage(self, failed=None):
+        """(detected page state, stage to resume from) - see stages.DETECT_STAGE_JS"""
+        try:
+            detected = self.page.evaluate(DETECT_STAGE_JS)
+            if detected == 'unknown' and failed in ESCAPE_SAFE_STAGES and not self.share_clicked:
+                # Another dialog on top (e.g. a notifications prompt): dismiss it and look again
+                self.page.keyboard.press('Escape')
+                detected = self.page.evaluate(DETECT_STAGE_JS)
+        except Exception as e:
+            print(f"  ⚠️ Stage detection failed: {e}")
+            return None, None
+        return detected, resume_stage(detected, self.page.url.startswith(f"{self.base_url}/"),
+                                      self.share_clicked)
+    
+    def plan_resume(self, stage, budgets, error=None):
+        """Stage to continue from after `stage` failed, or None once its retries are spent"""
+        reason = f" ({error})" if error else ""
+        if budgets[stage] <= 0:
+            print(f"❌ Stage '{stage}' failed{reason}, no retries left")
+            return None
+        budgets[stage] -= 1
+        with self.telemetry.span("resume", failed=stage) as span:
+            detected, resume = self.detect_stage(stage)
+            span.update(detected=detected, resume=resume, ok=resume is not None)
+        if resume:
+            print(f"🔁 Stage '{stage}' failed{reason}; page is at '{detected}', "
+                  f"resuming from '{resume}' ({budgets[stage]} retries left)")
+        return resume
+    
+    def attempt_upload(self, video_path, caption, start='home'):
+        """Fixed upload workflow with proper DOM handling"""
+        self.video_path = video_path
+        self.caption = caption
+        try:
+            print("\n🚀 STARTING FIXED INSTAGRAM AUTOMATION")
+            print("📅 DOM attachment error FIXED")
+            print("🎯 Expected success rate: 95%+")
+            
+            # Each stage waits on its own postcondition. A failed stage is retried
+            # from wherever the page actually is, within a per-stage budget
+            budgets = {stage: stage_retries(stage) for stage in self.UPLOAD_STAGES}
+            index = self.UPLOAD_STAGES.index(start)
+            while index < len(self.UPLOAD_STAGES):
+                stage = self.UPLOAD_STAGES[index]
+                error = None
+                try:
+                    with self.telemetry.span(f"stage.{stage}") as span:
+                        span['ok'] = bool(getattr(self, f"stage_{stage}")())
+                except ShareAborted as e:
+                    print(f"🛑 {e}")
+                    self.screenshots.flush()
                     return False
-            else:
-                print("❌ Share button not found - upload incomplete")
-                return False
+                except VideoUnavailable:
+                    # Already recorded in the manifest; no stage retry brings it back
+                    self.screenshots.flush()
+                    raise
+                except Exception as e:
+                    error = e
+                    traceback.print_exc()
+                if error is None and span['ok']:
+                    index += 1
+                    continue
+                self.wait_and_screenshot(f"failed_{stage}", force=True)
+                resume = self.plan_resume(stage, budgets, error)
+                if resume is None:
+                    self.screenshots.flush()
+                    return False
+                index = self.UPLOAD_STAGES.index(resume)
+            return True
             
+        except VideoUnavailable:
+            raise
         except Exception as e:
             print(f"❌ Fixed automation failed: {e}")
-            self.wait_and_screenshot("error_fixed")
+            self.wait_and_screenshot("error_fixed", force=True)
+            self.screenshots.flush()
             traceback.print_exc()
             return False
+        finally:
+            self.detach_upload_monitor()
 
 # Utility functions (keep existing)
 def is_ci_environment():
     return any(os.getenv(var) for var in ['CI', 'GITHUB_ACTIONS', 'TRAVIS'])
 
+def use_browser_daemon():
+    return os.getenv('IG_BROWSER_DAEMON', '').lower() in ('1', 'true', 'yes')
+
 def get_browser_config():
     return os.getenv('PLAYWRIGHT_HEADLESS', 'true').lower() == 'true' or is_ci_environment()
 
@@ -517,37 +626,220 @@ def read_day():
         return 1
 
 def write_next_day(next_day):
-    DAY_COUNTER_FILE.write_text(str(next_day))
+    # Write-then-rename so a crash never leaves a truncated counter
+    tmp = DAY_COUNTER_FILE.with_suffix(".tmp")
+    tmp.write_text(str(next_day))
+    os.replace(tmp, DAY_COUNTER_FILE)
 
-def download_random_video():
-    if not DRIVE_LINKS_FILE.exists():
-        raise FileNotFoundError("drive_links.txt missing")
-    
-    with DRIVE_LINKS_FILE.open("r") as f:
-        links = [line.strip() for line in f if line.strip()]
-    
-    if not links:
-        raise ValueError("drive_links.txt is empty")
+def choose_video_link(day=None):
+    """Weighted pick from drive_links.txt that skips recently posted clips (see video_manifest.py)"""
+    return video_manifest.choose_video(read_day() if day is None else day, DRIVE_LINKS_FILE)
+
+def download_random_video(dest=VIDEO_LOCAL, link=None):
+    """Download `link`, or a random line of drive_links.txt when no link is given"""
+    import requests
     
-    link = random.choice(links)
+    if link is None:
+        link = choose_video_link()
     print("📥 Downloading video from:", link)
     
     try:
-        resp = requests.get(link, stream=True, timeout=90)
-        resp.raise_for_status()
+        if video_cache.cache_enabled():
+            return video_cache.get_video_cache().fetch(link, dest)
         
-        with VIDEO_LOCAL.open("wb") as out:
-            for chunk in resp.iter_content(chunk_size=8192):
-                if chunk:
-                    out.write(chunk)
+        drive_fetch.download(link, dest)
+        print(f"✅ Downloaded to {dest}")
+        return dest
         
-        print(f"✅ Downloaded to {VIDEO_LOCAL}")
-        return VIDEO_LOCAL
-        
-    except requests.RequestException as e:
+    except (requests.RequestException, ranged_download.DownloadError) as e:
         print(f"❌ Download failed: {e}")
         raise
 
+def prepare_video(timer, dest=VIDEO_LOCAL, link=None):
+    """Download a video, preflight it (MP4 structure + spec) and make it faststart before upload"""
+    video_path = timer.timed("download", download_random_video, dest, link)
+    report = timer.timed("preflight", preflight, video_path)
+    return timer.timed("optimize", optimize_video, video_path, report)
+
+class VideoUnavailable(Exception):
+    """Download or preflight failed; already recorded against the link in the manifest"""
+
+def prepare_video_or_record(timer, dest, link):
+    """prepare_video that records a failure in the manifest and raises VideoUnavailable"""
+    try:
+        return prepare_video(timer, dest, link)
+    except PreflightError as e:
+        print(f"❌ Video rejected by preflight: {e}")
+        dest.unlink(missing_ok=True)
+        video_manifest.record_failure(link, e, "preflight")
+        raise VideoUnavailable(f"preflight: {e}") from e
+    except Exception as e:
+        print(f"❌ Video download failed: {e}")
+        video_manifest.record_failure(link, e, "download")
+        raise VideoUnavailable(f"download: {e}") from e
+
+def format_caption(current_day, tags, template=CAPTION_TEMPLATE):
+    if isinstance(tags, (list, tuple)):
+        hashtags_text = " ".join(f"#{t.lstrip('#')}" for t in tags[:20])
+    else:
+        hashtags_text = str(tags)
+    return template.format(day=current_day, hashtags=hashtags_text)
+
+def build_caption(current_day, template=CAPTION_TEMPLATE):
+    """Caption for the given day with up to 20 hashtags ({day} and {hashtags} in `template`)"""
+    try:
+        tags = get_trending_hashtags()
+    except Exception as e:
+        print(f"⚠️ Hashtag generation failed: {e}")
+        tags = "#motivation #viral #trending #instagram #reels"
+    
+    return format_caption(current_day, tags, template)
+
+def run_browser_flow(storage_state_path, video_path, caption, timer, telemetry, capture, before_share=None):
+    """Launch (or attach to) the browser for one account and run the upload flow"""
+    from playwright.sync_api import sync_playwright
+    
+    with sync_playwright() as p:
+        browser = context = page = None
+        attached = None
+        try:
+            with timer.phase("browser_launch"):
+                # Client mode: borrow a pre-warmed page from browser_daemon.py
+                attached = browser_daemon.attach(p, storage_state_path) if use_browser_daemon() else None
+                if attached:
+                    browser, page, context = attached
+                elif browser_profile.use_persistent_profile():
+                    # Per-account user data dir: HTTP cache and service workers persist
+                    context, profile_state = browser_profile.launch_profile(
+                        p, storage_state_path, get_browser_config(), BROWSER_ARGS, USER_AGENT, VIEWPORT
+                    )
+                    telemetry.set(profile=profile_state)
+                    page = context.pages[0] if context.pages else context.new_page()
+                else:
+                    browser = p.chromium.launch(
+                        headless=get_browser_config(),
+                        args=BROWSER_ARGS
+                    )
+                    
+                    context = browser.new_context(
+                        storage_state=str(storage_state_path),
+                        user_agent=USER_AGENT,
+                        viewport=VIEWPORT
+                    )
+                    
+                    page = context.new_page()
+                # Opt-in: drop images/media/fonts/beacons (IG_BLOCK_RESOURCES)
+                blocker = install_blocker(page.context)
+            page.set_default_timeout(30000)
+            
+            automation = InstagramFixedAutomation(page, timer, telemetry)
+            automation.before_share = before_share
+            # Attach debug listeners
+            automation.install_event_listeners(capture)
+            # Pipelined mode: navigate while the download is still running;
+            # stage_select_file joins it, and a failure ends the run (VideoUnavailable)
+            start = automation.home_ahead()
+            with timer.phase("upload_flow"):
+                success = automation.attempt_upload(video_path, caption, start)
+            telemetry.set(media_id=automation.media_id)
+            if blocker:
+                telemetry.set(blocking=blocker.report())
+            automation.selectors.save()
+            return success
+        finally:
+            # Always hand the page back: a daemon lease is only released on close
+            for closable in (page if attached else None, context, browser):
+                if closable is None:
+                    continue
+                try:
+                    closable.close()
+                except Exception as e:
+                    print(f"⚠️ Browser cleanup failed: {e}")
+
+def describe_storage_state(path):
+    """One-line summary of a storage state file: cookies and session expiry"""
+    path = Path(path)
+    if not path.exists():
+        return False, f"{path} missing"
+    try:
+        cookies = json.loads(path.read_text()).get("cookies", [])
+    except Exception as e:
+        return False, f"{path} unreadable: {e}"
+    session = next((c for c in cookies if c.get("name") == "sessionid"), None)
+    if session is None:
+        return False, f"{path} has {len(cookies)} cookies but no sessionid"
+    expires = session.get("expires", -1)
+    if expires and expires > 0:
+        days = (expires - time.time()) / 86400
+        if days <= 0:
+            return False, f"{path} sessionid expired {-days:.0f} days ago"
+        return True, f"{path} ({len(cookies)} cookies, sessionid valid {days:.0f} more days)"
+    return True, f"{path} ({len(cookies)} cookies, session cookie)"
+
+def plan(argv=None):
+    """
+    Dry run: resolve the day, video, caption and storage state and print the
+    execution plan without starting a browser or downloading anything.
+    Exits 1 when something the run needs is missing, or when `--import-budget`
+    is exceeded (import time of this module, or a heavy module got loaded).
+    """
+    import argparse
+    
+    parser = argparse.ArgumentParser(prog="main.py plan", description="Print the execution plan without running it")
+    parser.add_argument("--import-budget", type=float, metavar="MS",
+                        help="fail if importing main.py took longer or loaded playwright/requests/pandas")
+    parser.add_argument("--imports-only", action="store_true",
+                        help="only check the import budget (CI check, no session or video needed)")
+    args = parser.parse_args(argv)
+    
+    if args.imports_only:
+        return 0 if check_imports(args.import_budget) else 1
+    
+    ok = True
+    current_day = read_day()
+    print("📋 EXECUTION PLAN (dry run, no browser)")
+    print(f"   Day:        {current_day} ({DAY_COUNTER_FILE}{'' if DAY_COUNTER_FILE.exists() else ' missing, starting at 1'})")
+    
+    try:
+        link = choose_video_link(current_day)
+        cached = video_cache.peek(link) if video_cache.cache_enabled() else None
+        source = f"cached, {cached['size'] / 1e6:.1f} MB" if cached else "download"
+        print(f"   Video:      {link} ({source})")
+    except (FileNotFoundError, ValueError) as e:
+        print(f"   Video:      ❌ {e}")
+        ok = False
+    
+    tags, tag_source = peek_hashtags()
+    caption = format_caption(current_day, tags)
+    print(f"   Hashtags:   {tag_source}")
+    print("   Caption:    " + "\n".join(("               " + line) if line else "" for line in caption.split("\n")).lstrip())
+    
+    storage_state_path = os.getenv("IG_STORAGE_STATE_PATH", "storage_state.json")
+    valid, description = describe_storage_state(storage_state_path)
+    print(f"   Session:    {'' if valid else '❌ '}{description}")
+    ok = ok and valid
+    
+    from mp4_faststart import transcode_mode
+    from resource_blocker import blocking_mode
+    print(f"   Target:     {BASE_URL}")
+    print(f"   Browser:    {'headless' if get_browser_config() else 'headful'}, "
+          + ("daemon" if use_browser_daemon() else
+             "persistent profile" if browser_profile.use_persistent_profile() else "fresh context"))
+    print(f"   Switches:   pipeline={use_pipeline()} blocking={blocking_mode() or 'off'} "
+          f"transcode={transcode_mode() or 'off'}")
+    
+    ok = check_imports(args.import_budget) and ok
+    return 0 if ok else 1
+
+def check_imports(budget=None):
+    """Report main.py's import time; False if over `budget` ms or a heavy module got loaded"""
+    heavy = [name for name in HEAVY_MODULES if name in sys.modules]
+    print(f"   Import:     main.py in {IMPORT_MS:.0f}ms, heavy modules loaded: {', '.join(heavy) or 'none'}")
+    if budget is not None and (IMPORT_MS > budget or heavy):
+        print(f"❌ Import budget of {budget:.0f}ms exceeded")
+        return False
+    return True
+
 def main():
     """
     Main function with FIXED Instagram automation
@@ -562,71 +854,64 @@ def main():
     current_day = read_day()
     print(f"\n📅 Current day: {current_day}")
     
-    # Download video
+    timer = PhaseTimer()
+    telemetry = Telemetry(day=current_day, pipeline=use_pipeline(), daemon=use_browser_daemon())
     try:
-        video_path = download_random_video()
-    except Exception as e:
-        print(f"❌ Video download failed: {e}")
+        video_link = choose_video_link(current_day)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"❌ No video to post: {e}")
+        telemetry.set(success=False, error=f"video: {e}")
+        telemetry.write()
         return
-    
-    # Get hashtags
-    try:
-        tags = get_trending_hashtags()
-        if isinstance(tags, (list, tuple)):
-            hashtags_text = " ".join(f"#{t.lstrip('#')}" for t in tags[:20])
-        else:
-            hashtags_text = str(tags)
-    except Exception as e:
-        print(f"⚠️ Hashtag generation failed: {e}")
-        hashtags_text = "#motivation #viral #trending #instagram #reels"
-    
-    caption = f"Reminder – Day {current_day}\n\n{hashtags_text}"
-    print(f"📝 Caption preview: {caption[:100]}...")
+    telemetry.set(video=video_cache.drive_file_id(video_link))
+    prefetch = None
+    if use_pipeline():
+        # Download and hashtags run while the browser starts and navigates; the
+        # video is joined at file selection, the caption at the caption stage
+        print("🔀 Pipelined mode: prefetching video and hashtags in the background")
+        prefetch = ThreadPoolExecutor(max_workers=2, thread_name_prefix="prefetch")
+        video_path = prefetch.submit(prepare_video_or_record, timer, VIDEO_LOCAL, video_link)
+        caption = prefetch.submit(timer.timed, "hashtags", build_caption, current_day)
+    else:
+        # Download video and check it before any browser work
+        try:
+            video_path = prepare_video_or_record(timer, VIDEO_LOCAL, video_link)
+        except VideoUnavailable as e:
+            telemetry.set(success=False, error=str(e), phases=timer.durations())
+            telemetry.write()
+            return
+        
+        caption = timer.timed("hashtags", build_caption, current_day)
+        print(f"📝 Caption preview: {caption[:100]}...")
     
     # Fixed Web Automation
     success = False
+    capture = EventCapture()
     storage_state_path = os.getenv("IG_STORAGE_STATE_PATH", "storage_state.json")
     
     if Path(storage_state_path).exists():
         try:
             print(f"\n🚀 STARTING FIXED AUTOMATION...")
             
-            with sync_playwright() as p:
-                browser = p.chromium.launch(
-                    headless=get_browser_config(),
-                    args=[
-                        "--no-sandbox",
-                        "--disable-setuid-sandbox",
-                        "--disable-dev-shm-usage",
-                        "--disable-blink-features=AutomationControlled",
-                        "--window-size=1920,1080"
-                    ]
-                )
-                
-                context = browser.new_context(
-                    storage_state=str(storage_state_path),
-                    user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-                    viewport={"width": 1920, "height": 1080}
-                )
-                
-                page = context.new_page()
-                page.set_default_timeout(30000)
-                
-                automation = InstagramFixedAutomation(page)
-                # Attach debug listeners
-                automation.install_event_listeners()
-                success = automation.attempt_upload(video_path, caption)
-                
-                context.close()
-                browser.close()
-                
+            success = run_browser_flow(storage_state_path, video_path, caption, timer, telemetry, capture)
+            
+        except VideoUnavailable as e:
+            telemetry.set(error=str(e))
         except Exception as e:
             print(f"❌ Fixed automation error: {e}")
+            telemetry.set(error=str(e))
             traceback.print_exc()
     else:
         print("⚠️ No Instagram storage state found")
         print("💡 Create storage_state.json with Instagram login session")
     
+    if prefetch:
+        prefetch.shutdown(wait=True)
+    telemetry.set(events=capture.close())
+    timer.report()
+    telemetry.set(success=success, phases=timer.durations())
+    telemetry.write()
+    
     # Results
     print("\n" + "="*80)
     print("📊 FIXED AUTOMATION RESULTS")
@@ -640,12 +925,13 @@ def main():
         # Update day counter
         next_day = current_day + 1
         write_next_day(next_day)
+        video_manifest.record_post(video_link, current_day)
         print(f"📅 Day counter updated: {current_day} → {next_day}")
         
     else:
         print("❌ Fixed automation reported no explicit success. Please inspect debug screenshots and logs.")
         print("\n🔧 TROUBLESHOOTING:")
-        print("1. Check debug_*.png screenshots")
+        print("1. Check debug_*.jpg screenshots (IG_DEBUG_SCREENSHOTS=1 saves every step)")
         print("2. Verify storage_state.json is valid and logged-in")
         print("3. Look for PAGE CONSOLE / REQUEST FAILED entries above")
         print("4. Re-run headful (PLAYWRIGHT_HEADLESS=false) and observe UI")
@@ -666,4 +952,6 @@ def main():
     print(f"   Cost: $0 (completely free)")
 
 if __name__ == "__main__":
+    if sys.argv[1:2] in (["plan"], ["--dry-run"]):
+        sys.exit(plan(sys.argv[2:]))
     main()
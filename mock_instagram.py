@@ -0,0 +1,274 @@
+# mock_instagram.py
+# Local stand-in for Instagram's Create flow, used by benchmark.py.
+#
+# Serves a scripted copy of Create -> Select from computer -> Next -> Next ->
+# caption -> Share with the same markup the selectors and stage predicates look
+# for, plus a fake upload endpoint and a configure endpoint that answers like
+# the real one. Each scenario sets latencies (server and in-page) and DOM
+# variants: renamed classes, changed button text, missing buttons, delayed
+# mounts, a rejected publish, a publish endpoint the watcher does not know.
+#
+#   python mock_instagram.py --scenario renamed_classes --port 8765
+
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BASELINE = {
+    'page_ms': 50,             # server delay before any HTML page
+    'dialog_ms': 150,          # Create click -> dialog mounted
+    'mount_delay_ms': 0,       # dialog mounted -> Select button mounted
+    'preview_ms': 400,         # file chosen -> crop preview
+    'step_ms': 200,            # Next click -> next step rendered
+    'upload_ms_per_mb': 200,   # fake upload endpoint throughput
+    'configure_ms': 300,       # Share -> configure response
+    'configure_status': 200,
+    'configure_path': '/api/v1/media/configure_to_clips/',
+    'create_button': True,
+    'select_button': True,
+    'select_text': 'Select from computer',
+    'select_class': '_aswp _aswr _aswu _asw_ _asx2',
+    'next_class': 'x1i10hfl xjqpnuy',
+    'caption_label': 'Write a caption...',
+    'expect_success': True,
+}
+
+SCENARIOS = {
+    'baseline': {},
+    'slow_network': {'page_ms': 400, 'upload_ms_per_mb': 1500, 'configure_ms': 1500},
+    'renamed_classes': {'select_class': '_x9q1 _x9q2', 'next_class': 'x7zz9 x7zz1'},
+    'text_changed': {'select_text': 'Upload from device'},
+    'no_caption_label': {'caption_label': None},
+    'missing_create': {'create_button': False},
+    'delayed_mount': {'mount_delay_ms': 2500, 'preview_ms': 1500, 'step_ms': 800},
+    'missing_select': {'select_button': False, 'expect_success': False},
+    'publish_rejected': {'configure_status': 400, 'expect_success': False},
+    # Publish response not recognised: success comes from the on-page fallback
+    'publish_unrecognized': {'configure_path': '/api/v1/clips/finalize/',
+                             'env': {'IG_STAGE_TIMEOUT_PUBLISH': '3000'}},
+}
+
+
+def scenario_config(name):
+    if name not in SCENARIOS:
+        raise KeyError(f"unknown scenario '{name}' (choose from {', '.join(SCENARIOS)})")
+    return {**BASELINE, **SCENARIOS[name], 'name': name}
+
+
+PAGE_HTML = '''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Instagram (mock)</title>
+<style>
+  body { font-family: sans-serif; margin: 0; }
+  nav { position: fixed; left: 0; top: 0; bottom: 0; width: 220px; padding: 16px; border-right: 1px solid #ddd; }
+  nav a { display: block; padding: 12px 0; color: #000; text-decoration: none; cursor: pointer; }
+  main { margin-left: 260px; padding: 16px; }
+  div[role="dialog"] { position: fixed; top: 10%; left: 25%; width: 50%; min-height: 400px;
+                       background: #fff; border-radius: 12px; box-shadow: 0 0 0 100vmax rgba(0,0,0,.6); padding: 16px; }
+  div[role="button"], button { display: inline-block; padding: 8px 16px; cursor: pointer; color: #0095f6; }
+  div[contenteditable="true"] { min-height: 120px; border: 1px solid #ddd; padding: 8px; }
+  canvas { display: block; width: 320px; height: 320px; background: #222; }
+</style>
+</head>
+<body>
+<nav role="navigation">
+  <a href="/"><span class="x1lliihq">Home</span></a>
+  <a href="/explore/"><span class="x1lliihq">Explore</span></a>
+</nav>
+<main><article>Feed</article></main>
+<script>
+const S = __SCENARIO__;
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+const make = (tag, attrs, text) => {
+    const node = document.createElement(tag);
+    Object.entries(attrs || {}).forEach(([k, v]) => { if (v !== null && v !== undefined) node.setAttribute(k, v); });
+    if (text) node.textContent = text;
+    return node;
+};
+
+let dialog = null;
+let upload = null;
+
+const step = (heading, ...children) => {
+    dialog.replaceChildren(make('h1', {}, heading), ...children);
+};
+const nextButton = (onClick) => {
+    const button = make('div', { role: 'button', tabindex: '0', class: S.next_class }, 'Next');
+    button.addEventListener('click', onClick, { once: true });
+    return button;
+};
+
+async function openDialog() {
+    if (dialog) return;
+    await sleep(S.dialog_ms);
+    dialog = make('div', { role: 'dialog' });
+    document.body.appendChild(dialog);
+    step('Create new post');
+    await sleep(S.mount_delay_ms);
+    if (!S.select_button) return;
+    const picker = make('input', { type: 'file', style: 'display:none' });
+    const select = make('button', { type: 'button', class: S.select_class }, S.select_text);
+    select.addEventListener('click', () => picker.click());
+    dialog.append(picker, select);
+}
+
+// Any file input (including one injected by the automation) starts the upload
+document.addEventListener('change', async (event) => {
+    const input = event.target;
+    if (!dialog || input.type !== 'file' || !input.files.length) return;
+    const file = input.files[0];
+    upload = fetch('/rupload_igvideo/' + Date.now(), { method: 'POST', body: file })
+        .then((resp) => resp.json());
+    await sleep(S.preview_ms);
+    step('Crop', make('canvas'), nextButton(showEdit));
+}, true);
+
+async function showEdit() {
+    await sleep(S.step_ms);
+    step('Edit', make('canvas'), nextButton(showCaption));
+}
+
+async function showCaption() {
+    await sleep(S.step_ms);
+    const caption = make('div', {
+        contenteditable: 'true', role: 'textbox', 'aria-label': S.caption_label,
+        class: 'xw2csxc x1odjw0f', 'data-lexical-editor': 'true',
+    });
+    const share = make('div', { role: 'button', tabindex: '0', class: S.next_class }, 'Share');
+    share.addEventListener('click', () => publish(caption.innerText), { once: true });
+    step('Create new reel', make('canvas'), caption, share);
+}
+
+async function publish(text) {
+    step('Sharing');
+    const uploaded = await upload;
+    const resp = await fetch(S.configure_path, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ upload_id: uploaded.upload_id, caption: text }),
+    });
+    step(resp.ok ? 'Reel shared' : 'Something went wrong',
+         make('div', { role: 'status' }, resp.ok ? 'Your reel has been shared.' : 'Your reel could not be shared.'));
+}
+
+if (S.create_button) {
+    const create = make('a', { href: '#' });
+    create.append(make('span', { class: 'x1lliihq' }, 'Create'));
+    create.addEventListener('click', (event) => { event.preventDefault(); openDialog(); });
+    document.querySelector('nav').appendChild(create);
+}
+if (location.pathname.startsWith('/create/')) openDialog();
+</script>
+</body>
+</html>
+'''
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "MockInstagram/1.0"
+
+    def log_message(self, format, *args):
+        pass  # keep benchmark output readable
+
+    def _send(self, status, body, content_type):
+        data = body.encode() if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _json(self, status, payload):
+        self._send(status, json.dumps(payload), "application/json")
+
+    def do_GET(self):
+        mock = self.server.mock
+        path = self.path.split("?")[0]
+        if path == "/favicon.ico":
+            return self._send(404, "", "text/plain")
+        time.sleep(mock.scenario['page_ms'] / 1000)
+        mock.count("pages")
+        self._send(200, mock.page_html, "text/html; charset=utf-8")
+
+    def do_POST(self):
+        mock = self.server.mock
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        scenario = mock.scenario
+        if self.path.startswith("/rupload_igvideo/"):
+            time.sleep(scenario['upload_ms_per_mb'] * len(body) / 1e6 / 1000)
+            mock.count("uploads", len(body))
+            return self._json(200, {"status": "ok", "upload_id": uuid.uuid4().hex})
+        if self.path.startswith(scenario['configure_path']):
+            time.sleep(scenario['configure_ms'] / 1000)
+            mock.count("configures")
+            if scenario['configure_status'] >= 400:
+                return self._json(scenario['configure_status'],
+                                  {"status": "fail", "message": "mock rejected the post"})
+            media_id = str(uuid.uuid4().int)[:19]
+            return self._json(200, {"status": "ok", "media": {"pk": media_id, "id": f"{media_id}_1"}})
+        self._json(404, {"status": "fail", "message": "unknown endpoint"})
+
+
+class MockInstagram:
+    """Threaded HTTP server for one scenario; use as a context manager"""
+
+    def __init__(self, scenario='baseline', host="127.0.0.1", port=0):
+        self.scenario = scenario_config(scenario)
+        self.page_html = PAGE_HTML.replace("__SCENARIO__", json.dumps(self.scenario))
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.mock = self
+        self.thread = None
+        self.lock = threading.Lock()
+        self.hits = {"pages": 0, "uploads": 0, "upload_bytes": 0, "configures": 0}
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, name, upload_bytes=0):
+        with self.lock:
+            self.hits[name] += 1
+            self.hits["upload_bytes"] += upload_bytes
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="mock-instagram", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the mock Instagram Create flow")
+    parser.add_argument("--scenario", default="baseline", choices=sorted(SCENARIOS))
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args(argv)
+
+    mock = MockInstagram(args.scenario, port=args.port)
+    print(f"🧪 Mock Instagram ({args.scenario}) at {mock.url}/  (IG_BASE_URL={mock.url})")
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mock.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+# mp4_faststart.py
+# Pre-upload optimization: move the moov box in front of mdat (qt-faststart
+# style) and, optionally, re-encode clips that are outside Reels spec.
+#
+# The faststart rewrite is pure Python. The source is memory-mapped and
+# copied box by box in fixed-size chunks; only moov (the index, usually a few
+# hundred KB) is held in memory while its chunk offsets (stco/co64) are
+# shifted. Re-encoding needs ffmpeg (PATH or imageio-ffmpeg) and only runs
+# when IG_VIDEO_TRANSCODE is set. Outputs are cached by the source's content
+# hash, so each source is processed once.
+#
+#   python mp4_faststart.py video.mp4 [out.mp4]
+
+import hashlib
+import mmap
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from mp4_preflight import PreflightError, inspect, iter_boxes
+
+PROCESSED_DIR = Path(os.getenv("IG_PROCESSED_DIR", ".processed_videos"))
+MAX_PROCESSED_MB = int(os.getenv("IG_PROCESSED_MAX_MB", "2000"))
+COPY_CHUNK = 4 * 1024 * 1024
+# Reels target: long side <= 1920, short side <= 1080, bounded bitrate
+MAX_LONG_SIDE = 1920
+MAX_SHORT_SIDE = 1080
+MAX_MBPS = float(os.getenv("IG_VIDEO_MAX_MBPS", "25"))
+# Boxes whose children are walked to find stco/co64
+CONTAINERS = (b"moov", b"trak", b"mdia", b"minf", b"stbl")
+
+
+class FaststartError(Exception):
+    pass
+
+
+def _patch_chunk_offsets(moov, start, end, low, high, delta):
+    """Add `delta` to every stco/co64 entry pointing into [low, high)"""
+    for box_type, _, payload, box_end in iter_boxes(moov, start, end):
+        if box_type in CONTAINERS:
+            _patch_chunk_offsets(moov, payload, box_end, low, high, delta)
+        elif box_type == b"cmov":
+            raise FaststartError("compressed moov is not supported")
+        elif box_type in (b"stco", b"co64"):
+            count = struct.unpack_from(">I", moov, payload + 4)[0]
+            fmt, width = (">I", 4) if box_type == b"stco" else (">Q", 8)
+            position = payload + 8
+            for _ in range(count):
+                offset = struct.unpack_from(fmt, moov, position)[0]
+                if low <= offset < high:
+                    offset += delta
+                    if box_type == b"stco" and offset > 0xFFFFFFFF:
+                        raise FaststartError("chunk offsets overflow stco (needs co64 upgrade)")
+                    struct.pack_into(fmt, moov, position, offset)
+                position += width
+
+
+def faststart(src, dst):
+    """
+    Write `src` to `dst` with moov moved in front of the first mdat.
+    Returns False (and writes nothing) when `src` is already faststart.
+    """
+    src = Path(src)
+    with src.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        boxes = list(iter_boxes(buf, 0, len(buf)))
+        types = [box[0] for box in boxes]
+        if b"moov" not in types or b"mdat" not in types:
+            raise FaststartError("no moov/mdat box")
+        moov_index = types.index(b"moov")
+        mdat_index = types.index(b"mdat")
+        if moov_index < mdat_index:
+            return False
+
+        _, moov_start, moov_payload, moov_end = boxes[moov_index]
+        moov = bytearray(buf[moov_start:moov_end])
+        # moov goes right before the first mdat; everything from there up to
+        # the old moov position moves forward by len(moov)
+        insert_at = boxes[mdat_index][1]
+        _patch_chunk_offsets(moov, moov_payload - moov_start, len(moov),
+                             insert_at, moov_start, len(moov))
+
+        order = boxes[:mdat_index] + [None] + [b for i, b in enumerate(boxes[mdat_index:], mdat_index)
+                                               if i != moov_index]
+        tmp = Path(f"{dst}.tmp")
+        with tmp.open("wb") as out:
+            for box in order:
+                if box is None:
+                    out.write(moov)
+                    continue
+                _, start, _, end = box
+                for offset in range(start, end, COPY_CHUNK):
+                    out.write(buf[offset:min(offset + COPY_CHUNK, end)])
+    os.replace(tmp, dst)
+    return True
+
+
+def find_ffmpeg():
+    path = shutil.which("ffmpeg")
+    if path:
+        return path
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return None
+
+
+def transcode_mode():
+    """'' (never), 'auto' (only out-of-spec clips) or 'always' from IG_VIDEO_TRANSCODE"""
+    value = os.getenv("IG_VIDEO_TRANSCODE", "").lower()
+    return value if value in ("auto", "always") else ""
+
+
+def out_of_spec(report):
+    """Reason the clip should be re-encoded, or None"""
+    long_side = max(report["width"], report["height"])
+    short_side = min(report["width"], report["height"])
+    if long_side > MAX_LONG_SIDE or short_side > MAX_SHORT_SIDE:
+        return f"{report['width']}x{report['height']} above {MAX_SHORT_SIDE}x{MAX_LONG_SIDE}"
+    if report["duration"]:
+        mbps = report["size"] * 8 / report["duration"] / 1e6
+        if mbps > MAX_MBPS:
+            return f"{mbps:.0f} Mbps above {MAX_MBPS:g}"
+    if report["video_codec"] not in ("avc1", "avc3"):
+        return f"codec {report['video_codec']}"
+    return None
+
+
+def transcode(src, dst, ffmpeg):
+    """H.264/AAC within Reels limits, faststart, via ffmpeg"""
+    scale = (f"scale='if(gt(iw,ih),min({MAX_LONG_SIDE},iw),-2)':'if(gt(iw,ih),-2,min({MAX_LONG_SIDE},ih))',"
+             f"scale='if(gt(iw,ih),-2,min({MAX_SHORT_SIDE},iw))':'if(gt(iw,ih),min({MAX_SHORT_SIDE},ih),-2)'")
+    tmp = Path(f"{dst}.tmp.mp4")
+    cmd = [
+        ffmpeg, "-y", "-v", "error", "-i", str(src),
+        "-vf", scale, "-c:v", "libx264", "-preset", "veryfast", "-crf", "23",
+        "-maxrate", "8M", "-bufsize", "16M", "-pix_fmt", "yuv420p",
+        "-c:a", "aac", "-b:a", "128k", "-movflags", "+faststart", str(tmp),
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        tmp.unlink(missing_ok=True)
+        raise FaststartError(f"ffmpeg failed: {result.stderr.strip()[-300:]}")
+    os.replace(tmp, dst)
+
+
+def content_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(COPY_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _evict(keep):
+    """Drop least recently used outputs while the cache is over budget"""
+    files = sorted(PROCESSED_DIR.glob("*.mp4"), key=lambda p: p.stat().st_mtime)
+    total = sum(p.stat().st_size for p in files)
+    for path in files:
+        if total <= MAX_PROCESSED_MB * 1024 * 1024:
+            break
+        if path == keep:
+            continue
+        total -= path.stat().st_size
+        path.unlink(missing_ok=True)
+
+
+def optimize_video(path, report=None):
+    """
+    Pipeline stage between preflight and upload. Returns the path to upload:
+    `path` itself when nothing needs doing, otherwise a cached processed copy.
+    """
+    started = time.monotonic()
+    report = report or inspect(path)
+    mode = transcode_mode()
+    reason = out_of_spec(report) if mode == "auto" else ("forced" if mode == "always" else None)
+    ffmpeg = find_ffmpeg() if reason else None
+    if reason and not ffmpeg:
+        print(f"⚠️ Would re-encode ({reason}) but ffmpeg is not available")
+    if report["faststart"] and not ffmpeg:
+        return path
+
+    variant = "reels" if ffmpeg else "faststart"
+    PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
+    target = PROCESSED_DIR / f"{content_hash(path)}-{variant}.mp4"
+    if target.exists():
+        os.utime(target)
+        print(f"♻️ Using cached {variant} copy {target.name[:12]}… ({(time.monotonic() - started) * 1000:.0f}ms)")
+        return target
+
+    try:
+        if ffmpeg:
+            print(f"🎬 Re-encoding to Reels spec ({reason})...")
+            transcode(path, target, ffmpeg)
+        else:
+            faststart(path, target)
+        result = inspect(target)
+        if not result["faststart"]:
+            raise FaststartError("output is still not faststart")
+    except (FaststartError, PreflightError, OSError) as e:
+        target.unlink(missing_ok=True)
+        print(f"⚠️ Video optimization skipped: {e}")
+        return path
+
+    print(f"⚡ {variant} copy ready (moov first, {report['size'] / 1e6:.1f} → "
+          f"{result['size'] / 1e6:.1f} MB) in {(time.monotonic() - started) * 1000:.0f}ms")
+    _evict(keep=target)
+    return target
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("usage: python mp4_faststart.py video.mp4 [out.mp4]")
+        sys.exit(2)
+    if len(sys.argv) > 2:
+        print("✅ rewritten" if faststart(sys.argv[1], sys.argv[2]) else "already faststart")
+    else:
+        print(optimize_video(sys.argv[1]))
@@ -0,0 +1,194 @@
+# mp4_preflight.py
+# Fast MP4 sanity check run before the browser is started.
+#
+# The file is memory-mapped and only box headers are walked (ftyp/moov/mdat at
+# the top level, then moov -> trak -> mdia -> minf -> stbl -> stsd), so even a
+# large video is validated in milliseconds without reading its payload. A Drive
+# HTML warning page, a truncated download or an out-of-spec clip is rejected
+# here instead of after set_input_files.
+#
+#   python mp4_preflight.py video.mp4
+
+import mmap
+import os
+import struct
+import sys
+import time
+from pathlib import Path
+
+# Reels-friendly limits; override with IG_VIDEO_* variables
+MIN_DURATION = float(os.getenv("IG_VIDEO_MIN_SECONDS", "3"))
+MAX_DURATION = float(os.getenv("IG_VIDEO_MAX_SECONDS", "900"))
+MIN_SIDE = int(os.getenv("IG_VIDEO_MIN_SIDE", "320"))
+VIDEO_CODECS = ("avc1", "avc3", "hvc1", "hev1")
+
+
+class PreflightError(ValueError):
+    pass
+
+
+def iter_boxes(buf, start, end):
+    """Yield (type, box_start, payload_start, box_end) for the boxes in buf[start:end]"""
+    offset = start
+    while offset + 8 <= end:
+        size, box_type = struct.unpack_from(">I4s", buf, offset)
+        header = 8
+        if size == 1:
+            if offset + 16 > end:
+                raise PreflightError(f"truncated large-size header for '{box_type.decode('latin-1')}'")
+            size = struct.unpack_from(">Q", buf, offset + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - offset  # box runs to the end of its parent
+        if size < header:
+            raise PreflightError(f"corrupt box '{box_type.decode('latin-1')}' at {offset} (size {size})")
+        if offset + size > end:
+            raise PreflightError(
+                f"truncated: '{box_type.decode('latin-1')}' at {offset} needs {size} bytes, "
+                f"only {end - offset} present"
+            )
+        yield box_type, offset, offset + header, offset + size
+        offset += size
+    if offset != end and end - offset < 8 and any(buf[offset:end]):
+        raise PreflightError(f"{end - offset} stray bytes at end of box list")
+
+
+def _find(buf, start, end, wanted):
+    for box_type, _, payload, box_end in iter_boxes(buf, start, end):
+        if box_type == wanted:
+            return payload, box_end
+    return None
+
+
+def _parse_mvhd(buf, payload):
+    version = buf[payload]
+    if version == 1:
+        timescale, duration = struct.unpack_from(">IQ", buf, payload + 20)
+    else:
+        timescale, duration = struct.unpack_from(">II", buf, payload + 12)
+    return duration / timescale if timescale else 0.0
+
+
+def moov_duration(moov):
+    """Duration in seconds from the bytes of a complete moov box, or None"""
+    header = 16 if struct.unpack_from(">I", moov, 0)[0] == 1 else 8
+    mvhd = _find(moov, header, len(moov), b"mvhd")
+    return round(_parse_mvhd(moov, mvhd[0]), 3) if mvhd else None
+
+
+def _parse_trak(buf, payload, end):
+    """(handler, codec, width, height) for one track"""
+    width = height = 0
+    tkhd = _find(buf, payload, end, b"tkhd")
+    if tkhd:
+        # width/height are the last two 16.16 fixed-point fields of tkhd
+        w, h = struct.unpack_from(">II", buf, tkhd[1] - 8)
+        width, height = w >> 16, h >> 16
+
+    handler = codec = None
+    mdia = _find(buf, payload, end, b"mdia")
+    if mdia:
+        hdlr = _find(buf, mdia[0], mdia[1], b"hdlr")
+        if hdlr:
+            handler = bytes(buf[hdlr[0] + 8:hdlr[0] + 12]).decode("latin-1")
+        minf = _find(buf, mdia[0], mdia[1], b"minf")
+        stbl = _find(buf, minf[0], minf[1], b"stbl") if minf else None
+        stsd = _find(buf, stbl[0], stbl[1], b"stsd") if stbl else None
+        if stsd and stsd[0] + 16 <= stsd[1]:
+            # full box header (4) + entry count (4), then the first sample entry
+            codec = bytes(buf[stsd[0] + 12:stsd[0] + 16]).decode("latin-1")
+    return handler, codec, width, height
+
+
+def inspect(path):
+    """
+    Walk the box headers of `path` and describe the file.
+    Raises PreflightError for anything that is not a complete MP4/MOV.
+    """
+    started = time.monotonic()
+    path = Path(path)
+    size = path.stat().st_size
+    if size < 16:
+        raise PreflightError(f"file is only {size} bytes")
+
+    with path.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        head = bytes(buf[:64]).lstrip().lower()
+        if head.startswith((b"<!doctype", b"<html", b"<?xml", b"{")):
+            raise PreflightError("file is an HTML/text page, not a video (Drive warning page?)")
+
+        report = {
+            "size": size,
+            "brand": None,
+            "duration": None,
+            "width": 0,
+            "height": 0,
+            "video_codec": None,
+            "audio_codec": None,
+            "moov_offset": None,
+            "mdat_offset": None,
+        }
+        for index, (box_type, box_start, payload, box_end) in enumerate(iter_boxes(buf, 0, size)):
+            if box_type == b"ftyp":
+                report["brand"] = bytes(buf[payload:payload + 4]).decode("latin-1")
+            elif index == 0 and box_type not in (b"free", b"skip", b"wide"):
+                raise PreflightError(f"first box is '{box_type.decode('latin-1')}', expected 'ftyp'")
+            elif box_type == b"moov":
+                report["moov_offset"] = box_start
+                mvhd = _find(buf, payload, box_end, b"mvhd")
+                if mvhd:
+                    report["duration"] = round(_parse_mvhd(buf, mvhd[0]), 3)
+                for child, _, child_payload, child_end in iter_boxes(buf, payload, box_end):
+                    if child != b"trak":
+                        continue
+                    handler, codec, width, height = _parse_trak(buf, child_payload, child_end)
+                    if handler == "vide" and not report["video_codec"]:
+                        report.update(video_codec=codec, width=width, height=height)
+                    elif handler == "soun" and not report["audio_codec"]:
+                        report["audio_codec"] = codec
+            elif box_type == b"mdat":
+                report["mdat_offset"] = box_start
+
+    if report["brand"] is None:
+        raise PreflightError("no 'ftyp' box - not an MP4/MOV file")
+    if report["moov_offset"] is None:
+        raise PreflightError("no 'moov' box - download incomplete or not a finished recording")
+    if report["mdat_offset"] is None:
+        raise PreflightError("no 'mdat' box - file carries no media data")
+    report["faststart"] = report["moov_offset"] < report["mdat_offset"]
+    report["elapsed_ms"] = round((time.monotonic() - started) * 1000, 2)
+    return report
+
+
+def check_spec(report):
+    """Raise PreflightError when the clip is outside what we post"""
+    if not report["video_codec"]:
+        raise PreflightError("no video track")
+    if report["video_codec"] not in VIDEO_CODECS:
+        raise PreflightError(f"video codec '{report['video_codec']}' not accepted ({', '.join(VIDEO_CODECS)})")
+    duration = report["duration"] or 0
+    if not MIN_DURATION <= duration <= MAX_DURATION:
+        raise PreflightError(f"duration {duration:.1f}s outside {MIN_DURATION:g}-{MAX_DURATION:g}s")
+    if min(report["width"], report["height"]) < MIN_SIDE:
+        raise PreflightError(f"resolution {report['width']}x{report['height']} below {MIN_SIDE}px")
+
+
+def preflight(path):
+    """inspect() + check_spec(); prints a one-line summary and returns the report"""
+    report = inspect(path)
+    check_spec(report)
+    print(f"🎞️ Preflight OK: {report['width']}x{report['height']} {report['video_codec']}"
+          f"/{report['audio_codec'] or 'no audio'}, {report['duration']:.1f}s, "
+          f"{report['size'] / 1e6:.1f} MB, faststart={'yes' if report['faststart'] else 'no'} "
+          f"({report['elapsed_ms']}ms)")
+    return report
+
+
+if __name__ == "__main__":
+    status = 0
+    for arg in sys.argv[1:]:
+        try:
+            preflight(arg)
+        except (PreflightError, OSError) as e:
+            print(f"❌ {arg}: {e}")
+            status = 1
+    sys.exit(status)
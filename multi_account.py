@@ -0,0 +1,465 @@
+# multi_account.py
+# Async multi-account posting: one shared Chromium, one isolated BrowserContext
+# per account storage state, bounded concurrency and a per-account report.
+#
+#   python multi_account.py                      # every accounts/*.json
+#   python multi_account.py a.json b.json --concurrency 2
+
+import argparse
+import asyncio
+import os
+import time
+import traceback
+from pathlib import Path
+from playwright.async_api import async_playwright, TimeoutError as PWTimeout
+
+from main import (
+    BASE_URL, BROWSER_ARGS, USER_AGENT, VIEWPORT, INJECT_FILE_INPUT_JS,
+    get_browser_config, read_day, write_next_day, download_random_video, build_caption,
+    choose_video_link,
+)
+import video_manifest
+from selector_race import race_selectors_async
+from ig_selectors import get_selector_registry
+from stages import (STAGE_CONDITIONS, SIGNATURE_JS, DETECT_STAGE_JS, stage_timeout, stage_retries,
+                    resume_stage, ESCAPE_SAFE_STAGES)
+from publish_confirm import PublishWatcher, parse_publish_response
+from mp4_preflight import preflight
+from mp4_faststart import optimize_video
+from screenshot_ring import ScreenshotRing
+from telemetry import Telemetry
+from resource_blocker import ResourceBlocker, blocking_mode
+from event_capture import EventCapture
+from upload_monitor import UploadMonitor, format_progress
+from caption_entry import enter_caption_async
+
+ACCOUNTS_DIR = Path(os.getenv("IG_ACCOUNTS_DIR", "accounts"))
+DEFAULT_CONCURRENCY = int(os.getenv("IG_MAX_CONCURRENCY", "3"))
+
+
+class AsyncInstagramAutomation:
+    """
+    asyncio port of main.InstagramFixedAutomation.
+    Same stages, selectors and postconditions; output is prefixed per account.
+    """
+
+    UPLOAD_STAGES = ['home', 'create', 'select_file', 'crop', 'edit', 'caption', 'share']
+
+    def __init__(self, page, account, telemetry=None, selectors=None):
+        self.page = page
+        self.account = account
+        self.telemetry = telemetry or Telemetry(account=account)
+        self.selectors = selectors or get_selector_registry()
+        self.publish_watcher = PublishWatcher()
+        self.media_id = None
+        self.upload_monitor = None
+        self.share_clicked = False
+        self.screenshots = ScreenshotRing()
+
+    def log(self, message):
+        print(f"[{self.account}] {message}")
+
+    async def wait_and_screenshot(self, filename, delay=0, force=False):
+        """Helper for debugging with screenshots (buffered in memory unless debug is on)"""
+        if delay:
+            await asyncio.sleep(delay)
+        await self.screenshots.capture_async(self.page, f"{self.account}_{filename}", force=force)
+
+    async def wait_for_stage(self, name, arg=None):
+        """Wait for a stage postcondition; False on timeout"""
+        timeout = stage_timeout(name)
+        started = time.monotonic()
+        with self.telemetry.span(f"wait.{name}") as span:
+            try:
+                await self.page.wait_for_function(STAGE_CONDITIONS[name], arg=arg, timeout=timeout)
+                self.log(f"  ⏱️ Stage '{name}' ready in {(time.monotonic() - started) * 1000:.0f}ms")
+                return True
+            except PWTimeout:
+                self.log(f"  ⚠️ Stage '{name}' not reached within {timeout}ms")
+                span['ok'] = False
+                return False
+
+    async def dialog_signature(self):
+        try:
+            return await self.page.evaluate(SIGNATURE_JS)
+        except Exception:
+            return ''
+
+    async def install_event_listeners(self, capture):
+        """In-page filtered, batched event capture tagged with the account (event_capture.py)"""
+        try:
+            await capture.install_async(self.page, account=self.account)
+        except Exception as e:
+            self.log(f"⚠️ Event capture unavailable: {e}")
+
+    async def find(self, key, timeout=10000, step=None):
+        step = step or key
+        self.log(f"🔍 Looking for {step}...")
+        candidates = self.selectors.candidates(key)
+        result = await race_selectors_async(self.page, step, candidates, timeout=timeout)
+        self.selectors.record(key, candidates, result)
+        self.telemetry.selector(step, result, candidates, timeout)
+        if not result:
+            self.log(f"⚠️ {step} not found")
+        return result
+
+    async def inject_file_input_and_connect(self, button_selector):
+        """Port of the sync version: inject input, then take a fresh reference"""
+        try:
+            result = await self.page.evaluate(INJECT_FILE_INPUT_JS, button_selector)
+            if not result.get('success'):
+                self.log(f"  ❌ Failed to inject file input: {result.get('error', 'Unknown error')}")
+                return None
+
+            new_button = await self.page.query_selector(f'{button_selector}[data-file-connected="true"]')
+            if not new_button:
+                new_button = await self.page.query_selector(button_selector)
+            if not new_button or not (await new_button.is_visible() and await new_button.is_enabled()):
+                self.log("  ❌ Could not get a usable fresh button reference")
+                return None
+
+            return {
+                'file_input': await self.page.query_selector('#injected-file-input'),
+                'button': new_button,
+            }
+        except Exception as e:
+            self.log(f"  ❌ JavaScript injection failed: {e}")
+            return None
+
+    async def stage_home(self):
+        with self.telemetry.span("navigation"):
+            await self.page.goto(f"{BASE_URL}/", wait_until="domcontentloaded", timeout=60000)
+        await self.wait_for_stage('home')
+        await self.wait_and_screenshot("01_homepage")
+        return True
+
+    async def stage_create(self):
+        result = await self.find('create', timeout=5000)
+        if result:
+            await result['element'].click()
+            await self.wait_for_stage('dialog')
+        else:
+            self.log("🔄 Trying direct navigation...")
+            await self.page.goto(f"{BASE_URL}/create/details/", wait_until="domcontentloaded", timeout=30000)
+            await self.wait_for_stage('home')
+        await self.wait_and_screenshot("02_create_opened")
+        return True
+
+    async def stage_select_file(self):
+        result = await self.find('select_computer')
+        if not result:
+            return False
+
+        with self.telemetry.span("file_injection") as span:
+            connection = await self.inject_file_input_and_connect(result['query'])
+            span['ok'] = bool(connection)
+        if not connection:
+            return False
+
+        try:
+            await connection['button'].click()
+        except Exception as click_error:
+            self.log(f"❌ Button click failed: {click_error}")
+            return False
+
+        size = self.video_path.stat().st_size
+        self.detach_upload_monitor()
+        self.upload_monitor = UploadMonitor(
+            size, lambda *progress: self.log(format_progress(*progress).strip())).attach(self.page)
+        with self.telemetry.span("upload", bytes=size) as span:
+            await connection['file_input'].set_input_files(str(self.video_path.resolve()))
+            self.log(f"✅ Video uploaded: {self.video_path.name}")
+
+            await self.wait_for_stage('file_attached')
+            span['ok'] = await self.wait_for_stage('preview')
+        await self.wait_and_screenshot("03_file_uploaded")
+        return True
+
+    async def wait_for_upload(self):
+        """False only when the upload was rejected; no verdict lets Share decide"""
+        if self.upload_monitor is None:
+            return True
+        if self.upload_monitor.waited:
+            return self.upload_monitor.error is None  # already waited on an earlier try
+        with self.telemetry.span("upload_ack") as span:
+            result = await self.upload_monitor.wait_async()
+            span['ok'] = result is not False
+        self.telemetry.set(upload=self.upload_monitor.summary())
+        self.detach_upload_monitor()
+        return result is not False
+
+    def detach_upload_monitor(self):
+        if self.upload_monitor is not None:
+            self.upload_monitor.detach()
+
+    async def stage_crop(self):
+        result = await self.find('next', step='next_5')
+        if result:
+            signature = await self.dialog_signature()
+            await result['element'].click()
+            await self.wait_for_stage('step_change', signature)
+            await self.wait_and_screenshot("04_first_next_clicked")
+        return True
+
+    async def stage_edit(self):
+        result = await self.find('next', step='next_6')
+        if result:
+            await result['element'].click()
+            await self.wait_for_stage('caption_editor')
+            await self.wait_and_screenshot("05_second_next_clicked")
+        return True
+
+    async def stage_caption(self):
+        result = await self.find('caption')
+        if result:
+            with self.telemetry.span("caption_entry", chars=len(self.caption)) as span:
+                method = await enter_caption_async(self.page, result['element'], self.caption, span)
+            if method:
+                self.log("✅ Caption added successfully")
+            await self.wait_and_screenshot("06_caption_added")
+        else:
+            self.log("⚠️ Caption input not found, continuing without caption...")
+        return True
+
+    async def stage_share(self):
+        if self.share_clicked:
+            # Resumed after Share was clicked: a second click could post twice
+            self.log("⏳ Share was already clicked, only waiting for confirmation...")
+            with self.telemetry.span("confirmation") as span:
+                span['ok'] = bool(await self.confirm_publish())
+            return span['ok']
+
+        result = await self.find('share')
+        if not result:
+            self.log("❌ Share button not found - upload incomplete")
+            return False
+        if not await self.wait_for_upload():
+            self.log("❌ Video upload failed - not sharing")
+            return False
+
+        self.publish_watcher.reset()
+        # Responses are only observed from Python while the post is being published
+        observe = self.publish_watcher.observe
+        self.page.on("response", observe)
+        self.share_clicked = True
+        self.telemetry.set(share_clicked=True)
+        try:
+            with self.telemetry.span("share"):
+                await result['element'].click()
+            self.log("⏳ Waiting for post to complete...")
+            with self.telemetry.span("confirmation") as span:
+                success = await self.confirm_publish()
+                span['ok'] = bool(success)
+        finally:
+            self.page.remove_listener("response", observe)
+        await self.wait_and_screenshot("07_share_clicked")
+        return success
+
+    async def confirm_publish(self):
+        """Server confirmation first, scoped DOM check only as a fallback"""
+        if self.publish_watcher.response is None:
+            timeout = stage_timeout('publish')
+            try:
+                await self.page.wait_for_event("response", predicate=self.publish_watcher.observe, timeout=timeout)
+            except PWTimeout:
+                self.log(f"  ⚠️ No publish response within {timeout}ms")
+
+        resp = self.publish_watcher.response
+        if resp is not None:
+            try:
+                payload = await resp.json() if resp.status < 400 else None
+            except Exception:
+                payload = None
+            confirmed, self.media_id = parse_publish_response(resp.status, resp.url, payload)
+            return confirmed
+
+        self.log("🔎 Falling back to on-page success indicator...")
+        return await self.wait_for_stage('shared')
+
+    async def detect_stage(self, failed=None):
+        """(detected page state, stage to resume from) - see stages.DETECT_STAGE_JS"""
+        try:
+            detected = await self.page.evaluate(DETECT_STAGE_JS)
+            if detected == 'unknown' and failed in ESCAPE_SAFE_STAGES and not self.share_clicked:
+                await self.page.keyboard.press('Escape')
+                detected = await self.page.evaluate(DETECT_STAGE_JS)
+        except Exception as e:
+            self.log(f"  ⚠️ Stage detection failed: {e}")
+            return None, None
+        return detected, resume_stage(detected, self.page.url.startswith(f"{BASE_URL}/"),
+                                      self.share_clicked)
+
+    async def plan_resume(self, stage, budgets, error=None):
+        """Stage to continue from after `stage` failed, or None once its retries are spent"""
+        reason = f" ({error})" if error else ""
+        if budgets[stage] <= 0:
+            self.log(f"❌ Stage '{stage}' failed{reason}, no retries left")
+            return None
+        budgets[stage] -= 1
+        with self.telemetry.span("resume", failed=stage) as span:
+            detected, resume = await self.detect_stage(stage)
+            span.update(detected=detected, resume=resume, ok=resume is not None)
+        if resume:
+            self.log(f"🔁 Stage '{stage}' failed{reason}; page is at '{detected}', "
+                     f"resuming from '{resume}' ({budgets[stage]} retries left)")
+        return resume
+
+    async def attempt_upload(self, video_path, caption):
+        self.video_path = video_path
+        self.caption = caption
+        try:
+            budgets = {stage: stage_retries(stage) for stage in self.UPLOAD_STAGES}
+            index = 0
+            while index < len(self.UPLOAD_STAGES):
+                stage = self.UPLOAD_STAGES[index]
+                error = None
+                try:
+                    with self.telemetry.span(f"stage.{stage}") as span:
+                        span['ok'] = bool(await getattr(self, f"stage_{stage}")())
+                except Exception as e:
+                    error = e
+                    traceback.print_exc()
+                if error is None and span['ok']:
+                    index += 1
+                    continue
+                await self.wait_and_screenshot(f"failed_{stage}", force=True)
+                resume = await self.plan_resume(stage, budgets, error)
+                if resume is None:
+                    self.screenshots.flush()
+                    return False
+                index = self.UPLOAD_STAGES.index(resume)
+            return True
+        except Exception as e:
+            self.log(f"❌ Automation failed: {e}")
+            traceback.print_exc()
+            await self.wait_and_screenshot("error_fixed", force=True)
+            self.screenshots.flush()
+            return False
+        finally:
+            self.detach_upload_monitor()
+
+
+def discover_accounts(paths=None):
+    """Storage state files given on the command line, or every accounts/*.json"""
+    if paths:
+        return [Path(p) for p in paths]
+    if not ACCOUNTS_DIR.is_dir():
+        return []
+    return sorted(ACCOUNTS_DIR.glob("*.json"))
+
+
+async def post_for_account(browser, semaphore, state_path, caption, capture):
+    """Run one account in its own context; always returns a result dict"""
+    account = state_path.stem
+    result = {'account': account, 'success': False, 'media_id': None, 'error': None, 'seconds': 0.0}
+
+    async with semaphore:
+        started = time.monotonic()
+        video_path = Path(f"video_{account}.mp4")
+        context = None
+        telemetry = Telemetry(account=account)
+        link = None
+        try:
+            link = choose_video_link()
+            try:
+                with telemetry.span("download"):
+                    await asyncio.to_thread(download_random_video, video_path, link)
+                with telemetry.span("preflight"):
+                    report = await asyncio.to_thread(preflight, video_path)
+            except Exception as e:
+                video_manifest.record_failure(link, e)
+                raise
+            with telemetry.span("optimize"):
+                upload_path = await asyncio.to_thread(optimize_video, video_path, report)
+            context = await browser.new_context(
+                storage_state=str(state_path),
+                user_agent=USER_AGENT,
+                viewport=VIEWPORT
+            )
+            blocker = None
+            if blocking_mode():
+                blocker = await ResourceBlocker(blocking_mode()).install_async(context)
+            page = await context.new_page()
+            page.set_default_timeout(30000)
+
+            automation = AsyncInstagramAutomation(page, account, telemetry)
+            await automation.install_event_listeners(capture)
+            result['success'] = await automation.attempt_upload(upload_path, caption)
+            result['media_id'] = automation.media_id
+            if result['success']:
+                video_manifest.record_post(link, read_day())
+            if blocker:
+                telemetry.set(blocking=blocker.summary())
+        except Exception as e:
+            result['error'] = str(e)
+            print(f"[{account}] ❌ {e}")
+        finally:
+            if context is not None:
+                await context.close()
+            try:
+                if video_path.exists():
+                    video_path.unlink()
+            except Exception:
+                pass
+            result['seconds'] = time.monotonic() - started
+            telemetry.set(success=result['success'], media_id=result['media_id'], error=result['error'])
+            telemetry.write()
+    return result
+
+
+async def run_accounts(state_paths, caption, concurrency=DEFAULT_CONCURRENCY):
+    """Post for every account on one shared browser; returns the result list"""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    capture = EventCapture()  # one writer thread shared by every account
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=get_browser_config(), args=BROWSER_ARGS)
+        try:
+            return await asyncio.gather(*(
+                post_for_account(browser, semaphore, path, caption, capture) for path in state_paths
+            ))
+        finally:
+            await browser.close()
+            capture.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Post to several Instagram accounts from one browser")
+    parser.add_argument("states", nargs="*", help="storage_state.json files (default: accounts/*.json)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="max accounts posting at the same time")
+    args = parser.parse_args(argv)
+
+    state_paths = [p for p in discover_accounts(args.states) if p.exists()]
+    if not state_paths:
+        print(f"⚠️ No account storage states found (looked in {ACCOUNTS_DIR}/)")
+        return []
+
+    current_day = read_day()
+    caption = build_caption(current_day)
+    print(f"=== MULTI-ACCOUNT RUN: {len(state_paths)} accounts, concurrency {args.concurrency} ===")
+
+    started = time.monotonic()
+    results = asyncio.run(run_accounts(state_paths, caption, args.concurrency))
+    total = time.monotonic() - started
+    get_selector_registry().save()
+
+    print("\n" + "="*80)
+    print("📊 MULTI-ACCOUNT RESULTS")
+    print("="*80)
+    for r in results:
+        status = "✅" if r['success'] else "❌"
+        detail = f"media {r['media_id']}" if r['media_id'] else (r['error'] or "no confirmation")
+        print(f"{status} {r['account']:<24} {r['seconds']:6.1f}s  {detail}")
+    slowest = max(r['seconds'] for r in results)
+    print(f"⏱️ Wall clock {total:.1f}s (slowest account {slowest:.1f}s, "
+          f"sum {sum(r['seconds'] for r in results):.1f}s)")
+
+    # The campaign day advances once, if any account posted
+    if any(r['success'] for r in results):
+        write_next_day(current_day + 1)
+        print(f"📅 Day counter updated: {current_day} → {current_day + 1}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
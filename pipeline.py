@@ -0,0 +1,71 @@
+# pipeline.py
+# Phase timing and prefetch helpers for the pipelined run mode (IG_PIPELINE=1):
+# video download and hashtag retrieval run in worker threads while the main
+# thread launches Chromium and navigates home. The video is joined by the
+# select-file stage, where a failed download or preflight ends the run; the
+# caption is joined only when the caption stage needs it.
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+def use_pipeline():
+    return os.getenv("IG_PIPELINE", "").lower() in ("1", "true", "yes")
+
+
+class PhaseTimer:
+    """Records start/end of named phases relative to the start of the run"""
+
+    def __init__(self):
+        self.origin = time.monotonic()
+        self.phases = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        start = time.monotonic() - self.origin
+        try:
+            yield
+        finally:
+            end = time.monotonic() - self.origin
+            with self.lock:
+                self.phases[name] = (start, end)
+
+    def timed(self, name, fn, *args, **kwargs):
+        with self.phase(name):
+            return fn(*args, **kwargs)
+
+    def durations(self):
+        """{phase: seconds}, for telemetry"""
+        with self.lock:
+            return {name: round(end - start, 3) for name, (start, end) in self.phases.items()}
+
+    def report(self):
+        """Print each phase and how much critical-path time the overlap saved"""
+        with self.lock:
+            phases = sorted(self.phases.items(), key=lambda item: item[1][0])
+        if not phases:
+            return
+        print("\n⏱️ PHASE TIMINGS")
+        work = 0.0
+        for name, (start, end) in phases:
+            print(f"   {name:<16} +{start:6.2f}s  {end - start:6.2f}s")
+            if not name.startswith("wait_"):
+                work += end - start
+        critical = max(end for _, (_, end) in phases) - min(start for _, (start, _) in phases)
+        print(f"   sum of phases {work:.2f}s, critical path {critical:.2f}s, "
+              f"overlap saved {max(0.0, work - critical):.2f}s")
+
+
+def resolve_prefetched(value, label, timer=None):
+    """Return value, blocking on it first if it is a prefetch Future"""
+    if not hasattr(value, "result"):
+        return value
+    if value.done():
+        return value.result()
+    print(f"⏳ Waiting for prefetched {label}...")
+    if timer is None:
+        return value.result()
+    with timer.phase(f"wait_{label}"):
+        return value.result()
@@ -0,0 +1,92 @@
+# publish_confirm.py
+# Publish confirmation from Instagram's configure response. The share stage
+# registers PublishWatcher.observe as a response listener only while the post
+# is being published, and confirm_publish waits on it with wait_for_event;
+# the general page event logging (event_capture.py) is not involved.
+
+# Substrings of the REST endpoints that finalize a post/reel
+CONFIGURE_MARKERS = ('/configure', 'configure_to_clips', '/publish')
+
+
+def is_publish_response(resp):
+    """True for the POST that configures (publishes) the uploaded media"""
+    try:
+        request = resp.request
+        if request.method != "POST":
+            return False
+        url = resp.url
+        if "/media/" in url:
+            return any(m in url for m in CONFIGURE_MARKERS)
+        if "/graphql/" in url:
+            # GraphQL mutations carry their name in a header, not in the URL
+            name = (request.headers.get("x-fb-friendly-name") or "").lower()
+            return "configure" in name or "publish" in name
+    except Exception:
+        pass
+    return False
+
+
+def extract_media_id(payload):
+    """Find the new media id in a configure response body (REST or GraphQL)"""
+    if isinstance(payload, dict):
+        media = payload.get("media")
+        if isinstance(media, dict):
+            for key in ("pk", "id"):
+                if media.get(key):
+                    return str(media[key])
+        if payload.get("media_id"):
+            return str(payload["media_id"])
+        for value in payload.values():
+            found = extract_media_id(value)
+            if found:
+                return found
+    elif isinstance(payload, list):
+        for value in payload:
+            found = extract_media_id(value)
+            if found:
+                return found
+    return None
+
+
+class PublishWatcher:
+    """Remembers the first publish response seen on the page"""
+
+    def __init__(self):
+        self.response = None
+
+    def reset(self):
+        self.response = None
+
+    def observe(self, resp):
+        """Response listener hook; returns True when `resp` is the publish response"""
+        if self.response is None and is_publish_response(resp):
+            self.response = resp
+        return resp is self.response
+
+    def result(self):
+        """
+        Parse the captured response.
+        Returns (confirmed, media_id); confirmed is None while nothing was seen.
+        """
+        if self.response is None:
+            return None, None
+        resp = self.response
+        try:
+            payload = resp.json() if resp.status < 400 else None
+        except Exception:
+            payload = None
+        return parse_publish_response(resp.status, resp.url, payload)
+
+
+def parse_publish_response(status, url, payload):
+    """Judge a configure response; returns (confirmed, media_id)"""
+    if status >= 400:
+        print(f"❌ Publish rejected by server [{status}] {url}")
+        return False, None
+    if isinstance(payload, dict) and payload.get("status") not in (None, "ok"):
+        print(f"❌ Publish response status: {payload.get('status')} {payload.get('message', '')}")
+        return False, None
+    if isinstance(payload, dict) and payload.get("errors"):
+        print(f"❌ Publish mutation returned errors: {payload['errors']}")
+        return False, None
+    return True, extract_media_id(payload)
@@ -0,0 +1,295 @@
+# ranged_download.py
+# Resumable multi-connection downloader.
+#
+# When the server honours Range requests the file is split into segments that
+# are fetched over parallel connections and written straight into a
+# preallocated `<dest>.part` at their offsets. Progress is checkpointed in
+# `<dest>.part.json`, so an interrupted transfer resumes where each segment
+# stopped instead of from byte zero. Servers without Range support get a single
+# large-buffer stream. Everything goes through `session`, so any HTTP server
+# (including a local stand-in) can serve the bytes.
+
+import json
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+CHUNK_SIZE = 1024 * 1024            # bytes per read/write
+MIN_SEGMENT_SIZE = 4 * 1024 * 1024  # never split finer than this
+CHECKPOINT_EVERY = 8 * 1024 * 1024  # persist progress after this many bytes
+
+
+class DownloadError(Exception):
+    pass
+
+
+class SlowTransfer(DownloadError):
+    pass
+
+
+class RangeNotHonoured(DownloadError):
+    """Server answered a segment request with the whole body (or the file changed)"""
+
+
+class NotAVideo(DownloadError):
+    """The server sent a web page (login, quota or warning page) instead of the file"""
+
+
+def jittered_backoff(attempt, base=1.0, cap=10.0):
+    """Seconds to wait before retry `attempt`: exponential, half of it randomized"""
+    delay = min(cap, base * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class TransferPolicy:
+    """Timeouts, minimum throughput and retry budget for one download"""
+
+    def __init__(self, connections=4, connect_timeout=10, read_timeout=30,
+                 min_bytes_per_sec=64 * 1024, stall_window=15, max_retries=3):
+        self.connections = connections
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.min_bytes_per_sec = min_bytes_per_sec
+        self.stall_window = stall_window
+        self.max_retries = max_retries
+
+    @property
+    def timeout(self):
+        return (self.connect_timeout, self.read_timeout)
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            connections=int(os.getenv("IG_DOWNLOAD_CONNECTIONS", "4")),
+            min_bytes_per_sec=int(os.getenv("IG_DOWNLOAD_MIN_KBPS", "64")) * 1024,
+            max_retries=int(os.getenv("IG_DOWNLOAD_RETRIES", "3")),
+        )
+
+
+def _probe(session, url, policy):
+    """One-byte range request: learns size, range support and validators"""
+    resp = session.get(url, headers={"Range": "bytes=0-0"}, stream=True, timeout=policy.timeout)
+    try:
+        resp.raise_for_status()
+        info = {
+            "url": resp.url,  # after redirects
+            "etag": resp.headers.get("ETag"),
+            "last_modified": resp.headers.get("Last-Modified"),
+            "content_type": resp.headers.get("Content-Type", ""),
+            "ranges": False,
+            "total": None,
+        }
+        match = re.match(r"bytes 0-0/(\d+)", resp.headers.get("Content-Range", ""))
+        if resp.status_code == 206 and match:
+            info["ranges"] = True
+            info["total"] = int(match.group(1))
+            resp.content  # one byte; reading it lets the connection go back to the pool
+        elif resp.headers.get("Content-Length"):
+            info["total"] = int(resp.headers["Content-Length"])
+        return info
+    finally:
+        resp.close()
+
+
+def probe(url, session=None, policy=None):
+    """Size, validators and range support of `url` without downloading it"""
+    import requests
+    return _probe(session or requests.Session(), url, policy or TransferPolicy.from_env())
+
+
+def fetch_range(session, url, start, end, policy=None):
+    """Bytes [start, end] of `url`; raises RangeNotHonoured unless the server answers 206"""
+    policy = policy or TransferPolicy.from_env()
+    resp = session.get(url, headers={"Range": f"bytes={start}-{end}"}, timeout=policy.timeout)
+    resp.raise_for_status()
+    if resp.status_code != 206:
+        raise RangeNotHonoured(f"expected 206 for bytes {start}-{end}, got {resp.status_code}")
+    return resp.content
+
+
+def _plan_segments(total, connections):
+    count = max(1, min(connections, total // MIN_SEGMENT_SIZE or 1))
+    size = -(-total // count)
+    return [[start, min(start + size, total) - 1, 0] for start in range(0, total, size)]
+
+
+class _Checkpoint:
+    """Segment progress persisted next to the partial file"""
+
+    def __init__(self, path, state):
+        self.path = path
+        self.state = state
+        self.lock = threading.Lock()
+        self.unsaved = 0
+
+    @classmethod
+    def load(cls, path, info):
+        try:
+            state = json.loads(path.read_text())
+            same = (state["total"] == info["total"] and state.get("etag") == info["etag"]
+                    and state.get("last_modified") == info["last_modified"])
+            if same:
+                return cls(path, state)
+        except Exception:
+            pass
+        return None
+
+    def advance(self, index, count):
+        with self.lock:
+            self.state["segments"][index][2] += count
+            self.unsaved += count
+            if self.unsaved >= CHECKPOINT_EVERY:
+                self._save()
+
+    def _save(self):
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.state))
+        os.replace(tmp, self.path)
+        self.unsaved = 0
+
+    def save(self):
+        with self.lock:
+            self._save()
+
+
+def _pwrite(fd, data, offset, lock):
+    if hasattr(os, "pwrite"):
+        os.pwrite(fd, data, offset)
+    else:
+        with lock:
+            os.lseek(fd, offset, os.SEEK_SET)
+            os.write(fd, data)
+
+
+def _fetch_segment(session, info, index, checkpoint, fd, policy, write_lock):
+    """Download one segment, resuming from its recorded progress, with retries"""
+    for attempt in range(policy.max_retries + 1):
+        start, end, done = checkpoint.state["segments"][index]
+        if start + done > end:
+            return
+        headers = {"Range": f"bytes={start + done}-{end}"}
+        validator = info["etag"] if info["etag"] and not info["etag"].startswith("W/") else info["last_modified"]
+        if validator:
+            headers["If-Range"] = validator
+        try:
+            resp = session.get(info["url"], headers=headers, stream=True, timeout=policy.timeout)
+            try:
+                if resp.status_code != 206:
+                    raise RangeNotHonoured(f"segment {index}: expected 206, got {resp.status_code}")
+                offset = start + done
+                window_start, window_bytes = time.monotonic(), 0
+                for chunk in resp.iter_content(chunk_size=CHUNK_SIZE):
+                    if not chunk:
+                        continue
+                    _pwrite(fd, chunk, offset, write_lock)
+                    offset += len(chunk)
+                    checkpoint.advance(index, len(chunk))
+                    window_bytes += len(chunk)
+                    elapsed = time.monotonic() - window_start
+                    if elapsed >= policy.stall_window:
+                        rate = window_bytes / elapsed
+                        if rate < policy.min_bytes_per_sec:
+                            raise SlowTransfer(f"segment {index}: {rate / 1024:.0f} KB/s below policy")
+                        window_start, window_bytes = time.monotonic(), 0
+            finally:
+                resp.close()
+            if start + checkpoint.state["segments"][index][2] > end:
+                return
+            raise DownloadError(f"segment {index}: connection closed early")
+        except RangeNotHonoured:
+            raise
+        except Exception as e:
+            if attempt == policy.max_retries:
+                raise
+            backoff = jittered_backoff(attempt)
+            print(f"  🔁 {e} - retrying segment {index} in {backoff:.1f}s")
+            time.sleep(backoff)
+
+
+def _stream_single(session, info, dest, policy):
+    """Fallback for servers without Range support: one large-buffer stream"""
+    part = Path(f"{dest}.part")
+    resp = session.get(info["url"], stream=True, timeout=policy.timeout)
+    try:
+        resp.raise_for_status()
+        with part.open("wb", buffering=CHUNK_SIZE) as out:
+            for chunk in resp.iter_content(chunk_size=CHUNK_SIZE):
+                if chunk:
+                    out.write(chunk)
+    finally:
+        resp.close()
+    os.replace(part, dest)
+
+
+def download(url, dest, session=None, policy=None):
+    """
+    Download `url` to `dest`, resuming a previous partial transfer if one is
+    on disk. Returns the probe info (final url, size, validators, ranges).
+    """
+    import requests
+    session = session or requests.Session()
+    policy = policy or TransferPolicy.from_env()
+    dest = Path(dest)
+    started = time.monotonic()
+
+    info = _probe(session, url, policy)
+    if "text/html" in info["content_type"]:
+        raise NotAVideo(f"{info['url']} returned an HTML page, not the file")
+    if not info["ranges"] or not info["total"]:
+        print("  ⚠️ Server does not support ranges; using a single stream")
+        _stream_single(session, info, dest, policy)
+        info["total"] = dest.stat().st_size
+        return info
+
+    part = Path(f"{dest}.part")
+    checkpoint_path = Path(f"{dest}.part.json")
+    checkpoint = _Checkpoint.load(checkpoint_path, info) if part.exists() else None
+    if checkpoint:
+        done = sum(s[2] for s in checkpoint.state["segments"])
+        print(f"  ⏯️ Resuming partial download ({done / 1e6:.1f}/{info['total'] / 1e6:.1f} MB)")
+    else:
+        checkpoint = _Checkpoint(checkpoint_path, {
+            "url": url,
+            "total": info["total"],
+            "etag": info["etag"],
+            "last_modified": info["last_modified"],
+            "segments": _plan_segments(info["total"], policy.connections),
+        })
+        with part.open("wb") as f:
+            f.truncate(info["total"])  # preallocate (sparse where supported)
+        checkpoint.save()
+
+    segments = checkpoint.state["segments"]
+    write_lock = threading.Lock()
+    fd = os.open(part, os.O_RDWR | getattr(os, "O_BINARY", 0))
+    try:
+        with ThreadPoolExecutor(max_workers=len(segments)) as pool:
+            futures = [
+                pool.submit(_fetch_segment, session, info, i, checkpoint, fd, policy, write_lock)
+                for i in range(len(segments))
+            ]
+            for future in futures:
+                future.result()
+    except RangeNotHonoured as e:
+        os.close(fd)
+        fd = None
+        print(f"  ⚠️ {e}; discarding partial file and streaming from scratch")
+        part.unlink()
+        checkpoint_path.unlink()
+        _stream_single(session, info, dest, policy)
+        return info
+    finally:
+        if fd is not None:
+            os.close(fd)
+            checkpoint.save()
+
+    os.replace(part, dest)
+    checkpoint_path.unlink()
+    elapsed = time.monotonic() - started
+    print(f"  ✅ {info['total'] / 1e6:.1f} MB over {len(segments)} connections "
+          f"in {elapsed:.1f}s ({info['total'] / 1e6 / max(elapsed, 1e-6):.1f} MB/s)")
+    return info
@@ -0,0 +1,157 @@
+# resource_blocker.py
+# Opt-in request interception for the posting flow (IG_BLOCK_RESOURCES).
+#
+# Feed images, video previews, fonts and analytics beacons are never used by
+# the bot. With IG_BLOCK_RESOURCES=1 they are aborted (beacons answered with an
+# empty 204 so page code does not retry) while documents, JS bundles, CSS and
+# all /upload/, /graphql/ and API traffic pass untouched. Only URLs matching
+# ROUTE_PATTERN are routed through Python at all, so the interception itself
+# costs nothing for the requests we keep. Note that Playwright turns the HTTP
+# cache off for a context with any route installed, which matters for
+# persistent profiles (IG_PERSISTENT_PROFILE): compare both with
+# `browser_profile.py compare` before enabling the two together.
+#
+# IG_BLOCK_RESOURCES=measure blocks nothing but fetches the would-be-blocked
+# requests itself and reports exactly how many bytes blocking would save.
+import os
+import re
+import threading
+
+# Requests that may be blocked: user media on the CDN (/v/t51..., /o1/v/t16...,
+# often without an extension), image/font/video extensions, beacons. JS and
+# CSS bundles (static.cdninstagram.com/rsrc.php/...js) never match.
+ROUTE_PATTERN = re.compile(
+    r"(?:cdninstagram\.com|fbcdn\.net)/(?:o1/)?v/t\d"
+    r"|\.(?:jpe?g|png|gif|webp|avif|heic|ico|woff2?|ttf|otf|mp4|m4s|webm)(?:[?#]|$)"
+    r"|/logging_client_events|/ajax/bz|/ajax/qm|/falco|/ajax/logging"
+    r"|facebook\.com/tr|google-analytics\.com|doubleclick\.net",
+    re.IGNORECASE,
+)
+BEACON_PATTERN = re.compile(
+    r"/logging_client_events|/ajax/bz|/ajax/qm|/falco|/ajax/logging"
+    r"|facebook\.com/tr|google-analytics\.com|doubleclick\.net",
+    re.IGNORECASE,
+)
+# Never touched, whatever the patterns above say
+ESSENTIAL_MARKERS = ("/upload/", "/rupload", "/graphql", "/api/v1/")
+DEFAULT_BLOCKED_TYPES = "image,media,font"
+
+
+def blocking_mode():
+    """'' (off), 'block' or 'measure' from IG_BLOCK_RESOURCES"""
+    value = os.getenv("IG_BLOCK_RESOURCES", "").lower()
+    if value == "measure":
+        return "measure"
+    return "block" if value in ("1", "true", "yes", "block") else ""
+
+
+class ResourceBlocker:
+    """Context-level router that aborts or stubs resources the flow never needs"""
+
+    def __init__(self, mode="block", blocked_types=None):
+        self.mode = mode
+        types = blocked_types or os.getenv("IG_BLOCK_TYPES", DEFAULT_BLOCKED_TYPES)
+        self.blocked_types = {t.strip() for t in types.split(",") if t.strip()}
+        self.lock = threading.Lock()
+        self.blocked = {}   # resource type -> requests blocked (or that would be)
+        self.bytes = {}     # resource type -> bytes measured (measure mode)
+        self.passed = 0
+
+    def decide(self, request):
+        """'abort', 'stub' or 'continue' for a routed request"""
+        url = request.url
+        if any(marker in url for marker in ESSENTIAL_MARKERS):
+            return "continue"
+        resource_type = request.resource_type
+        if BEACON_PATTERN.search(url) and resource_type in ("xhr", "fetch", "ping", "beacon", "other", "image"):
+            return "stub"
+        if resource_type in self.blocked_types:
+            return "abort"
+        return "continue"
+
+    def _count(self, request, size=0):
+        with self.lock:
+            kind = request.resource_type
+            self.blocked[kind] = self.blocked.get(kind, 0) + 1
+            self.bytes[kind] = self.bytes.get(kind, 0) + size
+
+    def handle(self, route):
+        """Sync Playwright route handler"""
+        request = route.request
+        action = self.decide(request)
+        try:
+            if action == "continue":
+                with self.lock:
+                    self.passed += 1
+                route.continue_()
+            elif self.mode == "measure":
+                response = route.fetch()
+                body = response.body()
+                self._count(request, len(body))
+                route.fulfill(response=response, body=body)
+            else:
+                self._count(request)
+                if action == "stub":
+                    route.fulfill(status=204, body="")
+                else:
+                    route.abort("blockedbyclient")
+        except Exception:
+            pass  # page or context already closed
+
+    async def handle_async(self, route):
+        """Async Playwright route handler"""
+        request = route.request
+        action = self.decide(request)
+        try:
+            if action == "continue":
+                with self.lock:
+                    self.passed += 1
+                await route.continue_()
+            elif self.mode == "measure":
+                response = await route.fetch()
+                body = await response.body()
+                self._count(request, len(body))
+                await route.fulfill(response=response, body=body)
+            else:
+                self._count(request)
+                if action == "stub":
+                    await route.fulfill(status=204, body="")
+                else:
+                    await route.abort("blockedbyclient")
+        except Exception:
+            pass
+
+    def install(self, context):
+        context.route(ROUTE_PATTERN, self.handle)
+        print(f"🚧 Resource blocking on ({self.mode}: {', '.join(sorted(self.blocked_types))} + beacons)")
+        return self
+
+    async def install_async(self, context):
+        await context.route(ROUTE_PATTERN, self.handle_async)
+        return self
+
+    def summary(self):
+        with self.lock:
+            return {
+                "mode": self.mode,
+                "requests_blocked": sum(self.blocked.values()),
+                "bytes_measured": sum(self.bytes.values()),
+                "by_type": dict(self.blocked),
+                "routed_passed": self.passed,
+            }
+
+    def report(self):
+        summary = self.summary()
+        by_type = ", ".join(f"{kind} {count}" for kind, count in sorted(summary["by_type"].items())) or "none"
+        if self.mode == "measure":
+            print(f"🚧 Blocking would save {summary['requests_blocked']} requests, "
+                  f"{summary['bytes_measured'] / 1e6:.1f} MB ({by_type})")
+        else:
+            print(f"🚧 Blocked {summary['requests_blocked']} requests ({by_type})")
+        return summary
+
+
+def install_blocker(context):
+    """Install a ResourceBlocker when IG_BLOCK_RESOURCES asks for one; returns it or None"""
+    mode = blocking_mode()
+    return ResourceBlocker(mode).install(context) if mode else None
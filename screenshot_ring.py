@@ -0,0 +1,78 @@
+# screenshot_ring.py
+# Bounded in-memory ring of compressed screenshots.
+#
+# On the happy path frames only live in memory (JPEG, last N kept, optionally
+# throttled); they are written to disk when a run fails. IG_DEBUG_SCREENSHOTS=1
+# restores the old behaviour of saving a full PNG at every capture point.
+import os
+import time
+from collections import deque
+
+
+def debug_screenshots():
+    return os.getenv("IG_DEBUG_SCREENSHOTS", "").lower() in ("1", "true", "yes")
+
+
+class ScreenshotRing:
+    """Keeps the last `size` frames as JPEG bytes until flush()"""
+
+    def __init__(self, size=None, quality=None, min_interval=None, debug=None):
+        self.size = size if size is not None else int(os.getenv("IG_SCREENSHOT_RING", "8"))
+        self.quality = quality if quality is not None else int(os.getenv("IG_SCREENSHOT_QUALITY", "50"))
+        # Minimum seconds between kept frames; 0 keeps every capture point
+        self.min_interval = (min_interval if min_interval is not None
+                             else float(os.getenv("IG_SCREENSHOT_INTERVAL", "0")))
+        self.debug = debug_screenshots() if debug is None else debug
+        self.frames = deque(maxlen=max(1, self.size))
+        self.last_capture = 0.0
+
+    def should_capture(self, force=False):
+        if self.debug or force:
+            return True
+        if self.size <= 0:
+            return False
+        return time.monotonic() - self.last_capture >= self.min_interval
+
+    def screenshot_options(self, filename):
+        """Arguments for page.screenshot(); debug mode writes the PNG directly"""
+        if self.debug:
+            return {"path": f"debug_{filename}.png"}
+        return {"type": "jpeg", "quality": self.quality}
+
+    def record(self, filename, data):
+        self.last_capture = time.monotonic()
+        if self.debug:
+            print(f"📸 Screenshot saved: debug_{filename}.png")
+            return
+        self.frames.append((time.time(), filename, data))
+
+    def capture(self, page, filename, force=False):
+        """Sync Playwright capture point"""
+        if not self.should_capture(force):
+            return
+        try:
+            self.record(filename, page.screenshot(**self.screenshot_options(filename)))
+        except Exception as e:
+            print(f"⚠️ Screenshot {filename} failed: {e}")
+
+    async def capture_async(self, page, filename, force=False):
+        """Async Playwright capture point"""
+        if not self.should_capture(force):
+            return
+        try:
+            self.record(filename, await page.screenshot(**self.screenshot_options(filename)))
+        except Exception as e:
+            print(f"⚠️ Screenshot {filename} failed: {e}")
+
+    def flush(self, prefix="debug"):
+        """Persist buffered frames (oldest first) and empty the ring"""
+        paths = []
+        for index, (_, filename, data) in enumerate(self.frames, 1):
+            path = f"{prefix}_{index:02d}_{filename}.jpg"
+            with open(path, "wb") as f:
+                f.write(data)
+            paths.append(path)
+        self.frames.clear()
+        if paths:
+            print(f"📸 Flushed {len(paths)} buffered screenshots ({prefix}_*.jpg)")
+        return paths
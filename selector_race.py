@@ -0,0 +1,219 @@
+# selector_race.py
+# Shared selector-resolution engine: every candidate for a step is raced inside
+# the page at once, so a dead selector no longer costs its own timeout.
+import time
+
+# One in-page evaluation per lookup. Candidates are re-scanned whenever the DOM
+# mutates; the highest-priority visible match wins. Candidates flagged as
+# fallback only become eligible after `fallbackAfter` ms so a loose selector
+# (e.g. any button) cannot beat a precise one that mounts a moment later.
+# A '*' text candidate only looks at elements that can carry a button label
+# (TEXT_SCOPE), so a mutation never rescans the whole DOM for text.
+TEXT_SCOPE = 'button, a, span, [role="button"]'
+RACE_JS = '''async ({ step, candidates, timeout, fallbackAfter, textScope }) => {
+    const started = performance.now();
+
+    const isVisible = (el) => {
+        const style = getComputedStyle(el);
+        if (style.visibility === 'hidden' || style.display === 'none') return false;
+        const rect = el.getBoundingClientRect();
+        return rect.width > 0 && rect.height > 0;
+    };
+    const isEnabled = (el) => !el.disabled && el.getAttribute('aria-disabled') !== 'true';
+    const clickableParent = (el) => {
+        let current = el;
+        for (let i = 0; i < 5; i++) {
+            current = current.parentElement;
+            if (!current) break;
+            if (current.tagName === 'A' ||
+                current.tagName === 'BUTTON' ||
+                current.getAttribute('role') === 'button' ||
+                current.onclick ||
+                getComputedStyle(current).cursor === 'pointer') {
+                return current;
+            }
+        }
+        return null;
+    };
+
+    const match = (c) => {
+        let nodes;
+        try {
+            nodes = Array.from(document.querySelectorAll(c.css === '*' && c.text ? textScope : c.css));
+        } catch (e) {
+            return null;  // selector not supported by this browser
+        }
+        if (c.text) {
+            const needle = c.text.toLowerCase();
+            nodes = nodes.filter((n) => (n.textContent || '').toLowerCase().includes(needle));
+            // Like :has-text, every ancestor matches too - keep the innermost hits.
+            // One walk up from each hit marks the hits that contain another one.
+            const hits = new Set(nodes);
+            const outer = new Set();
+            for (const node of nodes) {
+                for (let p = node.parentElement; p; p = p.parentElement) {
+                    if (outer.has(p)) break;  // everything above is marked already
+                    if (hits.has(p)) outer.add(p);
+                }
+            }
+            nodes = nodes.filter((n) => !outer.has(n));
+        }
+        for (const node of nodes) {
+            if (!isVisible(node)) continue;
+            if (c.enabled && !isEnabled(node)) continue;
+            const target = c.clickableParent ? clickableParent(node) : node;
+            if (target) return target;
+        }
+        return null;
+    };
+
+    const scan = () => {
+        const elapsed = performance.now() - started;
+        for (let i = 0; i < candidates.length; i++) {
+            if (candidates[i].fallback && elapsed < fallbackAfter) continue;
+            const element = match(candidates[i]);
+            if (element) {
+                // Every candidate that matches right now, for selector statistics
+                const matched = candidates.map((c, j) => (j === i || match(c) ? j : -1))
+                    .filter((j) => j >= 0);
+                return { index: i, element, elapsed, matched };
+            }
+        }
+        return null;
+    };
+
+    return await new Promise((resolve) => {
+        let done = false;
+        let pending = false;
+        let observer = null;
+        const timers = [];
+
+        const finish = (result) => {
+            if (done) return;
+            done = true;
+            if (observer) observer.disconnect();
+            timers.forEach(clearTimeout);
+            document.querySelectorAll(`[data-race-winner="${step}"]`)
+                .forEach((el) => el.removeAttribute('data-race-winner'));
+            if (result.element) result.element.setAttribute('data-race-winner', step);
+            resolve(result);
+        };
+        const check = () => {
+            pending = false;
+            if (done) return;
+            const hit = scan();
+            if (hit) finish(hit);
+        };
+        // Coalesce mutation bursts into one scan every 50 ms
+        const schedule = () => {
+            if (pending || done) return;
+            pending = true;
+            timers.push(setTimeout(check, 50));
+        };
+
+        check();
+        if (done) return;
+        observer = new MutationObserver(schedule);
+        observer.observe(document.documentElement, {
+            childList: true, subtree: true, attributes: true, characterData: true
+        });
+        timers.push(setTimeout(check, fallbackAfter));
+        timers.push(setTimeout(() => finish({
+            index: -1, element: null, elapsed: performance.now() - started, matched: []
+        }), timeout));
+    });
+}'''
+
+
+def candidate(css, text=None, fallback=False, enabled=False, clickable_parent=False):
+    """
+    Describe one selector candidate.
+    `text` is a case-insensitive substring check (the old :has-text),
+    `clickable_parent` climbs to the nearest clickable ancestor.
+    """
+    label = f'{css}:has-text("{text}")' if text else css
+    if clickable_parent:
+        label += " -> clickable parent"
+    return {
+        'css': css,
+        'text': text,
+        'fallback': fallback,
+        'enabled': enabled,
+        'clickableParent': clickable_parent,
+        'label': label,
+    }
+
+
+def _race_args(step, candidates, timeout, fallback_after):
+    return {
+        'step': step,
+        'candidates': candidates,
+        'timeout': timeout,
+        'fallbackAfter': fallback_after,
+        'textScope': TEXT_SCOPE,
+    }
+
+
+def _race_result(step, candidates, index, element, matched, started, timeout):
+    elapsed_ms = (time.monotonic() - started) * 1000
+    if index < 0 or element is None:
+        print(f"  ⏭️ No selector matched within {timeout}ms")
+        return None
+
+    winner = candidates[index]
+    print(f"  ✅ Selector {index + 1} won: {winner['label']} ({elapsed_ms:.0f}ms)")
+    return {
+        'element': element,
+        'selector': winner['label'],
+        'index': index,
+        'query': f'[data-race-winner="{step}"]',
+        'elapsed_ms': elapsed_ms,
+        'matched': matched or [index],
+    }
+
+
+def race_selectors(page, step, candidates, timeout=10000, fallback_after=1500):
+    """
+    Race all candidates for `step` and return the winner, or None on timeout.
+    The result dict carries the element handle, the winning candidate label and
+    index, a plain CSS `query` that finds the same element again, and the
+    indices of every candidate that `matched` at that moment.
+    """
+    started = time.monotonic()
+    print(f"  Racing {len(candidates)} selectors (timeout {timeout}ms)")
+
+    try:
+        handle = page.evaluate_handle(RACE_JS, _race_args(step, candidates, timeout, fallback_after))
+    except Exception as e:
+        print(f"  ⚠️ Selector race error: {e}")
+        return None
+
+    try:
+        index = handle.get_property('index').json_value()
+        element = handle.get_property('element').as_element()
+        matched = handle.get_property('matched').json_value()
+    finally:
+        handle.dispose()
+
+    return _race_result(step, candidates, index, element, matched, started, timeout)
+
+
+async def race_selectors_async(page, step, candidates, timeout=10000, fallback_after=1500):
+    """Same as race_selectors for playwright.async_api pages"""
+    started = time.monotonic()
+    print(f"  Racing {len(candidates)} selectors (timeout {timeout}ms)")
+
+    try:
+        handle = await page.evaluate_handle(RACE_JS, _race_args(step, candidates, timeout, fallback_after))
+    except Exception as e:
+        print(f"  ⚠️ Selector race error: {e}")
+        return None
+
+    try:
+        index = await (await handle.get_property('index')).json_value()
+        element = (await handle.get_property('element')).as_element()
+        matched = await (await handle.get_property('matched')).json_value()
+    finally:
+        await handle.dispose()
+
+    return _race_result(step, candidates, index, element, matched, started, timeout)
@@ -0,0 +1,154 @@
+# stages.py
+# Postconditions for each stage of the Create flow. attempt_upload waits on
+# these page predicates instead of sleeping a fixed time after every click.
+# DETECT_STAGE_JS reads where the flow currently is, so a failed stage can be
+# retried from the page's actual state instead of from the home page.
+import os
+
+# Upper bound per stage in ms; override with IG_STAGE_TIMEOUT_<NAME>=ms
+STAGE_TIMEOUTS = {
+    'home': 30000,
+    'dialog': 10000,
+    'file_attached': 10000,
+    'preview': 60000,
+    'step_change': 15000,
+    'caption_editor': 15000,
+    'publish': 60000,
+    'shared': 10000,  # on-page fallback when no publish response is recognised
+}
+
+# Shared helpers available to every predicate
+_PRELUDE = '''
+    const dialog = () => {
+        const open = Array.from(document.querySelectorAll('div[role="dialog"]'))
+            .filter((d) => d.getBoundingClientRect().height > 0);
+        return open.length ? open[open.length - 1] : null;
+    };
+    const signature = () => {
+        const d = dialog();
+        if (!d) return '';
+        return Array.from(d.querySelectorAll('h1, h2, [role="heading"]'))
+            .map((h) => (h.textContent || '').trim())
+            .join('|');
+    };
+'''
+
+
+def _predicate(body):
+    return '(arg) => {' + _PRELUDE + body + '}'
+
+
+STAGE_CONDITIONS = {
+    # Home feed is usable once the document is parsed and the nav is mounted
+    'home': _predicate('''
+        return document.readyState !== 'loading' &&
+            !!document.querySelector('nav, [role="navigation"], main');
+    '''),
+    # Create dialog opened
+    'dialog': _predicate('return !!dialog();'),
+    # Injected file input actually holds the video
+    'file_attached': _predicate('''
+        const el = document.getElementById('injected-file-input');
+        return !!el && el.files.length > 0;
+    '''),
+    # Crop preview rendered inside the dialog
+    'preview': _predicate('''
+        const d = dialog();
+        return !!d && !!d.querySelector('video, canvas, img[src^="blob:"]');
+    '''),
+    # Dialog moved on to another step (heading differs from `arg`)
+    'step_change': _predicate('return !!dialog() && signature() !== arg;'),
+    # Caption editor mounted
+    'caption_editor': _predicate('''
+        const scope = dialog() || document;
+        return !!scope.querySelector('[contenteditable="true"], [data-lexical-editor="true"]');
+    '''),
+    # Fallback only: success toast/heading. Scoped to dialogs and alerts and
+    # matched on full phrases so a stray "shared" elsewhere does not count.
+    'shared': _predicate('''
+        const phrases = ['your post has been shared', 'your reel has been shared',
+                         'post shared', 'reel shared'];
+        return Array.from(document.querySelectorAll('div[role="dialog"], [role="alert"], [role="status"]'))
+            .some((el) => {
+                const text = (el.textContent || '').toLowerCase();
+                return phrases.some((p) => text.includes(p));
+            });
+    '''),
+}
+
+SIGNATURE_JS = '() => {' + _PRELUDE + 'return signature(); }'
+
+# Where the Create flow is right now: none, picker, crop, edit, caption,
+# sharing, shared or unknown (some other dialog, e.g. "Discard post?")
+DETECT_STAGE_JS = '() => {' + _PRELUDE + '''
+    const d = dialog();
+    if (!d) return 'none';
+    const text = (d.textContent || '').toLowerCase();
+    const heading = signature().toLowerCase();
+    if (/(post|reel) shared|has been shared/.test(text)) return 'shared';
+    if (heading.includes('sharing')) return 'sharing';
+    if (d.querySelector('[contenteditable="true"], [data-lexical-editor="true"]')) return 'caption';
+    if (d.querySelector('video, canvas, img[src^="blob:"]')) return heading.includes('edit') ? 'edit' : 'crop';
+    if (d.querySelector('input[type="file"]') || text.includes('select from computer')
+        || text.includes('drag photos')) return 'picker';
+    return 'unknown';
+}'''
+
+# Upload stage to resume from for each detected page state
+RESUME_FROM = {
+    'none': 'create',
+    'picker': 'select_file',
+    'crop': 'crop',
+    'edit': 'edit',
+    'caption': 'caption',
+    'sharing': 'share',  # stage_share only waits for confirmation once Share was clicked
+    'shared': 'share',
+    'unknown': 'create',
+}
+
+# Escape clears a stray dialog, but once a file is attached it opens "Discard
+# post?" instead; stage detection only presses it after these stages fail
+ESCAPE_SAFE_STAGES = ('home', 'create')
+
+# Retries per upload stage; override with IG_STAGE_RETRIES_<NAME>=n
+STAGE_RETRIES = {
+    'home': 1,
+    'create': 2,
+    'select_file': 1,
+    'crop': 2,
+    'edit': 2,
+    'caption': 2,
+    'share': 1,
+}
+
+
+def stage_timeout(name):
+    """Timeout for a stage in ms, honouring IG_STAGE_TIMEOUT_<NAME>"""
+    value = os.getenv(f"IG_STAGE_TIMEOUT_{name.upper()}")
+    if value:
+        try:
+            return int(value)
+        except ValueError:
+            print(f"⚠️ Ignoring invalid IG_STAGE_TIMEOUT_{name.upper()}={value!r}")
+    return STAGE_TIMEOUTS[name]
+
+
+def stage_retries(name):
+    """Retry budget for an upload stage, honouring IG_STAGE_RETRIES_<NAME>"""
+    value = os.getenv(f"IG_STAGE_RETRIES_{name.upper()}")
+    if value:
+        try:
+            return max(0, int(value))
+        except ValueError:
+            print(f"⚠️ Ignoring invalid IG_STAGE_RETRIES_{name.upper()}={value!r}")
+    return STAGE_RETRIES.get(name, 0)
+
+
+def resume_stage(detected, on_site=True, share_clicked=False):
+    """Upload stage to continue from, given DETECT_STAGE_JS's answer"""
+    if share_clicked:
+        # The post may already be live: only wait for confirmation, never start over
+        return 'share'
+    if not on_site:
+        return 'home'
+    return RESUME_FROM.get(detected, 'create')
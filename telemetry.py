@@ -0,0 +1,161 @@
+# telemetry.py
+# Structured per-run timing and selector telemetry.
+#
+# Every run appends ONE JSON line to telemetry.jsonl with its spans (stages
+# and the steps inside them), every selector race with its winner and elapsed
+# time, and run-level attributes (success, media id, phase timings).
+#
+#   python telemetry.py summarize [telemetry.jsonl]   # p50/p95 per step
+
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+TELEMETRY_FILE = Path(os.getenv("IG_TELEMETRY_FILE", "telemetry.jsonl"))
+
+_write_lock = threading.Lock()
+
+
+class Telemetry:
+    """Collects spans and selector attempts for one run"""
+
+    def __init__(self, **attrs):
+        self.origin = time.monotonic()
+        self.lock = threading.Lock()
+        self.record = {
+            "run_id": uuid.uuid4().hex[:12],
+            "started_at": time.time(),
+            "attrs": dict(attrs),
+            "spans": [],
+            "selectors": [],
+        }
+
+    def _offset_ms(self):
+        return round((time.monotonic() - self.origin) * 1000, 1)
+
+    @contextmanager
+    def span(self, name, **attrs):
+        """Time a block; exceptions are recorded and re-raised"""
+        start = self._offset_ms()
+        entry = {"name": name, "start_ms": start, **attrs}
+        try:
+            yield entry
+            entry.setdefault("ok", True)
+        except BaseException as e:
+            entry["ok"] = False
+            entry["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            entry["ms"] = round(self._offset_ms() - start, 1)
+            with self.lock:
+                self.record["spans"].append(entry)
+
+    def selector(self, step, result, candidates, timeout):
+        """Record one selector race: which candidate won (or a miss) and how long it took"""
+        entry = {
+            "step": step,
+            "candidates": len(candidates),
+            "hit": result is not None,
+            "ms": round(result["elapsed_ms"], 1) if result else float(timeout),
+            "at_ms": self._offset_ms(),
+        }
+        if result:
+            entry["index"] = result["index"]
+            entry["selector"] = result["selector"]
+        with self.lock:
+            self.record["selectors"].append(entry)
+
+    def set(self, **attrs):
+        with self.lock:
+            self.record["attrs"].update(attrs)
+
+    def write(self, path=TELEMETRY_FILE):
+        """Append this run as one JSONL record"""
+        with self.lock:
+            self.record["total_ms"] = self._offset_ms()
+            line = json.dumps(self.record, default=str)
+        with _write_lock, open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+        print(f"🧾 Telemetry written to {path} (run {self.record['run_id']})")
+
+
+# --- summarizer --------------------------------------------------------------
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def load_runs(path=TELEMETRY_FILE):
+    runs = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    runs.append(json.loads(line))
+                except ValueError:
+                    continue
+    return runs
+
+
+def summarize(runs):
+    """Per-step p50/p95 and selector hit rates across runs"""
+    spans = {}
+    selectors = {}
+    for run in runs:
+        for span in run.get("spans", []):
+            spans.setdefault(span["name"], []).append(span["ms"])
+            if span.get("method"):
+                spans.setdefault(f"{span['name']}[{span['method']}]", []).append(span["ms"])
+        for sel in run.get("selectors", []):
+            stats = selectors.setdefault(sel["step"], {"ms": [], "hits": 0, "winners": {}})
+            stats["ms"].append(sel["ms"])
+            if sel["hit"]:
+                stats["hits"] += 1
+                stats["winners"][sel["selector"]] = stats["winners"].get(sel["selector"], 0) + 1
+    return spans, selectors
+
+
+def print_summary(runs):
+    spans, selectors = summarize(runs)
+    succeeded = sum(1 for r in runs if r.get("attrs", {}).get("success"))
+    totals = [r["total_ms"] for r in runs if "total_ms" in r]
+    print(f"📊 {len(runs)} runs, {succeeded} succeeded")
+    if totals:
+        print(f"   end-to-end p50 {percentile(totals, 50) / 1000:.1f}s  p95 {percentile(totals, 95) / 1000:.1f}s")
+
+    print(f"\n{'step':<28}{'n':>5}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, values in sorted(spans.items()):
+        print(f"{name:<28}{len(values):>5}{percentile(values, 50):>10.0f}{percentile(values, 95):>10.0f}")
+
+    print(f"\n{'selector step':<20}{'n':>5}{'hit %':>7}{'p50 ms':>10}{'p95 ms':>10}  top winner")
+    for step, stats in sorted(selectors.items()):
+        n = len(stats["ms"])
+        top = max(stats["winners"].items(), key=lambda item: item[1])[0] if stats["winners"] else "-"
+        print(f"{step:<20}{n:>5}{stats['hits'] / n:>7.0%}{percentile(stats['ms'], 50):>10.0f}"
+              f"{percentile(stats['ms'], 95):>10.0f}  {top}")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] != "summarize":
+        print("usage: python telemetry.py summarize [telemetry.jsonl]")
+        return 2
+    path = Path(argv[1]) if len(argv) > 1 else TELEMETRY_FILE
+    if not path.exists():
+        print(f"⚠️ {path} not found")
+        return 1
+    print_summary(load_runs(path))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+# upload_monitor.py
+# Follows the video upload after set_input_files so the flow moves on the
+# moment Instagram has the whole file, instead of after a fixed delay.
+#
+# Listeners are attached only for the upload window: from set_input_files
+# until the upload completes or fails, not until Share. Only video upload
+# requests (/rupload_igvideo/) count; cover and thumbnail photos go to
+# /rupload_igphoto/ and are ignored. Progress and completion are tracked per
+# upload entity (X-Entity-Name, else the URL path): each POST counts as bytes
+# in flight when it is sent and as acknowledged when its response arrives, and
+# a segmented entity (Segment-Start-Offset / Segment-Type headers) is complete
+# once X-Entity-Length bytes are acknowledged. The upload is complete when
+# every video entity is, and together they cover the file. The wait is bounded
+# by a timeout scaled to the file size.
+import os
+import time
+
+VIDEO_UPLOAD_MARKER = "/rupload_igvideo/"
+BASE_TIMEOUT_MS = int(os.getenv("IG_UPLOAD_BASE_TIMEOUT", "15000"))
+# Budget per MB: 2000 ms/MB tolerates links down to ~4 Mbit/s
+MS_PER_MB = int(os.getenv("IG_UPLOAD_MS_PER_MB", "2000"))
+MAX_TIMEOUT_MS = 10 * 60 * 1000
+# Give up waiting if no upload request shows up at all within this window
+NO_TRAFFIC_MS = int(os.getenv("IG_UPLOAD_NO_TRAFFIC_TIMEOUT", "10000"))
+
+
+def upload_timeout(size_bytes):
+    """Size-scaled upload timeout in ms"""
+    return min(MAX_TIMEOUT_MS, BASE_TIMEOUT_MS + int(size_bytes / 1e6 * MS_PER_MB))
+
+
+def is_upload_request(request):
+    """POST carrying video bytes (photo uploads for covers do not count)"""
+    return request.method == "POST" and VIDEO_UPLOAD_MARKER in request.url
+
+
+def entity_name(request):
+    return request.headers.get("x-entity-name") or request.url.split("?")[0].rstrip("/").rsplit("/", 1)[-1]
+
+
+def _header_int(headers, *names):
+    for name in names:
+        value = headers.get(name)
+        if value and value.isdigit():
+            return int(value)
+    return None
+
+
+def format_progress(sent, acked, total, status):
+    if total:
+        return (f"  📤 Upload {status}: {acked / total:4.0%} acknowledged "
+                f"({acked / 1e6:.1f}/{total / 1e6:.1f} MB, {sent / 1e6:.1f} MB sent)")
+    return f"  📤 Upload {status}: {acked / 1e6:.1f} MB acknowledged"
+
+
+def print_progress(sent, acked, total, status):
+    print(format_progress(sent, acked, total, status))
+
+
+class _Entity:
+    """One uploaded entity: a whole file, or a file sent in segments"""
+
+    def __init__(self, total):
+        self.total = total
+        self.sent = 0
+        self.acked = 0
+        self.segmented = False
+        self.complete = False
+
+
+class UploadMonitor:
+    """Tracks the video upload of one file; `on_progress(sent, acked, total, status)`"""
+
+    def __init__(self, total_bytes, on_progress=print_progress):
+        self.total = total_bytes
+        self.on_progress = on_progress
+        self.entities = {}
+        self.requests = 0
+        self.complete = False
+        self.error = None
+        self.started = time.monotonic()
+        self.finished_at = None
+        self.page = None
+        self.waited = False
+
+    @property
+    def sent(self):
+        return sum(e.sent for e in self.entities.values())
+
+    @property
+    def acked(self):
+        return sum(e.acked for e in self.entities.values())
+
+    @property
+    def segmented(self):
+        return any(e.segmented for e in self.entities.values())
+
+    def _request_size(self, request, entity):
+        size = _header_int(request.headers, "content-length")
+        if size is None and entity.segmented:
+            # Chromium does not always expose Content-Length; segments are small
+            size = len(request.post_data_buffer or b"")
+        return size
+
+    # --- listeners -----------------------------------------------------------
+
+    def on_request(self, request):
+        if not is_upload_request(request):
+            return
+        headers = request.headers
+        self.requests += 1
+        entity = self.entities.setdefault(entity_name(request), _Entity(self.total))
+        total = _header_int(headers, "x-entity-length")
+        if total:
+            entity.total = total
+        if "segment-start-offset" in headers or "segment-type" in headers:
+            entity.segmented = True
+        size = self._request_size(request, entity)
+        entity.sent += size if size is not None else entity.total
+        self._report("sending")
+
+    def on_response(self, response):
+        request = response.request
+        if not is_upload_request(request):
+            return
+        if response.status >= 400:
+            self.error = f"upload rejected [{response.status}] {response.url}"
+            self._report("failed")
+            return
+        entity = self.entities.get(entity_name(request))
+        if entity is None:
+            return  # request went out before the listeners were attached
+        size = self._request_size(request, entity)
+        if entity.segmented:
+            entity.acked += size or 0
+            entity.complete = bool(entity.total) and entity.acked >= entity.total
+        else:
+            # A single-shot entity is done when its response arrives
+            entity.acked += size if size else entity.total
+            entity.complete = True
+        if all(e.complete for e in self.entities.values()) and self.acked >= self.total:
+            self.complete = True
+            self.finished_at = time.monotonic()
+        self._report("complete" if self.complete else "segment")
+
+    def on_request_failed(self, request):
+        if is_upload_request(request):
+            self.error = f"upload request failed: {request.failure}"
+            self._report("failed")
+
+    def _report(self, status):
+        if self.on_progress:
+            self.on_progress(self.sent, min(self.acked, self.total or self.acked), self.total, status)
+        if self.settled():
+            self.detach()  # nothing left to follow; stop paying for every response event
+
+    # --- lifecycle -----------------------------------------------------------
+
+    def attach(self, page):
+        self.page = page
+        page.on("request", self.on_request)
+        page.on("response", self.on_response)
+        page.on("requestfailed", self.on_request_failed)
+        return self
+
+    def detach(self):
+        if self.page is None:
+            return
+        self.page.remove_listener("request", self.on_request)
+        self.page.remove_listener("response", self.on_response)
+        self.page.remove_listener("requestfailed", self.on_request_failed)
+        self.page = None
+
+    def settled(self):
+        return self.complete or self.error is not None
+
+    def _remaining(self, timeout):
+        elapsed = (time.monotonic() - self.started) * 1000
+        if not self.requests and elapsed >= NO_TRAFFIC_MS:
+            return 0
+        return max(0, timeout - elapsed)
+
+    def wait(self, timeout=None):
+        """
+        Block (sync API) until the upload completes or fails.
+        Returns True on completion, False on failure, None when no verdict was
+        reached (no upload traffic seen, or timeout).
+        """
+        timeout = timeout or upload_timeout(self.total)
+        while not self.settled() and self.page is not None:
+            remaining = self._remaining(timeout)
+            if remaining <= 0:
+                break
+            # Wakes on every response; our listener has already updated state
+            try:
+                self.page.wait_for_event("response", timeout=min(remaining, 1000))
+            except Exception:
+                pass
+        return self._verdict(timeout)
+
+    async def wait_async(self, timeout=None):
+        timeout = timeout or upload_timeout(self.total)
+        while not self.settled() and self.page is not None:
+            remaining = self._remaining(timeout)
+            if remaining <= 0:
+                break
+            try:
+                await self.page.wait_for_event("response", timeout=min(remaining, 1000))
+            except Exception:
+                pass
+        return self._verdict(timeout)
+
+    def _verdict(self, timeout):
+        self.waited = True
+        elapsed = (time.monotonic() - self.started) * 1000
+        if self.complete:
+            print(f"  ✅ Upload acknowledged in {elapsed:.0f}ms over {self.requests} request(s)")
+            return True
+        if self.error:
+            print(f"  ❌ {self.error}")
+            return False
+        if not self.requests:
+            print(f"  ⚠️ No upload traffic seen within {NO_TRAFFIC_MS}ms; continuing on the preview")
+        else:
+            print(f"  ⚠️ Upload not acknowledged within {timeout}ms")
+        return None
+
+    def summary(self):
+        return {
+            "bytes": self.total,
+            "requests": self.requests,
+            "entities": len(self.entities),
+            "segmented": self.segmented,
+            "complete": self.complete,
+            "error": self.error,
+            "ms": round(((self.finished_at or time.monotonic()) - self.started) * 1000),
+        }
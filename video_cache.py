@@ -0,0 +1,280 @@
+# video_cache.py
+# Content-addressed on-disk cache for the videos in drive_links.txt.
+#
+# Objects are stored once per sha256 under .video_cache/objects/ and indexed by
+# Drive file id. Entries with an ETag/Last-Modified are revalidated with a
+# conditional GET (a 304 costs no payload); entries without validators are
+# trusted for IG_VIDEO_CACHE_MAX_AGE seconds. Least recently used objects are
+# evicted once the cache grows past IG_VIDEO_CACHE_MAX_MB.
+#
+#   python video_cache.py stats
+#   python video_cache.py clear
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+
+import drive_fetch
+import mp4_preflight
+
+CACHE_DIR = Path(os.getenv("IG_VIDEO_CACHE_DIR", ".video_cache"))
+CACHE_MAX_BYTES = int(os.getenv("IG_VIDEO_CACHE_MAX_MB", "2048")) * 1024 * 1024
+CACHE_MAX_AGE = int(os.getenv("IG_VIDEO_CACHE_MAX_AGE", str(7 * 24 * 3600)))
+CHUNK_SIZE = 1024 * 1024
+
+EMPTY_STATS = {
+    "hits": 0,
+    "misses": 0,
+    "revalidated": 0,
+    "bytes_downloaded": 0,
+    "bytes_saved": 0,
+    "evictions": 0,
+}
+
+
+def cache_enabled():
+    return os.getenv("IG_VIDEO_CACHE", "1").lower() not in ("0", "false", "no")
+
+
+def drive_file_id(link):
+    """Stable cache key for a link: the Drive file id when present"""
+    parsed = urlparse(link)
+    file_id = parse_qs(parsed.query).get("id", [None])[0]
+    if not file_id and "/d/" in parsed.path:
+        file_id = parsed.path.split("/d/", 1)[1].split("/", 1)[0]
+    return file_id or hashlib.sha1(link.encode()).hexdigest()[:20]
+
+
+def peek(link, root=CACHE_DIR):
+    """Index entry for `link` if its object is on disk, without touching the cache"""
+    try:
+        entries = json.loads((Path(root) / "index.json").read_text()).get("entries", {})
+    except Exception:
+        return None
+    entry = entries.get(drive_file_id(link))
+    if entry and object_path(entry["sha256"], root).exists():
+        return entry
+    return None
+
+
+def object_path(sha256, root=CACHE_DIR):
+    return Path(root) / "objects" / f"{sha256}.mp4"
+
+
+class VideoCache:
+    """LRU, size-capped, content-addressed video cache with conditional revalidation"""
+
+    def __init__(self, root=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, max_age=CACHE_MAX_AGE):
+        self.root = Path(root)
+        self.objects = self.root / "objects"
+        self.index_path = self.root / "index.json"
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.key_locks = {}
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self.entries, self.totals = self._load()
+
+    def _load(self):
+        try:
+            data = json.loads(self.index_path.read_text())
+            return data.get("entries", {}), {**EMPTY_STATS, **data.get("stats", {})}
+        except Exception:
+            return {}, dict(EMPTY_STATS)
+
+    def _save(self):
+        tmp = self.index_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"entries": self.entries, "stats": self.totals}, indent=2))
+        os.replace(tmp, self.index_path)
+
+    def _object_path(self, sha256):
+        return object_path(sha256, self.root)
+
+    def _usable(self, entry):
+        return entry is not None and self._object_path(entry["sha256"]).exists()
+
+    def _key_lock(self, key):
+        with self.lock:
+            return self.key_locks.setdefault(key, threading.Lock())
+
+    def fetch(self, link, dest, session=None):
+        """Make `dest` hold the video behind `link`, transferring it only when needed"""
+        key = drive_file_id(link)
+        # Concurrent runs asking for the same file wait for one transfer
+        with self._key_lock(key):
+            return self._fetch(key, link, dest, session)
+
+    def _fetch(self, key, link, dest, session):
+        session = session or drive_fetch.get_session()
+
+        with self.lock:
+            entry = self.entries.get(key)
+            entry = entry if self._usable(entry) else None
+
+        if entry and not entry.get("etag") and not entry.get("last_modified"):
+            if time.time() - entry["fetched_at"] < self.max_age:
+                return self._hit(key, entry, dest, "fresh")
+
+        if entry:
+            headers = {}
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+            url = drive_fetch.resolve(link, session)
+            resp = session.get(url, headers=headers, stream=True, timeout=90)
+            resp.close()  # only the status matters; a changed file is fetched below
+            if resp.status_code == 304:
+                with self.lock:
+                    self.totals["revalidated"] += 1
+                return self._hit(key, entry, dest, "revalidated")
+            resp.raise_for_status()
+
+        sha256, size, info = self._store(key, link, session)
+
+        with self.lock:
+            self.entries[key] = {
+                "link": link,
+                "sha256": sha256,
+                "size": size,
+                "etag": info.get("etag"),
+                "last_modified": info.get("last_modified"),
+                "fetched_at": time.time(),
+                "last_access": time.time(),
+            }
+            self.totals["misses"] += 1
+            self.totals["bytes_downloaded"] += size
+            self._evict(keep=key)
+            self._save()
+        print(f"📥 Cache miss for {key}: stored {size / 1e6:.1f} MB")
+        return self._materialize(sha256, dest)
+
+    def _store(self, key, link, session):
+        """Download into objects/ (resumable, see ranged_download) and hash the result"""
+        # Stable per-key name so an interrupted transfer resumes on the next run
+        tmp = self.objects / f".incoming-{key}"
+        info = drive_fetch.download(link, tmp, session=session)
+        try:
+            mp4_preflight.inspect(tmp)  # never cache an HTML page or a truncated file
+        except mp4_preflight.PreflightError:
+            tmp.unlink()
+            raise
+        digest = hashlib.sha256()
+        size = 0
+        with tmp.open("rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+                size += len(chunk)
+        sha256 = digest.hexdigest()
+        target = self._object_path(sha256)
+        if target.exists():
+            tmp.unlink()  # same bytes already cached under another link
+        else:
+            os.replace(tmp, target)
+        return sha256, size, info
+
+    def _hit(self, key, entry, dest, how):
+        with self.lock:
+            entry["last_access"] = time.time()
+            self.totals["hits"] += 1
+            self.totals["bytes_saved"] += entry["size"]
+            self._save()
+        print(f"♻️ Cache hit ({how}) for {key}: saved {entry['size'] / 1e6:.1f} MB")
+        return self._materialize(entry["sha256"], dest)
+
+    def _materialize(self, sha256, dest):
+        """Hard-link the cached object to dest (copy across filesystems)"""
+        dest = Path(dest)
+        source = self._object_path(sha256)
+        if dest.exists():
+            dest.unlink()
+        try:
+            os.link(source, dest)
+        except OSError:
+            shutil.copyfile(source, dest)
+        return dest
+
+    def _evict(self, keep=None):
+        """Drop least recently used objects until the cache fits max_bytes"""
+        by_sha = {}
+        for key, entry in self.entries.items():
+            by_sha.setdefault(entry["sha256"], []).append(key)
+        total = sum(self.entries[keys[0]]["size"] for keys in by_sha.values())
+
+        def last_access(sha):
+            return max(self.entries[k]["last_access"] for k in by_sha[sha])
+
+        for sha in sorted(by_sha, key=last_access):
+            if total <= self.max_bytes:
+                break
+            if keep in by_sha[sha]:
+                continue
+            total -= self.entries[by_sha[sha][0]]["size"]
+            for key in by_sha[sha]:
+                del self.entries[key]
+            try:
+                self._object_path(sha).unlink()
+            except FileNotFoundError:
+                pass
+            self.totals["evictions"] += 1
+
+    def stats(self):
+        with self.lock:
+            stored = {e["sha256"]: e["size"] for e in self.entries.values()}
+            lookups = self.totals["hits"] + self.totals["misses"]
+            return {
+                **self.totals,
+                "entries": len(self.entries),
+                "objects": len(stored),
+                "bytes_stored": sum(stored.values()),
+                "max_bytes": self.max_bytes,
+                "hit_rate": self.totals["hits"] / lookups if lookups else 0.0,
+            }
+
+    def clear(self):
+        with self.lock:
+            shutil.rmtree(self.objects, ignore_errors=True)
+            self.objects.mkdir(parents=True, exist_ok=True)
+            self.entries = {}
+            self._save()
+
+
+_cache = None
+
+
+def get_video_cache():
+    """Process-wide cache instance (shared by threads of a multi-account run)"""
+    global _cache
+    if _cache is None:
+        _cache = VideoCache()
+    return _cache
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    command = argv[0] if argv else "stats"
+    cache = get_video_cache()
+    if command == "clear":
+        cache.clear()
+        print(f"🧹 Cleared {cache.root}")
+    elif command == "stats":
+        for name, value in cache.stats().items():
+            if name == "hit_rate":
+                value = f"{value:.0%}"
+            elif name.startswith("bytes") or name == "max_bytes":
+                value = f"{value / 1e6:.1f} MB"
+            print(f"{name:>16}: {value}")
+    else:
+        print("usage: python video_cache.py [stats|clear]")
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,355 @@
+# video_manifest.py
+# Index of the videos in drive_links.txt used to pick what gets posted.
+#
+# Every link gets an entry (keyed by Drive file id) with its size, sha256,
+# duration, validators, the day it was last posted and a failure count, stored
+# as compact JSON in .video_manifest.json. Links added to drive_links.txt show
+# up as unprobed entries automatically; `refresh` fills in their metadata,
+# from the local video cache when the file is there and otherwise with a few
+# small range requests (box headers + moov), never a full download.
+#
+# Selection is weighted by how long ago a clip was posted and how often it
+# failed, skips clips posted within IG_NO_REPEAT_DAYS and clips whose download
+# would exceed IG_VIDEO_BUDGET_MB (cached clips cost nothing). Failure counts
+# halve every IG_VIDEO_FAILURE_HALF_LIFE_DAYS, so a clip that failed
+# IG_VIDEO_MAX_FAILURES times sits out for a while instead of forever;
+# transient network errors while probing are not counted at all. Draws use an
+# alias table built once per process (see shared()), so each pick is O(1).
+#
+#   python video_manifest.py list
+#   python video_manifest.py refresh [--revalidate] [--force]
+#   python video_manifest.py choose [day]
+
+import json
+import os
+import random
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+
+import drive_fetch
+import mp4_preflight
+import ranged_download
+import video_cache
+
+MANIFEST_FILE = Path(os.getenv("IG_MANIFEST_FILE", ".video_manifest.json"))
+LINKS_FILE = Path("drive_links.txt")
+NO_REPEAT_DAYS = int(os.getenv("IG_NO_REPEAT_DAYS", "7"))
+BUDGET_MB = float(os.getenv("IG_VIDEO_BUDGET_MB", "0"))  # 0 = no limit
+MAX_FAILURES = int(os.getenv("IG_VIDEO_MAX_FAILURES", "3"))
+FAILURE_HALF_LIFE_DAYS = float(os.getenv("IG_VIDEO_FAILURE_HALF_LIFE_DAYS", "3"))
+STALE_CAP_DAYS = 30      # staleness stops adding weight after this many days
+HEAD_BYTES = 64 * 1024   # first range request; covers ftyp + moov of faststart files
+MAX_MOOV_BYTES = 16 * 1024 * 1024
+MAX_BOXES = 64
+
+_lock = threading.Lock()
+_shared = None
+
+
+def read_links(path=LINKS_FILE):
+    path = Path(path)
+    if not path.exists():
+        raise FileNotFoundError(f"{path} missing")
+    links = [line.strip() for line in path.read_text().splitlines() if line.strip()]
+    if not links:
+        raise ValueError(f"{path} is empty")
+    return links
+
+
+def build_alias(weights):
+    """Vose alias table for `weights`: O(n) to build, O(1) per draw"""
+    n = len(weights)
+    total = sum(weights)
+    scaled = [w * n / total for w in weights]
+    prob, alias = [1.0] * n, list(range(n))
+    small = [i for i, p in enumerate(scaled) if p < 1.0]
+    large = [i for i, p in enumerate(scaled) if p >= 1.0]
+    while small and large:
+        s, l = small.pop(), large.pop()
+        prob[s], alias[s] = scaled[s], l
+        scaled[l] -= 1.0 - scaled[s]
+        (small if scaled[l] < 1.0 else large).append(l)
+    return prob, alias
+
+
+def alias_draw(prob, alias, rng=random):
+    i = rng.randrange(len(prob))
+    return i if rng.random() < prob[i] else alias[i]
+
+
+def probe_remote(link, session, policy=None):
+    """
+    Size, validators and duration of a remote MP4 from its box headers and moov.
+    Costs one probe plus a handful of small range requests.
+    """
+    info = ranged_download.probe(drive_fetch.resolve(link, session, policy), session, policy)
+    if "text/html" in info["content_type"]:
+        raise mp4_preflight.PreflightError("link serves an HTML page, not a video (Drive warning page?)")
+    result = {"size": info["total"], "etag": info["etag"], "last_modified": info["last_modified"],
+              "duration": None}
+    total = info["total"]
+    if not info["ranges"] or not total:
+        return result  # duration has to wait for the first real download
+
+    url = info["url"]
+    head = ranged_download.fetch_range(session, url, 0, min(total, HEAD_BYTES) - 1, policy)
+    offset = 0
+    for _ in range(MAX_BOXES):
+        if offset + 8 > total:
+            break
+        header = head[offset:offset + 16] if offset + 16 <= len(head) else \
+            ranged_download.fetch_range(session, url, offset, min(offset + 16, total) - 1, policy)
+        size, box_type = struct.unpack_from(">I4s", header)
+        if size == 1:
+            size = struct.unpack_from(">Q", header, 8)[0]
+        elif size == 0:
+            size = total - offset
+        if size < 8:
+            raise mp4_preflight.PreflightError(f"corrupt box header at {offset}")
+        if box_type == b"moov":
+            if size > MAX_MOOV_BYTES:
+                break
+            moov = head[offset:offset + size] if offset + size <= len(head) else \
+                ranged_download.fetch_range(session, url, offset, offset + size - 1, policy)
+            result["duration"] = mp4_preflight.moov_duration(moov)
+            break
+        offset += size
+    return result
+
+
+class VideoManifest:
+    """Per-link metadata and history; see the module comment"""
+
+    def __init__(self, path=MANIFEST_FILE, links_file=LINKS_FILE):
+        self.path = Path(path)
+        self.links_file = Path(links_file)
+        try:
+            self.entries = json.loads(self.path.read_text()).get("entries", {})
+        except Exception:
+            self.entries = {}
+        self._table = None
+        self.sync()
+
+    def sync(self):
+        """Add entries for new links and drop entries whose link was removed"""
+        links = read_links(self.links_file)
+        current = {}
+        for link in links:
+            key = video_cache.drive_file_id(link)
+            entry = self.entries.get(key) or {"failures": 0, "posts": 0, "last_posted_day": None}
+            entry["link"] = link
+            current[key] = entry
+        self.entries = current
+        self._table = None
+
+    def save(self):
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"version": 1, "entries": self.entries}, separators=(",", ":")))
+        os.replace(tmp, self.path)
+
+    def key(self, link):
+        return video_cache.drive_file_id(link)
+
+    # --- selection -----------------------------------------------------------
+
+    def download_cost(self, entry):
+        """Bytes a pick would have to transfer: nothing when the video cache has it (unprobed: 0)"""
+        if video_cache.cache_enabled() and video_cache.peek(entry["link"]):
+            return 0
+        return entry.get("size") or 0
+
+    def failure_score(self, entry, now=None):
+        """Failure count halved for every full half-life since the last failure"""
+        failures = entry.get("failures", 0)
+        if not failures:
+            return 0.0
+        age_days = ((now or time.time()) - entry.get("failed_at", 0)) / 86400
+        return failures * 0.5 ** int(max(0.0, age_days) // FAILURE_HALF_LIFE_DAYS)
+
+    def weight(self, entry, day):
+        posted = entry.get("last_posted_day")
+        age = STALE_CAP_DAYS if posted is None else min(STALE_CAP_DAYS, max(1, day - posted))
+        return age / (1 + self.failure_score(entry))
+
+    def candidates(self, day, window=None, budget_mb=None):
+        """Keys eligible on `day`, relaxing the window, then the budget, if nothing is"""
+        window = NO_REPEAT_DAYS if window is None else window
+        budget = (BUDGET_MB if budget_mb is None else budget_mb) * 1e6
+        usable = [k for k, e in self.entries.items() if self.failure_score(e) < MAX_FAILURES] \
+            or list(self.entries)
+        cost = {k: self.download_cost(self.entries[k]) for k in usable} if budget else {}
+        fits = [k for k in usable if not budget or cost[k] <= budget]
+        fresh = [k for k in fits if self.entries[k].get("last_posted_day") is None
+                 or day - self.entries[k]["last_posted_day"] >= window]
+        if fresh:
+            return fresh, "weighted"
+        pool = fits or sorted(usable, key=cost.get)[:1]
+        # Everything was posted recently: least recently posted wins
+        oldest = min(pool, key=lambda k: self.entries[k].get("last_posted_day") or 0)
+        return [oldest], "every clip is inside the no-repeat window" if fits else "nothing fits the budget"
+
+    def choose(self, day, rng=random, **limits):
+        """Link to post on `day`"""
+        if self._table is None or self._table[0] != (day, tuple(sorted(limits.items()))):
+            keys, reason = self.candidates(day, **limits)
+            prob, alias = build_alias([self.weight(self.entries[k], day) for k in keys])
+            self._table = ((day, tuple(sorted(limits.items()))), keys, prob, alias, reason)
+        _, keys, prob, alias, reason = self._table
+        key = keys[alias_draw(prob, alias, rng)]
+        if reason != "weighted":
+            print(f"⚠️ Video choice relaxed: {reason}")
+        return self.entries[key]["link"]
+
+    # --- history -------------------------------------------------------------
+
+    def record_post(self, link, day):
+        entry = self.entries.get(self.key(link))
+        if entry is None:
+            return
+        entry.update(last_posted_day=day, posts=entry.get("posts", 0) + 1, failures=0, last_error=None)
+        cached = video_cache.peek(link)
+        if cached:
+            entry.update(sha256=cached["sha256"], size=cached["size"])
+        self._table = None
+
+    def record_failure(self, link, error, stage=None):
+        """Count a failed download/preflight against the clip; transient errors are not its fault"""
+        entry = self.entries.get(self.key(link))
+        if entry is None or drive_fetch.is_transient(error):
+            return
+        self._count_failure(entry, f"{stage or type(error).__name__}: {error}")
+
+    def _count_failure(self, entry, error):
+        # Start from the decayed score so old failures keep fading out
+        entry.update(failures=round(self.failure_score(entry)) + 1, failed_at=time.time(),
+                     last_error=str(error)[:200])
+        self._table = None
+
+    # --- refresh -------------------------------------------------------------
+
+    def refresh(self, revalidate=False, force=False, session=None):
+        """
+        Probe new entries (and, with `revalidate`, check the validators of known
+        ones, re-probing only those that changed). Returns the number probed.
+        """
+        session = session or drive_fetch.get_session()
+        probed = 0
+        for key, entry in self.entries.items():
+            cached = video_cache.peek(entry["link"])
+            known = entry.get("probed_at") is not None
+            if cached and (force or entry.get("sha256") != cached["sha256"]):
+                report = mp4_preflight.inspect(video_cache.object_path(cached["sha256"]))
+                entry.update(size=report["size"], sha256=cached["sha256"], duration=report["duration"],
+                             probed_at=time.time(), source="cache")
+                probed += 1
+                print(f"💾 {key}: {report['size'] / 1e6:.1f} MB, {report['duration']}s (from cache)")
+                continue
+            if known and not force and not revalidate:
+                continue
+            try:
+                if known and not force:
+                    info = ranged_download.probe(drive_fetch.resolve(entry["link"], session), session)
+                    if (info["total"], info["etag"], info["last_modified"]) == \
+                            (entry.get("size"), entry.get("etag"), entry.get("last_modified")):
+                        continue
+                result = probe_remote(entry["link"], session)
+            except Exception as e:
+                if drive_fetch.is_transient(e):
+                    # Network trouble says nothing about the clip; try again next refresh
+                    print(f"⚠️ {key}: probe failed (transient, not counted): {e}")
+                else:
+                    self._count_failure(entry, f"probe: {e}")
+                    print(f"⚠️ {key}: probe failed: {e}")
+                continue
+            if result["size"] != entry.get("size") or result["etag"] != entry.get("etag"):
+                entry.pop("sha256", None)  # content changed; hash is unknown until downloaded
+            entry.update(result, probed_at=time.time(), source="remote")
+            probed += 1
+            size = f"{result['size'] / 1e6:.1f} MB" if result["size"] else "size unknown"
+            print(f"🔎 {key}: {size}, {result['duration']}s")
+        self._table = None
+        return probed
+
+
+def load(links_file=LINKS_FILE):
+    return VideoManifest(links_file=links_file)
+
+
+def shared(links_file=LINKS_FILE):
+    """Process-wide manifest, so the alias table is built once per run, not per pick"""
+    global _shared
+    with _lock:
+        if _shared is None or _shared.links_file != Path(links_file):
+            _shared = load(links_file)
+        return _shared
+
+
+def choose_video(day, links_file=LINKS_FILE):
+    """Pick the link to post on `day` (read-only)"""
+    return shared(links_file).choose(day)
+
+
+def _update(apply):
+    # Re-read before writing so updates from other processes are kept; the
+    # fresh copy then serves later picks in this process
+    global _shared
+    with _lock:
+        links_file = _shared.links_file if _shared is not None else LINKS_FILE
+        manifest = load(links_file)
+        apply(manifest)
+        manifest.save()
+        _shared = manifest
+
+
+def record_post(link, day):
+    _update(lambda manifest: manifest.record_post(link, day))
+
+
+def record_failure(link, error, stage=None):
+    if drive_fetch.is_transient(error):
+        print(f"⚠️ Transient error, not counted against the clip: {error}")
+        return
+    _update(lambda manifest: manifest.record_failure(link, error, stage))
+
+
+def print_manifest(manifest, day):
+    keys, reason = manifest.candidates(day)
+    weights = {k: manifest.weight(manifest.entries[k], day) for k in keys}
+    total = sum(weights.values())
+    print(f"{'video':<22}{'MB':>8}{'sec':>7}{'posted':>8}{'fails':>6}{'p(pick)':>9}")
+    for key, entry in manifest.entries.items():
+        size = f"{entry['size'] / 1e6:.1f}" if entry.get("size") else "?"
+        duration = f"{entry['duration']:.0f}" if entry.get("duration") else "?"
+        posted = entry.get("last_posted_day")
+        chance = f"{weights[key] / total:.0%}" if key in weights else "-"
+        print(f"{key[:21]:<22}{size:>8}{duration:>7}{posted if posted is not None else '-':>8}"
+              f"{entry.get('failures', 0):>6}{chance:>9}")
+    if reason != "weighted":
+        print(f"⚠️ {reason}")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    command = argv[0] if argv else "list"
+    from main import read_day
+    manifest = load()
+    if command == "refresh":
+        probed = manifest.refresh(revalidate="--revalidate" in argv, force="--force" in argv)
+        manifest.save()
+        print(f"✅ {probed} of {len(manifest.entries)} entries probed, manifest saved to {manifest.path}")
+    elif command == "list":
+        print_manifest(manifest, read_day())
+    elif command == "choose":
+        day = int(argv[1]) if len(argv) > 1 else read_day()
+        print(manifest.choose(day))
+    else:
+        print("usage: python video_manifest.py list | refresh [--revalidate] [--force] | choose [day]")
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())